@@ -0,0 +1,230 @@
+import concurrent.futures
+import marshal
+import os
+import struct
+import threading
+import zlib
+
+import snapshots
+
+
+# Bump this whenever the layout of journal records changes, older journals can then no longer be loaded
+JOURNAL_FORMAT_VERSION = 1
+JOURNAL_MAGIC = b"TAGJRNL"
+JOURNAL_HEADER = struct.Struct("<II")   # The journal format version and the snapshot format version of its states
+RECORD_HEADER = struct.Struct("<II")    # The length of the record and the CRC32 of its bytes
+
+
+def _state_from_snapshot(game_snapshot, first_entry_number):
+    """Returns the state kept by the journal for a snapshot, a tuple of the parser, character and screen states, the
+    number of the oldest transcript entry, and the transcript top, bottom and entries."""
+    transcript_top, transcript_bottom, transcript_entries = game_snapshot.screen_state[5]
+
+    return (game_snapshot.parser_state, game_snapshot.character_state, game_snapshot.screen_state[:5],
+            first_entry_number, transcript_top, transcript_bottom, transcript_entries)
+
+
+def _snapshot_from_state(journal_state):
+    """Returns the snapshot of a state kept by the journal."""
+    (parser_state, character_state, screen_header, first_entry_number, transcript_top, transcript_bottom,
+     transcript_entries) = journal_state
+
+    return snapshots.GameSnapshot(parser_state, character_state,
+                                  screen_header + ((transcript_top, transcript_bottom, transcript_entries),))
+
+
+def make_delta(old_state, new_state):
+    """Returns a delta record taking the old state to the new one, or None if nothing has changed. The parser,
+    character and screen states are given whole if they changed. Transcript entries are matched by number, so only the
+    entries written since, and the kept entries whose sprites changed, are given."""
+    changed_parts = {each_index: new_state[each_index] for each_index in range(3)
+                     if new_state[each_index] != old_state[each_index]}
+
+    old_first, old_top, old_bottom, old_entries = old_state[3:]
+    new_first, new_top, new_bottom, new_entries = new_state[3:]
+
+    # The old entries still kept in the new transcript, which can only have lost entries from the front
+    kept_entries = old_entries[new_first - old_first:]
+    changed_entries = tuple((each_index, new_entries[each_index]) for each_index in range(len(kept_entries))
+                            if new_entries[each_index] != kept_entries[each_index])
+    added_entries = new_entries[len(kept_entries):]
+
+    if (not changed_parts and not changed_entries and not added_entries and new_first == old_first and
+            new_top == old_top and new_bottom == old_bottom):
+        return None
+
+    return "delta", changed_parts, (new_first, new_top, new_bottom, changed_entries, added_entries)
+
+
+def apply_delta(old_state, delta_record):
+    """Returns the state made by applying a delta record from make_delta to the old state."""
+    changed_parts, (new_first, new_top, new_bottom, changed_entries, added_entries) = delta_record[1:]
+    new_state = [changed_parts.get(each_index, old_state[each_index]) for each_index in range(3)]
+
+    new_entries = list(old_state[6][new_first - old_state[3]:])
+    for each_index, each_entry in changed_entries:
+        new_entries[each_index] = each_entry
+    new_entries.extend(added_entries)
+
+    return tuple(new_state) + (new_first, new_top, new_bottom, tuple(new_entries))
+
+
+def _encode_record(record):
+    """Returns the bytes of a journal record, framed by its length and checksum."""
+    record_bytes = zlib.compress(marshal.dumps(record), 1)
+    return RECORD_HEADER.pack(len(record_bytes), zlib.crc32(record_bytes)) + record_bytes
+
+
+def read_journal(journal_filename):
+    """Returns the snapshot of the last state written to an autosave journal. A record cut short or damaged by a crash
+    while it was appended ends the journal, so the state before it is returned. Raises OSError if the journal cannot be
+    read, and ValueError if it is not a journal of this format."""
+    with open(journal_filename, "rb") as journalfile:
+        journal_bytes = journalfile.read()
+
+    header_size = len(JOURNAL_MAGIC) + JOURNAL_HEADER.size
+    if not journal_bytes.startswith(JOURNAL_MAGIC) or len(journal_bytes) < header_size:
+        raise ValueError("Not an autosave journal")
+
+    format_versions = JOURNAL_HEADER.unpack_from(journal_bytes, len(JOURNAL_MAGIC))
+    if format_versions != (JOURNAL_FORMAT_VERSION, snapshots.SNAPSHOT_FORMAT_VERSION):
+        raise ValueError(f"Journal format {format_versions} is not {(JOURNAL_FORMAT_VERSION, snapshots.SNAPSHOT_FORMAT_VERSION)}")
+
+    journal_state = None
+    record_start = header_size
+
+    while record_start + RECORD_HEADER.size <= len(journal_bytes):
+        record_length, record_checksum = RECORD_HEADER.unpack_from(journal_bytes, record_start)
+        record_bytes = journal_bytes[record_start + RECORD_HEADER.size:record_start + RECORD_HEADER.size + record_length]
+
+        if len(record_bytes) != record_length or zlib.crc32(record_bytes) != record_checksum:
+            break
+
+        record = marshal.loads(zlib.decompress(record_bytes))
+        if record[0] == "base":
+            journal_state = record[1]
+        elif journal_state is not None:
+            journal_state = apply_delta(journal_state, record)
+
+        record_start += RECORD_HEADER.size + record_length
+
+    if journal_state is None:
+        raise ValueError("The autosave journal holds no save")
+
+    return _snapshot_from_state(journal_state)
+
+
+class AutosaveWriter:
+    """Writes autosaves to a journal on a background thread, so saving costs the frame only the capture of the state.
+    The first save, and every compact_every saves after it, writes the whole state to a new journal which replaces the
+    old one by renaming, and the saves between append only what changed. Every write is flushed to disk before the
+    next, so a crash loses at most the save being written. If saves are queued faster than they are written, only the
+    newest is written."""
+    def __init__(self, journal_filename, compact_every=50, event_log=None):
+        self.journal_filename = journal_filename
+        self.compact_every = compact_every
+        self.event_log = event_log
+
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending_state = None  # The newest state queued and not yet taken by the writer thread
+
+        # Only used on the writer thread
+        self._journal_file = None
+        self._written_state = None  # The state as of the last record written
+        self._delta_count = 0       # Delta records appended since the journal was last compacted
+
+    def save(self, game_snapshot, first_entry_number):
+        """Queues a snapshot to be written, given the number of its oldest transcript entry so the next save can be
+        written as a delta. Returns at once."""
+        if game_snapshot is None:
+            return
+
+        with self._lock:
+            self._pending_state = _state_from_snapshot(game_snapshot, first_entry_number)
+
+        if not self._executor:
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="autosave")
+
+        self._executor.submit(self._write_pending)
+
+    def flush(self):
+        """Blocks until every queued save has been written."""
+        if self._executor:
+            self._executor.submit(lambda: None).result()
+
+    def close(self):
+        """Writes every queued save, then stops the writer thread and closes the journal."""
+        if self._executor:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+        if self._journal_file:
+            self._journal_file.close()
+            self._journal_file = None
+
+    def _write_pending(self):
+        """Writes the newest queued state, if an earlier call has not already. Runs on the writer thread."""
+        with self._lock:
+            journal_state, self._pending_state = self._pending_state, None
+
+        if journal_state is None:
+            return
+
+        try:
+            if (not self._journal_file or self._delta_count >= self.compact_every or
+                    journal_state[3] < self._written_state[3]):
+                self._compact(journal_state)
+            else:
+                self._append(journal_state)
+
+        except OSError as error:
+            # Start a new journal with the next save
+            if self._journal_file:
+                self._journal_file.close()
+                self._journal_file = None
+
+            if self.event_log:
+                self.event_log.emit("autosave_error", filename=self.journal_filename, error=repr(error))
+
+    def _compact(self, journal_state):
+        """Writes the whole state as a new journal. Writes to a temporary file first so a crash never leaves a half
+        written journal behind."""
+        if self._journal_file:
+            self._journal_file.close()
+            self._journal_file = None
+
+        os.makedirs(os.path.dirname(self.journal_filename) or ".", exist_ok=True)
+        temporary_filename = self.journal_filename + ".tmp"
+
+        with open(temporary_filename, "wb") as journalfile:
+            journalfile.write(JOURNAL_MAGIC + JOURNAL_HEADER.pack(JOURNAL_FORMAT_VERSION, snapshots.SNAPSHOT_FORMAT_VERSION))
+            journalfile.write(_encode_record(("base", journal_state)))
+            journalfile.flush()
+            os.fsync(journalfile.fileno())
+
+        os.replace(temporary_filename, self.journal_filename)
+
+        self._journal_file = open(self.journal_filename, "ab")
+        self._written_state = journal_state
+        self._delta_count = 0
+
+        if self.event_log:
+            self.event_log.emit("autosave", kind="base", entries=len(journal_state[6]))
+
+    def _append(self, journal_state):
+        """Appends the changes since the last save to the journal."""
+        delta_record = make_delta(self._written_state, journal_state)
+        if delta_record is None:
+            return
+
+        record_bytes = _encode_record(delta_record)
+        self._journal_file.write(record_bytes)
+        self._journal_file.flush()
+        os.fsync(self._journal_file.fileno())
+
+        self._written_state = journal_state
+        self._delta_count += 1
+
+        if self.event_log:
+            self.event_log.emit("autosave", kind="delta", size=len(record_bytes))
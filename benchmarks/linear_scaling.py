@@ -0,0 +1,93 @@
+"""Shows that reading scenes and laying out event text scale linearly with their size.
+
+Times the scene parser on scenes of 5k, 10k and 20k rows, and the rolling text layout on events of 12.5k, 25k and 50k
+words. With linear scaling the time per row or word stays flat as the input doubles.
+
+Run from the repository root with: python benchmarks/linear_scaling.py
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import character
+import controls
+import reader_screen
+import scene_parser
+import settings
+import text_layout
+
+
+def make_scene_rows(row_count):
+    """Returns the rows of a synthetic scene with the given number of event rows, including choice rows."""
+    rows = [["HEADER", "Synthetic Scene", "E0", ""], ["STYLE", "DEFAULT", "", ""]]
+
+    event_number = 0
+    while len(rows) - 2 < row_count:
+        if event_number % 10 == 9:
+            rows.append([f"E{event_number}", "Pick one of these <topics> choices.", "", "choice enable_topics mark"])
+            rows.append(["", "The first choice", "E0", ""])
+            rows.append(["", "The second choice", f"E{event_number + 1}", ""])
+        else:
+            rows.append([f"E{event_number}", "Some text with /b bold / words and a <topic> in it.", "",
+                         "[Narrator] enable_topics give_item(Coin,1)"])
+        event_number += 1
+
+    return rows
+
+
+def make_event_text(word_count):
+    """Returns an event text of the given number of words, with style tags mixed in."""
+    words = []
+    while len(words) < word_count:
+        words.extend(("The", "/b", "quick", "/", "brown", "/i", "fox", "/", "jumps", "over"))
+
+    return " ".join(words[:word_count])
+
+
+def time_scene_parse(row_count):
+    """Returns the seconds taken to parse a synthetic scene of the given size."""
+    rows = make_scene_rows(row_count)
+
+    start_time = time.perf_counter()
+    scene_parser.parse_scene_rows(rows)
+
+    return time.perf_counter() - start_time
+
+
+def time_event_layout(adventure_screen, word_count):
+    """Returns the seconds taken to lay out every word of a synthetic event for the rolling text box."""
+    event_text = make_event_text(word_count)
+
+    start_time = time.perf_counter()
+    text_layout.layout_event_text(event_text, adventure_screen.settings, adventure_screen.character.topic_index,
+                                  adventure_screen.character.inventory, adventure_screen.last_placed_text_rect,
+                                  adventure_screen.rolling_text_transcript.get_width())
+
+    return time.perf_counter() - start_time
+
+
+def print_scaling(title, unit, sizes, timings):
+    """Prints the time per unit for each size, and the ratio of the largest to the smallest."""
+    print(title)
+    for each_size, each_timing in zip(sizes, timings):
+        print(f"  {each_size:>7} {unit}: {each_timing * 1000:9.2f} ms, {each_timing / each_size * 1e6:7.3f} us per {unit[:-1]}")
+
+    per_unit_ratio = (timings[-1] / sizes[-1]) / (timings[0] / sizes[0])
+    print(f"  Per {unit[:-1]} cost grew {per_unit_ratio:.2f}x from {sizes[0]} to {sizes[-1]} {unit} (1.00x is linear)")
+
+
+if __name__ == "__main__":
+    settings_object = settings.Settings()
+    character_object = character.CharacterProfile()
+    controller_object = controls.Controller(settings_object)
+    adventure_screen = reader_screen.GUIAdventureScreen(controller_object, settings_object, character_object)
+
+    row_sizes = (5000, 10000, 20000)
+    print_scaling("Scene parsing", "rows", row_sizes, [time_scene_parse(each_size) for each_size in row_sizes])
+
+    word_sizes = (12500, 25000, 50000)
+    print_scaling("Event text layout", "words", word_sizes,
+                  [time_event_layout(adventure_screen, each_size) for each_size in word_sizes])
@@ -0,0 +1,52 @@
+"""Times each phase of starting the game, loading the lazily loaded parts one at a time so each shows its own cost.
+
+Fonts, the style table, the topics and the items are loaded when first used, and the paths of system fonts are saved
+after the first launch, so run this twice to see a repeat launch.
+
+Run from the repository root with: python benchmarks/startup_time.py
+"""
+import os
+import sys
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import character
+import controls
+import gui
+import presentation
+import reader_screen
+import scene_parser
+import settings
+import startup_profiler
+
+
+if __name__ == "__main__":
+    startup = startup_profiler.StartupProfiler()
+
+    with startup.phase("settings"):
+        settings_object = settings.Settings()
+    with startup.phase("fonts"):
+        for each_font_name in settings.Settings.FONT_SPECS:
+            getattr(settings_object, each_font_name)
+    with startup.phase("styles"):
+        settings_object.dynamic_colors
+    with startup.phase("character"):
+        character_object = character.CharacterProfile()
+    with startup.phase("topics"):
+        character_object.topic_index
+    with startup.phase("items"):
+        character_object.inventory.bag
+    with startup.phase("controller"):
+        controller_object = controls.Controller(settings_object)
+    with startup.phase("first scene"):
+        scene_parser.SceneParser("scenes/EXAMPLE.csv", settings_object)
+    with startup.phase("background"):
+        gui.init_bg_surface(settings_object, "images/gui/debug_gui_winbg.png")
+    with startup.phase("adventure screen"):
+        adventure_screen = reader_screen.GUIAdventureScreen(controller_object, settings_object, character_object)
+    with startup.phase("first frame"):
+        adventure_screen.update()
+        presentation.Presenter(settings_object).present(adventure_screen.render_surface, adventure_screen.draw())
+
+    print(startup.report())
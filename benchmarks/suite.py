@@ -0,0 +1,266 @@
+"""Benchmarks the scene parser, topic lookup, text layout and rendering on synthetic scenes and catalogs.
+
+Runs headless with the dummy SDL video driver. Each benchmark is timed over several samples and reported by its
+minimum, median and mean time per operation. Results can be written as JSON with --json, and compared against an older
+JSON file with --compare to spot regressions between versions.
+
+Run from the repository root with: python benchmarks/suite.py --json results.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pygame
+
+import character
+import controls
+import reader_screen
+import scene_compiler
+import scene_parser
+import settings
+import synthetic
+import text_layout
+
+
+# The sizes of the synthetic fixture, the quick sizes are for checking the suite runs
+FULL_SIZES = {"topic_count": 500, "item_count": 100, "event_count": 400, "words_per_event": 150}
+QUICK_SIZES = {"topic_count": 60, "item_count": 20, "event_count": 40, "words_per_event": 40}
+
+
+def measure(benchmark_function, operation_count=1, sample_count=7, setup_function=None):
+    """Times benchmark_function over sample_count samples, calling setup_function untimed before each. Returns a dict
+    of the min, median and mean milliseconds per sample, and the median microseconds per operation when each call
+    does operation_count operations."""
+    sample_times = []
+
+    for each_sample in range(sample_count):
+        if setup_function:
+            setup_function()
+
+        start_time = time.perf_counter()
+        benchmark_function()
+        sample_times.append(time.perf_counter() - start_time)
+
+    median_time = statistics.median(sample_times)
+
+    return {"min_ms": min(sample_times) * 1000,
+            "median_ms": median_time * 1000,
+            "mean_ms": statistics.mean(sample_times) * 1000,
+            "operations": operation_count,
+            "median_us_per_operation": median_time * 1e6 / operation_count}
+
+
+class BenchmarkSuite:
+    """Builds the synthetic fixture, a character and an adventure screen over it, and runs each benchmark."""
+    def __init__(self, fixture_directory, sizes, sample_count):
+        self.sizes = sizes
+        self.sample_count = sample_count
+
+        self.fixture_files = synthetic.write_fixture(fixture_directory, **sizes)
+        self.compiled_directory = os.path.join(fixture_directory, "compiled")
+
+        self.settings = settings.Settings()
+        self.settings.compiled_scenes_directory = self.compiled_directory
+        self.settings.prefetch_linked_scenes = False
+
+        self.character = character.CharacterProfile(self.fixture_files["topics"], self.fixture_files["items"])
+        self.controller = controls.Controller(self.settings)
+        self.adventure_screen = reader_screen.GUIAdventureScreen(self.controller, self.settings, self.character,
+                                                                 self.fixture_files["scene"])
+
+        self.events = list(self.adventure_screen.event_parser.current_events_script.values())
+        self.word_count = sum(len(each_event.text.split()) for each_event in self.events)
+
+    def bench_scene_parse(self):
+        """Parsing the scene csv, loading its compiled copy, and read_from_scene with the scene cache cold and warm."""
+        scene_filename = self.fixture_files["scene"]
+        event_parser = self.adventure_screen.event_parser
+        scene_compiler.compile_scene(scene_filename, self.compiled_directory)
+
+        results = {"parse_csv": measure(lambda: scene_parser.parse_scene_file(scene_filename), len(self.events),
+                                        self.sample_count),
+                   "load_compiled": measure(lambda: scene_compiler.load_scene(scene_filename, self.compiled_directory),
+                                            len(self.events), self.sample_count),
+                   "read_from_scene_cold": measure(lambda: event_parser.read_from_scene(scene_filename), len(self.events),
+                                                   self.sample_count, setup_function=event_parser.scene_cache.clear),
+                   "read_from_scene_warm": measure(lambda: event_parser.read_from_scene(scene_filename), 1,
+                                                   self.sample_count)}
+
+        return results
+
+    def bench_topic_resolution(self):
+        """Looking up the text of every <topic> tag in the scene, as written, by alias and with case changed."""
+        topic_index = self.character.topic_index
+        tag_texts = []
+        for each_topic in self.character.topics:
+            tag_texts.extend((each_topic.title, each_topic.aliases[0], each_topic.title.upper(), "missing " + each_topic.title))
+
+        def find_all():
+            for each_text in tag_texts:
+                topic_index.find(each_text)
+
+        return {"find": measure(find_all, len(tag_texts), self.sample_count)}
+
+    def bench_text_layout(self):
+        """Laying out every event of the scene, and writing every laid out word to the rolling text box."""
+        adventure_screen = self.adventure_screen
+        box_width = adventure_screen.rolling_text_transcript.get_width()
+        start_rect = adventure_screen.last_placed_text_rect.copy()
+
+        def layout_all():
+            return [text_layout.layout_event_text(each_event.text, self.settings, self.character.topic_index,
+                                                  self.character.inventory, start_rect, box_width)
+                    for each_event in self.events]
+
+        layouts = layout_all()
+        run_count = sum(len(each_layout.runs) for each_layout in layouts)
+
+        def write_all():
+            for each_layout in layouts:
+                adventure_screen._wipe_rolling_textbox()
+                for each_run in each_layout.runs:
+                    adventure_screen._write_single_word(each_run)
+
+        return {"layout_event_text": measure(layout_all, self.word_count, self.sample_count),
+                "write_single_word": measure(write_all, run_count, self.sample_count)}
+
+    def bench_choice_buttons(self):
+        """Rendering the text of every choice in the scene, with the render cache warm and cold."""
+        choice_buttons = [reader_screen.ChoiceButton(self.adventure_screen, (0, 0), each_choice)
+                          for each_event in self.events for each_choice in each_event.choices or ()]
+        self.adventure_screen.clear_buttons()
+
+        def render_all():
+            for each_button in choice_buttons:
+                each_button._render_text()
+
+        return {"render_text_warm": measure(render_all, len(choice_buttons), self.sample_count),
+                "render_text_cold": measure(render_all, len(choice_buttons), self.sample_count,
+                                            setup_function=self.settings.render_cache.clear)}
+
+    def bench_sidebar(self):
+        """Sorting the sidebar with every topic known, and learning one more topic."""
+        adventure_screen = self.adventure_screen
+        topic_index = self.character.topic_index
+
+        for each_topic in self.character.topics[1:]:
+            if topic_index.mark_known(each_topic):
+                adventure_screen.add_to_sidebar_topics(each_topic)
+        adventure_screen.place_sidebar_topics()
+
+        last_topic = self.character.topics[0]
+
+        def forget_last_topic():
+            if last_topic in adventure_screen.sidebar_topic_sprites:
+                adventure_screen.sidebar_topic_sprites.pop(last_topic).kill()
+                adventure_screen.sidebar_active_topics.remove(last_topic)
+                adventure_screen.sidebar_inactive_topics.remove(last_topic)
+            last_topic.is_known_topic = False
+            topic_index.refresh_known()
+
+        def learn_topic():
+            topic_index.mark_known(last_topic)
+            adventure_screen.add_to_sidebar_topics(last_topic)
+            adventure_screen.place_sidebar_topics()
+
+        return {"sort_sidebar_topics": measure(adventure_screen.sort_sidebar_topics, len(topic_index.known_topics),
+                                               self.sample_count),
+                "learn_topic": measure(learn_topic, 1, self.sample_count, setup_function=forget_last_topic)}
+
+    def bench_draw(self):
+        """Drawing whole frames, and frames where only one word has changed."""
+        adventure_screen = self.adventure_screen
+        word_rect = pygame.Rect(adventure_screen.rolling_textbox_rect.topleft, (120, 40))
+        frame_count = 30
+
+        def draw_full_frames():
+            for each_frame in range(frame_count):
+                adventure_screen.mark_all_dirty()
+                adventure_screen.sidebar_needs_redraw = True
+                adventure_screen.draw()
+
+        def draw_word_frames():
+            for each_frame in range(frame_count):
+                adventure_screen.mark_dirty(word_rect)
+                adventure_screen.draw()
+
+        return {"full_frame": measure(draw_full_frames, frame_count, self.sample_count),
+                "word_frame": measure(draw_word_frames, frame_count, self.sample_count)}
+
+    def run(self):
+        """Runs every benchmark and returns the results, keyed by benchmark then measurement."""
+        benchmarks = {"scene_parse": self.bench_scene_parse,
+                      "topic_resolution": self.bench_topic_resolution,
+                      "text_layout": self.bench_text_layout,
+                      "choice_buttons": self.bench_choice_buttons,
+                      "sidebar": self.bench_sidebar,
+                      "draw": self.bench_draw}
+
+        return {each_name: each_benchmark() for each_name, each_benchmark in benchmarks.items()}
+
+
+def describe_environment():
+    """Returns a dict describing the code and machine the results were measured on."""
+    try:
+        git_commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                    check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        git_commit = None
+
+    return {"git_commit": git_commit,
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def print_results(results, old_results=None):
+    """Prints the median time of each measurement, and its ratio to the old results if given."""
+    for each_benchmark, each_measurements in results.items():
+        print(each_benchmark)
+
+        for each_name, each_result in each_measurements.items():
+            line = f"  {each_name:<24} {each_result['median_ms']:10.3f} ms {each_result['median_us_per_operation']:10.3f} us/op"
+
+            old_result = (old_results or {}).get(each_benchmark, {}).get(each_name)
+            if old_result and old_result["median_us_per_operation"]:
+                line += f"  {each_result['median_us_per_operation'] / old_result['median_us_per_operation']:6.2f}x old"
+
+            print(line)
+
+
+if __name__ == "__main__":
+    argument_parser = argparse.ArgumentParser(description="Benchmarks parsing, layout and rendering on synthetic scenes.")
+    argument_parser.add_argument("--quick", action="store_true", help="use small sizes, to check the suite runs")
+    argument_parser.add_argument("--samples", type=int, default=7, help="the number of samples of each measurement")
+    argument_parser.add_argument("--json", help="write the results to this JSON file")
+    argument_parser.add_argument("--compare", help="a JSON file of older results to compare against")
+    arguments = argument_parser.parse_args()
+
+    benchmark_sizes = QUICK_SIZES if arguments.quick else FULL_SIZES
+
+    with tempfile.TemporaryDirectory() as temporary_directory:
+        suite = BenchmarkSuite(temporary_directory, benchmark_sizes, arguments.samples)
+        suite_results = suite.run()
+
+    old_suite_results = None
+    if arguments.compare:
+        with open(arguments.compare, encoding="UTF-8") as jsonfile:
+            old_suite_results = json.load(jsonfile)["results"]
+
+    print_results(suite_results, old_suite_results)
+
+    if arguments.json:
+        with open(arguments.json, "w", encoding="UTF-8") as jsonfile:
+            json.dump({"environment": describe_environment(), "sizes": benchmark_sizes, "samples": arguments.samples,
+                       "results": suite_results}, jsonfile, indent=2)
@@ -0,0 +1,111 @@
+"""Generators of synthetic scenes and topic and item catalogs for the benchmarks.
+
+Every generator is seeded, so the same arguments always give the same rows. write_fixture() writes a full set of files
+to a directory, ready to load with character.CharacterProfile and scene_parser.SceneParser.
+"""
+import csv
+import os
+import random
+
+
+FILLER_WORDS = ("the", "old", "road", "winds", "past", "a", "quiet", "village", "where", "lanterns", "burn", "late",
+                "and", "every", "door", "hides", "some", "small", "story", "worth", "hearing")
+
+
+def make_topic_rows(topic_count, known_fraction=0.5, seed=0):
+    """Returns the rows of a topics catalog of the given size. Each topic has two aliases, and known_fraction of them
+    are known from the start."""
+    rng = random.Random(seed)
+    rows = []
+
+    for topic_number in range(topic_count):
+        is_known = "is_known" if rng.random() < known_fraction else ""
+        rows.append([f"Topic{topic_number}", f"topic {topic_number}, t{topic_number}",
+                     f"The generic response of topic {topic_number}.", is_known])
+
+    return rows
+
+
+def make_item_rows(item_count):
+    """Returns the rows of an items catalog of the given size. Every other item can stock."""
+    return [[f"Item{item_number}", "Item", f"A synthetic item number {item_number}.",
+             "has_stock" if item_number % 2 == 0 else ""] for item_number in range(item_count)]
+
+
+def make_event_text(word_count, topic_titles, item_names, markup_every=8, rng=None):
+    """Returns an event text of about the given number of words. Every markup_every words one of a bold or italic run,
+    a <topic> tag or an {item} tag is written, cycling through them."""
+    rng = rng or random.Random(0)
+    words = []
+    markup_number = 0
+
+    while len(words) < word_count:
+        if len(words) % markup_every == markup_every - 1:
+            markup_kind = markup_number % 4
+            markup_number += 1
+
+            if markup_kind == 0 and topic_titles:
+                words.append(f"<{rng.choice(topic_titles)}>")
+            elif markup_kind == 1 and item_names:
+                words.append(f"{{{rng.choice(item_names)},1}}")
+            elif markup_kind == 2:
+                words.extend(("/b", rng.choice(FILLER_WORDS), rng.choice(FILLER_WORDS), "/"))
+            else:
+                words.extend(("/i", rng.choice(FILLER_WORDS), "/"))
+        else:
+            words.append(rng.choice(FILLER_WORDS))
+
+    return " ".join(words)
+
+
+def make_scene_rows(event_count, words_per_event, topic_titles, item_names, choices_per_event=4, choice_every=5,
+                    generic_topic_count=10, markup_every=8, seed=0):
+    """Returns the rows of a scene with the given number of events. Every choice_every-th event is a choice between
+    choices_per_event other events, the rest run on to the next event. The last event is never a choice, as choices
+    are read from the rows below it. Every event enables topics, and every third has a character tag."""
+    rng = random.Random(seed)
+    rows = [["HEADER", "A Synthetic Scene", "E0", ""],
+            ["GENERIC_TOPICS", ", ".join(topic_titles[:generic_topic_count]), "", ""],
+            ["STYLE", "DEFAULT", "", ""]]
+
+    for event_number in range(event_count):
+        event_text = make_event_text(words_per_event, topic_titles, item_names, markup_every, rng)
+        commands = ["enable_topics"]
+        if event_number % 3 == 0:
+            commands.insert(0, "[Narrator]")
+
+        if event_number % choice_every == choice_every - 1 and event_number < event_count - 1:
+            rows.append([f"E{event_number}", event_text, "", " ".join(commands + ["choice"])])
+
+            for choice_number in range(choices_per_event):
+                choice_text = make_event_text(12, (), (), markup_every=1000, rng=rng)
+                rows.append(["", f"Choice {choice_number}: {choice_text}", f"E{rng.randrange(event_count)}", ""])
+        else:
+            rows.append([f"E{event_number}", event_text, f"E{(event_number + 1) % event_count}", " ".join(commands)])
+
+    return rows
+
+
+def write_rows(filename, rows):
+    """Writes rows to a csv file."""
+    with open(filename, "w", newline="", encoding="UTF-8") as csvfile:
+        csv.writer(csvfile).writerows(rows)
+
+
+def write_fixture(directory, topic_count=200, item_count=50, event_count=200, words_per_event=120, seed=0, **scene_options):
+    """Writes a topics catalog, an items catalog and a scene to the directory. Returns a dict of their file names,
+    keyed "topics", "items" and "scene". Other keyword arguments are passed on to make_scene_rows."""
+    topic_rows = make_topic_rows(topic_count, seed=seed)
+    item_rows = make_item_rows(item_count)
+    scene_rows = make_scene_rows(event_count, words_per_event, [each_row[0] for each_row in topic_rows],
+                                 [each_row[0] for each_row in item_rows], seed=seed, **scene_options)
+
+    fixture_files = {"topics": os.path.join(directory, "topics.csv"),
+                     "items": os.path.join(directory, "items.csv"),
+                     "scene": os.path.join(directory, "SYNTHETIC.csv")}
+
+    write_rows(fixture_files["topics"], topic_rows)
+    write_rows(fixture_files["items"], item_rows)
+    write_rows(fixture_files["scene"], scene_rows)
+
+    return fixture_files
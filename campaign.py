@@ -0,0 +1,314 @@
+import argparse
+import collections
+import os
+import sys
+import time
+
+import scene_compiler
+import scene_parser
+import topics
+
+
+class SceneSummary:
+    """What the campaign index keeps of a scene after reading it: its start event, the IDs of its events, the edges
+    leaving them and the topic tags written in them. The events themselves are not kept, and are read again on demand.
+    Each edge is a tuple of (from event ID, kind, target scene ID, target event ID), where kind is one of "start",
+    "next", "choice", "pass", "fail" or "scene". Edges of the "scene" kind target the linked scene's start event, and
+    are stored with a target event ID of None."""
+    __slots__ = ("scene_ID", "scene_filename", "source_stat", "start_in", "event_IDs", "edges", "topic_tags")
+
+    def __init__(self, scene_ID, scene_filename, source_stat, parsed_scene):
+        self.scene_ID = scene_ID
+        self.scene_filename = scene_filename
+        self.source_stat = source_stat
+        self.start_in = parsed_scene.start_in
+
+        self.event_IDs = frozenset(parsed_scene.events)
+        self.edges = tuple(self._read_edges(parsed_scene))
+
+        # Topic tags as normalized keys, with the IDs of the events writing them
+        topic_tags = collections.defaultdict(list)
+        for each_event in parsed_scene.events.values():
+            for each_tag in topics.TOPIC_TAG_PATTERN.findall(" ".join(each_event.text.split())):
+                topic_key = topics.normalize_topic_key(each_tag)
+                if each_event.ID not in topic_tags[topic_key]:
+                    topic_tags[topic_key].append(each_event.ID)
+
+        self.topic_tags = {each_key: tuple(each_IDs) for each_key, each_IDs in topic_tags.items()}
+
+    def _read_edges(self, parsed_scene):
+        """Yields the edge of every way the scene's events lead on, following the rules of SceneParser.get_next_event
+        and the item and roll checks. Returns to marked events are not edges, as the mark was already reached."""
+        scene_ID = self.scene_ID
+
+        yield None, "start", scene_ID, self.start_in
+
+        for each_event in parsed_scene.events.values():
+            event_ID = each_event.ID
+
+            if each_event.item_check or each_event.roll_check:
+                if each_event.on_fail_event_ID != "return":
+                    yield event_ID, "fail", scene_ID, each_event.on_fail_event_ID
+                next_kind = "pass"
+            else:
+                next_kind = "next"
+
+            if "scene" in each_event.commands:
+                if each_event.next_ID:
+                    yield event_ID, "scene", each_event.next_ID, None
+            elif each_event.next_ID and each_event.next_ID != "return":
+                yield event_ID, next_kind, scene_ID, each_event.next_ID
+
+            for each_next_ID in (each_event.choices or {}).values():
+                if each_next_ID and each_next_ID != "return":
+                    yield event_ID, "choice", scene_ID, each_next_ID
+
+    def is_stale(self):
+        """Returns True if the scene file has changed or gone since it was summarized."""
+        try:
+            source_stat = os.stat(self.scene_filename)
+        except OSError:
+            return True
+
+        return (source_stat.st_mtime_ns, source_stat.st_size) != self.source_stat
+
+
+class CampaignIndex:
+    """An index of every scene in the scene directory as one graph of events, for finding problems in a whole
+    campaign without playing it. Scenes are found by listing the directory, and each is read and summarized the first
+    time a lookup needs it. Parsed scenes are held by a bounded scene cache, so get_scene and get_event read a scene
+    again if it has been evicted. With a compiled directory, scenes are loaded from their compiled copies."""
+    def __init__(self, scene_directory="scenes", compiled_directory=None, scene_cache=None, topic_index=None):
+        self.scene_directory = scene_directory
+        self.compiled_directory = compiled_directory
+        self.scene_cache = scene_cache if scene_cache is not None else scene_parser.SceneCache(8)
+        self.topic_index = topic_index
+
+        self.scene_filenames = {}   # Scene ID -> file name, of every scene in the directory
+        self.summaries = {}         # Scene ID -> SceneSummary, of the scenes read so far
+
+        self._incoming_edges = None     # (scene ID, event ID) -> the edges targeting it, built on first use
+
+        self.find_scenes()
+
+    def find_scenes(self):
+        """Lists the scene directory for scene files, forgetting the summaries of scenes that have gone or changed."""
+        self.scene_filenames.clear()
+
+        # Only .csv scenes can be reached by the 'scene' command, so other files are left out
+        for each_filename in sorted(os.listdir(self.scene_directory)):
+            scene_ID, extension = os.path.splitext(each_filename)
+            scene_filename = scene_parser.scene_filename_for(scene_ID, self.scene_directory)
+
+            if extension == ".csv" and os.path.isfile(scene_filename) and scene_compiler.is_scene_file(scene_filename):
+                self.scene_filenames[scene_ID] = scene_filename
+
+        for each_scene_ID, each_summary in list(self.summaries.items()):
+            if each_scene_ID not in self.scene_filenames or each_summary.is_stale():
+                del self.summaries[each_scene_ID]
+                self._incoming_edges = None
+
+    def get_scene(self, scene_ID):
+        """Returns the ParsedScene of the scene with the given ID, reading it if it is not in the scene cache."""
+        scene_filename = self.scene_filenames[scene_ID]
+        parsed_scene = self.scene_cache.get(scene_filename)
+
+        if parsed_scene is None:
+            if self.compiled_directory:
+                parsed_scene = scene_compiler.load_scene(scene_filename, self.compiled_directory)
+            else:
+                parsed_scene = scene_parser.parse_scene_file(scene_filename)
+
+            self.scene_cache.put(scene_filename, parsed_scene)
+
+        return parsed_scene
+
+    def get_event(self, scene_ID, event_ID):
+        """Returns the event with the given ID in the given scene, or None if there is no such event."""
+        if scene_ID not in self.scene_filenames:
+            return None
+
+        return self.get_scene(scene_ID).events.get(event_ID)
+
+    def get_summary(self, scene_ID):
+        """Returns the summary of the scene with the given ID, reading the scene the first time."""
+        scene_summary = self.summaries.get(scene_ID)
+
+        if scene_summary is None:
+            scene_filename = self.scene_filenames[scene_ID]
+            source_stat = os.stat(scene_filename)
+
+            scene_summary = SceneSummary(scene_ID, scene_filename, (source_stat.st_mtime_ns, source_stat.st_size),
+                                         self.get_scene(scene_ID))
+            self.summaries[scene_ID] = scene_summary
+            self._incoming_edges = None
+
+        return scene_summary
+
+    def index_all(self):
+        """Reads and summarizes every scene not summarized yet."""
+        for each_scene_ID in self.scene_filenames:
+            self.get_summary(each_scene_ID)
+
+    def has_event(self, scene_ID, event_ID):
+        """Returns True if the scene exists and has an event with the given ID."""
+        return scene_ID in self.scene_filenames and event_ID in self.get_summary(scene_ID).event_IDs
+
+    def resolve_target(self, edge):
+        """Returns the (scene ID, event ID) the edge leads to, or None if its scene does not exist."""
+        target_scene_ID, target_event_ID = edge[2], edge[3]
+        if target_scene_ID not in self.scene_filenames:
+            return None
+
+        if target_event_ID is None:
+            target_event_ID = self.get_summary(target_scene_ID).start_in
+
+        return target_scene_ID, target_event_ID
+
+    def edges_from(self, scene_ID, event_ID):
+        """Returns the edges leaving the given event."""
+        return [each_edge for each_edge in self.get_summary(scene_ID).edges if each_edge[0] == event_ID]
+
+    def edges_to(self, scene_ID, event_ID):
+        """Returns every edge in the campaign leading to the given event, as (from scene ID, edge) tuples."""
+        if self._incoming_edges is None:
+            self.index_all()
+
+            self._incoming_edges = collections.defaultdict(list)
+            for each_summary in self.summaries.values():
+                for each_edge in each_summary.edges:
+                    target = self.resolve_target(each_edge)
+                    if target:
+                        self._incoming_edges[target].append((each_summary.scene_ID, each_edge))
+
+        return self._incoming_edges.get((scene_ID, event_ID), [])
+
+    def events_referencing_topic(self, topic_text):
+        """Returns the (scene ID, event ID) of every event with a tag of the topic. With a topic index, tags written
+        as any of the topic's aliases count, otherwise only tags matching the text."""
+        topic_keys = {topics.normalize_topic_key(topic_text)}
+
+        this_topic = self.topic_index.find(topic_text) if self.topic_index else None
+        if this_topic:
+            topic_keys.update(topics.normalize_topic_key(each_key) for each_key in (this_topic.title, *this_topic.aliases))
+
+        self.index_all()
+
+        found_events = []
+        for each_summary in self.summaries.values():
+            for each_key in topic_keys:
+                found_events.extend((each_summary.scene_ID, each_ID) for each_ID in each_summary.topic_tags.get(each_key, ()))
+
+        return sorted(set(found_events))
+
+    def unknown_topic_tags(self):
+        """Returns the (scene ID, event ID, tag key) of every topic tag no topic matches. Needs a topic index."""
+        self.index_all()
+
+        return sorted((each_summary.scene_ID, each_ID, each_key)
+                      for each_summary in self.summaries.values()
+                      for each_key, each_IDs in each_summary.topic_tags.items() if not self.topic_index.find(each_key)
+                      for each_ID in each_IDs)
+
+    def dangling_edges(self):
+        """Returns every edge leading to a missing scene or event, as (from scene ID, edge) tuples."""
+        self.index_all()
+
+        found_edges = []
+        for each_summary in self.summaries.values():
+            for each_edge in each_summary.edges:
+                target = self.resolve_target(each_edge)
+                if not target or not self.has_event(*target):
+                    found_edges.append((each_summary.scene_ID, each_edge))
+
+        return found_edges
+
+    def reachable_events(self, entry_scene_ID):
+        """Returns the set of (scene ID, event ID) reachable from the start of the entry scene. With a topic index,
+        events named after a topic are reachable in every scene that is."""
+        entry_target = self.resolve_target((None, "start", entry_scene_ID, None))
+        if not entry_target or not self.has_event(*entry_target):
+            return set()
+
+        self.index_all()
+
+        # Group the edges by the event they leave, so each event's edges are found at once
+        outgoing_edges = collections.defaultdict(list)
+        for each_summary in self.summaries.values():
+            for each_edge in each_summary.edges:
+                outgoing_edges[each_summary.scene_ID, each_edge[0]].append(each_edge)
+
+        reached_events = {entry_target}
+        reached_scene_IDs = set()
+        events_to_visit = [entry_target]
+
+        while events_to_visit:
+            scene_ID, event_ID = events_to_visit.pop()
+            next_events = [self.resolve_target(each_edge) for each_edge in outgoing_edges[scene_ID, event_ID]]
+
+            # Clicking a topic in a scene runs the scene's event named after the topic, if it has one
+            if self.topic_index and scene_ID not in reached_scene_IDs:
+                reached_scene_IDs.add(scene_ID)
+                next_events.extend((scene_ID, each_ID) for each_ID in self.get_summary(scene_ID).event_IDs
+                                   if self.topic_index.get(each_ID))
+
+            for each_target in next_events:
+                if each_target and each_target not in reached_events and self.has_event(*each_target):
+                    reached_events.add(each_target)
+                    events_to_visit.append(each_target)
+
+        return reached_events
+
+    def unreachable_events(self, entry_scene_ID):
+        """Returns the sorted (scene ID, event ID) of every event that can't be reached from the start of the entry
+        scene. Without a topic index, events only run by clicking a topic are counted as unreachable."""
+        self.index_all()
+        reached_events = self.reachable_events(entry_scene_ID)
+
+        return sorted((each_summary.scene_ID, each_ID) for each_summary in self.summaries.values()
+                      for each_ID in each_summary.event_IDs if (each_summary.scene_ID, each_ID) not in reached_events)
+
+    def get_stats(self):
+        """Returns a dict of the number of scenes, scenes summarized, events and edges."""
+        return {"scenes": len(self.scene_filenames),
+                "summarized": len(self.summaries),
+                "events": sum(len(each_summary.event_IDs) for each_summary in self.summaries.values()),
+                "edges": sum(len(each_summary.edges) for each_summary in self.summaries.values())}
+
+
+if __name__ == "__main__":
+    argument_parser = argparse.ArgumentParser(description="Checks every scene of a campaign for broken and unreachable events.")
+    argument_parser.add_argument("scene_directory", nargs="?", default="scenes", help="the directory of scenes")
+    argument_parser.add_argument("--entry", default="EXAMPLE", help="the ID of the scene the campaign starts in")
+    argument_parser.add_argument("--compiled", help="a directory of compiled scenes to load from and update")
+    argument_parser.add_argument("--topics", help="a topics catalog to check topic tags against")
+    arguments = argument_parser.parse_args()
+
+    start_time = time.perf_counter()
+
+    topic_index = topics.TopicIndex(topics.init_topics(arguments.topics)) if arguments.topics else None
+    campaign = CampaignIndex(arguments.scene_directory, arguments.compiled, topic_index=topic_index)
+    campaign.index_all()
+
+    dangling = campaign.dangling_edges()
+    unreachable = campaign.unreachable_events(arguments.entry)
+    unknown_tags = campaign.unknown_topic_tags() if topic_index else []
+
+    campaign_stats = campaign.get_stats()
+    print(f"Checked {campaign_stats['events']} events and {campaign_stats['edges']} edges in "
+          f"{campaign_stats['scenes']} scenes in {time.perf_counter() - start_time:.2f} s")
+
+    print(f"{len(dangling)} dangling IDs")
+    for each_scene_ID, (from_ID, edge_kind, target_scene_ID, target_ID) in dangling:
+        print(f"  {each_scene_ID}:{from_ID} -{edge_kind}-> {target_scene_ID}:{target_ID}")
+
+    print(f"{len(unreachable)} unreachable events")
+    for each_scene_ID, each_event_ID in unreachable:
+        print(f"  {each_scene_ID}:{each_event_ID}")
+
+    if topic_index:
+        print(f"{len(unknown_tags)} unknown topic tags")
+        for each_scene_ID, each_event_ID, each_key in unknown_tags:
+            print(f"  {each_scene_ID}:{each_event_ID} <{each_key}>")
+
+    sys.exit(1 if dangling else 0)
@@ -4,17 +4,56 @@ import items
 
 
 class CharacterProfile:
-    """The container for all of the player's stats, progress and inventory."""
-    def __init__(self):
+    """The container for all of the player's stats, progress and inventory. The topics are read from the topics file
+    when first used."""
+    def __init__(self, topics_filename="scenes/topics.csv", items_filename="scenes/items.csv"):
         # Lists of various collections
-        self.topics = topics.init_topics("scenes/topics.csv")
-        self.inventory = Inventory()
+        self.topics_filename = topics_filename
+        self._topics = None
+        self._topic_index = None
+        self.inventory = Inventory(items_filename)
+
+    @property
+    def topics(self):
+        """The list of all topics, read when first used."""
+        if self._topics is None:
+            self._topics = topics.init_topics(self.topics_filename)
+
+        return self._topics
+
+    @property
+    def topic_index(self):
+        """The TopicIndex over the list of all topics, built when first used."""
+        if self._topic_index is None:
+            self._topic_index = topics.TopicIndex(self.topics)
+
+        return self._topic_index
+
+    def get_state(self):
+        """Returns the known topics and the stock of the inventory as plain values for a snapshot."""
+        return self.topic_index.get_state(), self.inventory.get_state()
+
+    def set_state(self, character_state):
+        """Restores the known topics and the inventory from get_state."""
+        known_titles, inventory_state = character_state
+        self.topic_index.set_state(known_titles)
+        self.inventory.set_state(inventory_state)
 
 
 class Inventory:
-    """A container for item objects the player has accumulated."""
-    def __init__(self):
-        self.bag = self._init_items()
+    """A container for item objects the player has accumulated. The items are read from the items file when first
+    used."""
+    def __init__(self, items_filename="scenes/items.csv"):
+        self.items_filename = items_filename
+        self._bag = None
+
+    @property
+    def bag(self):
+        """The dict of every item in the game by name, read when first used."""
+        if self._bag is None:
+            self._bag = self._init_items()
+
+        return self._bag
 
     def _init_items(self):
         """Creates a full list of all items in the game. Items are initialized with no stock,
@@ -22,7 +61,7 @@ class Inventory:
         This becomes the player's bag going forward."""
         bag = {}
 
-        with open("scenes/items.csv", newline='') as itemsfile:
+        with open(self.items_filename, newline='') as itemsfile:
             items_csv_reader = csv.reader(itemsfile)
             for each_line in items_csv_reader:
 
@@ -70,3 +109,12 @@ class Inventory:
                 self.bag[item_name].stock -= quantity
                 if self.bag[item_name].stock <= 0:
                     self.bag[item_name].stock = None
+
+    def get_state(self):
+        """Returns a dict of the stock of every item that has been picked up, by item name."""
+        return {each_name: each_item.stock for each_name, each_item in self.bag.items() if each_item.stock is not None}
+
+    def set_state(self, item_stocks):
+        """Sets the stock of every item from a dict made by get_state. Items missing from it have not been picked up."""
+        for each_name, each_item in self.bag.items():
+            each_item.stock = item_stocks.get(each_name)
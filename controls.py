@@ -1,14 +1,30 @@
+import collections
+import math
 import sys
 
 import pygame.event
+import pygame.sprite
+
+
+# The only event types queued, the rest are dropped by pygame before they reach the queue
+INPUT_EVENT_TYPES = (pygame.QUIT, pygame.KEYDOWN, pygame.MOUSEMOTION, pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP,
+                     pygame.MOUSEWHEEL)
 
 
 class Controller:
-    """Provides for player controls and processing."""
+    """Provides for player controls and processing. Each frame, the whole event queue is read at once. Clicks are
+    queued and handed out one per frame, so quick clicks are not lost, and wheel movement is added up into
+    scroll_notches."""
     def __init__(self, settings_object):
         self.settings = settings_object
         self.screen_render_offset_ratio = self.settings.render_surface_size[0] / self.settings.screen_surface_size[0]
         self.controls_enabled = False
+        self.profiler_overlay_toggled = False   # Set when the profiler overlay key is pressed, works while disabled
+
+        # Filter the queue to the events read here, so other events neither fill it nor wake an idle frame
+        if pygame.display.get_init():
+            pygame.event.set_blocked(None)
+            pygame.event.set_allowed(INPUT_EVENT_TYPES)
 
         self._init_control_variables()
 
@@ -17,10 +33,21 @@ class Controller:
         # Left mouse button
         self.last_lmb_down = None
         self.last_lmb_up = None
+        self.pending_lmb_ups = collections.deque()     # Button-up positions not yet handed out as last_lmb_up
+
+        # Scroll wheel, in notches of the wheel since they were last used, positive downwards, and the mouse position
+        self.scroll_notches = 0.0
+        self.scroll_position = None
+
+        # Mouse position, for hovering
+        self.mouse_position = None
+
+        # The last key pressed since it was last used
+        self.last_key_down = None
 
-        # Scroll wheel
-        self.last_scroll_down = None
-        self.last_scroll_up = None
+    def _to_render_position(self, screen_position):
+        """Scales a position on the screen to the render surface."""
+        return screen_position[0] * self.screen_render_offset_ratio, screen_position[1] * self.screen_render_offset_ratio
 
     def update(self):
         """Updates for a single frame of player control."""
@@ -28,19 +55,35 @@ class Controller:
         # Checks the pygame event queue
         for event in pygame.event.get():
             if event.type == pygame.QUIT:   # Handles Quits
+                self.settings.event_log.emit("quit")
                 sys.exit()
+            elif event.type == pygame.KEYDOWN and event.key == self.settings.profiler_overlay_key:
+                self.profiler_overlay_toggled = True
             elif self.controls_enabled:
-                if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:    # Handles left mouse clicks
-                    self.last_lmb_down = (event.pos[0] * self.screen_render_offset_ratio, event.pos[1] * self.screen_render_offset_ratio)
+                if event.type == pygame.MOUSEMOTION:    # Tracks the mouse for hovering, too often to log
+                    self.mouse_position = self._to_render_position(event.pos)
+                    continue
+                elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:    # Handles left mouse clicks
+                    self.last_lmb_down = self._to_render_position(event.pos)
                 elif event.type == pygame.MOUSEBUTTONUP and event.button == 1:      # Handles left mouse clicks
-                    self.last_lmb_up = (event.pos[0] * self.screen_render_offset_ratio, event.pos[1] * self.screen_render_offset_ratio)
-                elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 4:      # Upward scrolling
-                    event_pos = pygame.mouse.get_pos()
-                    self.last_scroll_up = (event_pos[0] * self.screen_render_offset_ratio, event_pos[1] * self.screen_render_offset_ratio)
-                elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 5:      # Downward scrolling
-                    event_pos = pygame.mouse.get_pos()
-                    self.last_scroll_down = (event_pos[0] * self.screen_render_offset_ratio, event_pos[1] * self.screen_render_offset_ratio)
-
+                    self.pending_lmb_ups.append(self._to_render_position(event.pos))
+                elif event.type == pygame.MOUSEWHEEL:   # Wheel and trackpad scrolling, up is positive in the event
+                    self.scroll_notches -= getattr(event, "precise_y", event.y)
+                    self.scroll_position = self._to_render_position(pygame.mouse.get_pos())
+                elif event.type == pygame.KEYDOWN:
+                    self.last_key_down = event.key
+                else:
+                    continue    # Including the wheel's button 4 and 5 presses, which come with every MOUSEWHEEL
+
+                if self.settings.event_log.enabled:
+                    self.settings.event_log.emit("input", type=pygame.event.event_name(event.type),
+                                                 button=getattr(event, "button", None),
+                                                 pos=getattr(event, "pos", self.scroll_position),
+                                                 wheel=getattr(event, "precise_y", None),
+                                                 key=getattr(event, "key", None))
+
+        # Hand out the next click, clicks not used by the last frame are dropped
+        self.last_lmb_up = self.pending_lmb_ups.popleft() if self.pending_lmb_ups else None
 
     def disable(self):
         """Disables the controls and empties any stored control data."""
@@ -56,24 +99,154 @@ class Controller:
          no result found. Can check either or both of button-down and button-up events. If acknowledge is True, then
          the last click is reset to None, to prevent 'phantom clicks' on the space in the future. The offset is an (x,y)
          offset for click detection, it will subtract this amount from the x,y values of the click before checking
-         hit detection. This offset should usually be the .topleft of the rect the buttons are rendered in."""
-
-        for each_sprite in sprite_group:
-
-            if self.last_lmb_down and check_button_down:
-                # Adjust for the offset
-                offset_lmb_down = (self.last_lmb_down[0] - offset[0], self.last_lmb_down[1] - offset[1])
-                if each_sprite.rect.collidepoint(offset_lmb_down):
-                    if acknowledge:
-                        self.last_lmb_down = None
-                    return each_sprite
-
-            elif self.last_lmb_up and check_button_up:
-                # Adjust for the offset
-                offset_lmb_up = (self.last_lmb_down[0] - offset[0], self.last_lmb_down[1] - offset[1])
-                if each_sprite.rect.collidepoint(offset_lmb_up):
-                    if acknowledge:
-                        self.last_lmb_up = None
-                    return each_sprite
+         hit detection. This offset should usually be the .topleft of the rect the buttons are rendered in. A
+         SpatialGroup finds the sprite from its grid, other groups are checked sprite by sprite."""
+        if self.last_lmb_down and check_button_down:
+            clicked_sprite = find_sprite_at(sprite_group, self.last_lmb_down, offset)
+            if clicked_sprite:
+                if acknowledge:
+                    self.last_lmb_down = None
+                return clicked_sprite
+
+        if self.last_lmb_up and check_button_up:
+            clicked_sprite = find_sprite_at(sprite_group, self.last_lmb_up, offset)
+            if clicked_sprite:
+                if acknowledge:
+                    self.last_lmb_up = None
+                return clicked_sprite
 
         return None
+
+    def hover_detect_group(self, sprite_group, offset=(0, 0)):
+        """Returns the sprite in the group under the mouse, or None if there is none. The offset is used as in
+        click_detect_group."""
+        if not self.mouse_position:
+            return None
+
+        return find_sprite_at(sprite_group, self.mouse_position, offset)
+
+
+def find_sprite_at(sprite_group, position, offset=(0, 0)):
+    """Returns a sprite of the group whose rect holds the position less the offset, or None if none does."""
+    offset_position = (position[0] - offset[0], position[1] - offset[1])
+
+    if isinstance(sprite_group, SpatialGroup):
+        return sprite_group.sprite_at(offset_position)
+
+    for each_sprite in sprite_group:
+        if each_sprite.rect.collidepoint(offset_position):
+            return each_sprite
+
+    return None
+
+
+class SpatialGroup(pygame.sprite.Group):
+    """A sprite group that also files its sprites in a uniform grid of square cells by their rects, so the sprites at a
+    point are found by checking a single cell rather than every sprite. A sprite is filed where it is when it joins
+    the group, if it has a rect yet, and must be filed again with reindex() whenever it moves. Sprites leave the grid
+    when they are killed or removed."""
+    def __init__(self, cell_size, *sprites):
+        self.cell_size = cell_size
+
+        self.grid_cells = collections.defaultdict(list)     # (column, row) -> the sprites overlapping the cell
+        self.sprite_cells = {}      # Sprite -> the cells it is filed in
+
+        super().__init__(*sprites)
+
+    def _cells_overlapping(self, rect):
+        """Returns the (column, row) of every cell the rect overlaps."""
+        if rect.width <= 0 or rect.height <= 0:
+            return ()
+
+        first_column, first_row = rect.left // self.cell_size, rect.top // self.cell_size
+        last_column, last_row = (rect.right - 1) // self.cell_size, (rect.bottom - 1) // self.cell_size
+
+        return tuple((each_column, each_row) for each_row in range(first_row, last_row + 1)
+                     for each_column in range(first_column, last_column + 1))
+
+    def _unfile(self, sprite):
+        """Takes the sprite out of every cell it is filed in."""
+        for each_cell in self.sprite_cells.pop(sprite, ()):
+            cell_sprites = self.grid_cells[each_cell]
+            cell_sprites.remove(sprite)
+            if not cell_sprites:
+                del self.grid_cells[each_cell]
+
+    def reindex(self, sprite):
+        """Files the sprite in the cells its rect now overlaps. Call after placing or moving a sprite."""
+        self._unfile(sprite)
+
+        sprite_cells = self._cells_overlapping(sprite.rect)
+        for each_cell in sprite_cells:
+            self.grid_cells[each_cell].append(sprite)
+        self.sprite_cells[sprite] = sprite_cells
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite, layer)
+
+        if getattr(sprite, "rect", None) is not None:
+            self.reindex(sprite)
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        self._unfile(sprite)
+
+    def sprites_at(self, position):
+        """Returns every sprite whose rect holds the position, in the order they were filed."""
+        cell = (int(position[0] // self.cell_size), int(position[1] // self.cell_size))
+
+        return [each_sprite for each_sprite in self.grid_cells.get(cell, ()) if each_sprite.rect.collidepoint(position)]
+
+    def sprite_at(self, position):
+        """Returns the first sprite filed whose rect holds the position, or None if there is none."""
+        for each_sprite in self.grid_cells.get((int(position[0] // self.cell_size), int(position[1] // self.cell_size)), ()):
+            if each_sprite.rect.collidepoint(position):
+                return each_sprite
+
+        return None
+
+
+class ScrollMomentum:
+    """Smooth scrolling with momentum. Each notch of the wheel adds to a velocity that slows exponentially at the
+    friction rate per second, set so a single notch scrolls distance_per_notch in all. Notches arriving while still
+    moving add to the speed, so a fast spin scrolls further and faster rather than being dropped. The distance moved
+    does not depend on the frame rate."""
+    def __init__(self, distance_per_notch, friction, stop_speed):
+        self.distance_per_notch = distance_per_notch
+        self.friction = friction
+        self.stop_speed = stop_speed    # Pixels per second below which the scroll finishes at once
+
+        self.velocity = 0.0     # Pixels per second, positive downwards
+        self._remainder = 0.0   # The fraction of a pixel moved but not yet scrolled
+
+    @property
+    def is_moving(self):
+        return self.velocity != 0.0
+
+    def push(self, notches):
+        """Adds the given number of wheel notches, positive downwards, to the velocity."""
+        self.velocity += notches * self.distance_per_notch * self.friction
+
+    def step(self, elapsed_time):
+        """Advances the scroll by the elapsed seconds. Returns the whole pixels to scroll by, positive downwards."""
+        if not self.velocity:
+            return 0
+
+        decay = math.exp(-self.friction * elapsed_time)
+        scroll_distance = self.velocity * (1 - decay) / self.friction + self._remainder
+        self.velocity *= decay
+
+        # Once slow, travel the rest of the way now, so each notch still scrolls its whole distance
+        if abs(self.velocity) < self.stop_speed:
+            scroll_distance += self.velocity / self.friction
+            self.velocity = 0.0
+
+        scroll_pixels = round(scroll_distance) if not self.velocity else int(scroll_distance)
+        self._remainder = scroll_distance - scroll_pixels if self.velocity else 0.0
+
+        return scroll_pixels
+
+    def stop(self):
+        """Stops scrolling at once."""
+        self.velocity = 0.0
+        self._remainder = 0.0
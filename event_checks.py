@@ -0,0 +1,62 @@
+import random
+
+
+def give_items(event, inventory):
+    """Gives the player items based on the event's give_item details.
+    Returns True if there is a give item command, False otherwise."""
+
+    # Check if there is a give_item command
+    if "give_item" in event.commands:
+        # Give the item
+        inventory.add(event.give_item_name, event.give_item_quantity)
+
+
+def run_item_checks(event_parser, inventory):
+    """Checks if the player has the specified number of items to pass the event,
+    or else sends the player to the fail event. Returns True if there is a check event, False otherwise."""
+
+    event = event_parser.current_event
+
+    # Check if there is an item_check
+    if event.check_item_quantity:
+        # Run the item check
+        if inventory.bag[event.check_item_name].stock and inventory.bag[event.check_item_name].stock >= event.check_item_quantity:
+            event_parser.get_next_event()
+            return True
+        else:
+            event_parser.get_event_at_ID(event.on_fail_event_ID)
+            return True
+
+    return False
+
+
+def run_roll_checks(event_parser, inventory, rng=random, report_rolls=True):
+    """Runs a random roll for the current event. Returns "pass" or "fail" if there is a roll event, False otherwise.
+    The roll is made with rng, which can be a seeded random.Random. If report_rolls is False the roll is not sent to
+    the event log."""
+    event = event_parser.current_event
+
+    # Check if there is a roll_check
+    if event.check_roll_difficulty:
+        # Run the roll_check
+        random_number = rng.randint(1, event.check_roll_range)
+        dice_number = random_number
+        # Add item modifiers
+        try:
+            random_number += inventory.bag[event.check_item_name].stock
+        except (KeyError, TypeError):
+            pass
+
+        if report_rolls:
+            event_parser.settings.event_log.emit("roll", event_ID=event.ID, difficulty=event.check_roll_difficulty,
+                                                 roll_range=event.check_roll_range, dice=dice_number,
+                                                 total=random_number, passed=random_number >= event.check_roll_difficulty)
+
+        if random_number >= event.check_roll_difficulty:
+            event_parser.get_next_event()
+            return "pass"
+
+        event_parser.get_event_at_ID(event.on_fail_event_ID)
+        return "fail"
+
+    return False
@@ -0,0 +1,154 @@
+import collections
+import contextlib
+import time
+
+import pygame
+
+
+class FrameProfiler:
+    """Times the phases of each frame. Phases are timed by nesting section() blocks, and each is known by its stack of
+    section names, such as "frame;draw;sidebar". Keeps the last window timings of each stack for rolling percentiles,
+    and the total self time of each stack over the session for a flamegraph. While disabled, section() does nothing."""
+    def __init__(self, window=600, enabled=False):
+        self.window = window
+        self.enabled = enabled
+
+        self.timings = {}       # Stack -> the last window timings in seconds, including nested sections
+        self.self_times = collections.Counter()     # Stack -> total seconds spent in it outside nested sections
+
+        self._open_sections = []    # [stack, start time, seconds spent in nested sections] of each open section
+
+    @contextlib.contextmanager
+    def section(self, section_name):
+        """Times the code run inside the with block as a phase nested in the currently open phase."""
+        if not self.enabled:
+            yield
+            return
+
+        if self._open_sections:
+            section_stack = self._open_sections[-1][0] + ";" + section_name
+        else:
+            section_stack = section_name
+
+        this_section = [section_stack, time.perf_counter(), 0.0]
+        self._open_sections.append(this_section)
+
+        try:
+            yield
+        finally:
+            elapsed_time = time.perf_counter() - this_section[1]
+            self._open_sections.pop()
+
+            if self._open_sections:
+                self._open_sections[-1][2] += elapsed_time
+
+            if section_stack not in self.timings:
+                self.timings[section_stack] = collections.deque(maxlen=self.window)
+            self.timings[section_stack].append(elapsed_time)
+            self.self_times[section_stack] += elapsed_time - this_section[2]
+
+    def percentiles(self, section_stack):
+        """Returns the p50, p95 and p99 timings of the stack over the window, in milliseconds."""
+        sorted_timings = sorted(self.timings.get(section_stack, ()))
+        if not sorted_timings:
+            return 0.0, 0.0, 0.0
+
+        last_index = len(sorted_timings) - 1
+        return tuple(sorted_timings[round(last_index * each_fraction)] * 1000 for each_fraction in (0.5, 0.95, 0.99))
+
+    def get_stats(self):
+        """Returns a dict of each stack's p50, p95 and p99 in milliseconds and its number of timings in the window,
+        sorted by stack so nested phases follow their parents."""
+        section_stats = {}
+
+        for each_stack in sorted(self.timings):
+            p50, p95, p99 = self.percentiles(each_stack)
+            section_stats[each_stack] = {"p50_ms": p50, "p95_ms": p95, "p99_ms": p99,
+                                         "count": len(self.timings[each_stack])}
+
+        return section_stats
+
+    def dump_flamegraph(self, profile_filename):
+        """Writes the self time of every stack over the session in the collapsed stack format read by flamegraph.pl,
+        speedscope and inferno, one "stack microseconds" line per stack."""
+        with open(profile_filename, "w", encoding="UTF-8") as profilefile:
+            for each_stack, each_time in sorted(self.self_times.items()):
+                profilefile.write(f"{each_stack} {max(0, round(each_time * 1e6))}\n")
+
+    def reset(self):
+        """Forgets every timing."""
+        self.timings.clear()
+        self.self_times.clear()
+
+
+class ProfilerOverlay:
+    """Draws the rolling percentiles of a frame profiler in a box in the corner of a surface. The text is rendered
+    again at most refresh_interval seconds apart, so the overlay costs little to keep on screen."""
+    def __init__(self, settings_object, frame_profiler, refresh_interval=0.25):
+        self.settings = settings_object
+        self.profiler = frame_profiler
+        self.refresh_interval = refresh_interval
+
+        self.is_visible = False
+        self.overlay_surface = None
+        self.overlay_rect = pygame.Rect(0, 0, 0, 0)
+        self._last_render_time = 0.0
+
+    def toggle(self):
+        """Shows or hides the overlay, profiling frames while it is shown, or all the time if a session profile is being
+        written. Returns the rect the overlay covered, which must be repainted when it is hidden."""
+        covered_rect = self.overlay_rect.copy()
+
+        self.is_visible = not self.is_visible
+        self.profiler.enabled = self.is_visible or self.settings.frame_profile_filename is not None
+        self.overlay_surface = None
+        self.overlay_rect = pygame.Rect(0, 0, 0, 0)
+
+        return covered_rect
+
+    def _render(self):
+        """Renders the table of percentiles to the overlay surface. Each column is placed on its own, so the table
+        lines up in any font."""
+        font = self.settings.font_debug
+        table_rows = [("phase", "p50 ms", "p95 ms", "p99 ms")]
+
+        for each_stack, each_stats in self.profiler.get_stats().items():
+            phase_name = "  " * each_stack.count(";") + each_stack.rsplit(";", 1)[-1]
+            table_rows.append((phase_name, f"{each_stats['p50_ms']:.2f}", f"{each_stats['p95_ms']:.2f}",
+                               f"{each_stats['p99_ms']:.2f}"))
+
+        line_height = font.get_linesize()
+        name_width = max(font.size(each_row[0])[0] for each_row in table_rows)
+        number_width = font.size("0000.00 ms")[0]
+
+        # The overlay never shrinks while shown, so it always covers what it drew before
+        overlay_width = max(self.overlay_rect.width, name_width + 3 * number_width + 2 * line_height)
+        overlay_height = max(self.overlay_rect.height, line_height * (len(table_rows) + 1))
+
+        self.overlay_surface = pygame.Surface((overlay_width, overlay_height))
+        self.overlay_surface.fill((0, 0, 0))
+
+        for each_index, each_row in enumerate(table_rows):
+            row_top = line_height // 2 + each_index * line_height
+            self.overlay_surface.blit(font.render(each_row[0], True, (255, 255, 255)), (line_height, row_top))
+
+            # Right align the numbers in their columns
+            for each_column, each_text in enumerate(each_row[1:], 1):
+                rendered_text = font.render(each_text, True, (255, 255, 255))
+                column_right = line_height + name_width + each_column * number_width
+                self.overlay_surface.blit(rendered_text, (column_right - rendered_text.get_width(), row_top))
+
+        self.overlay_rect = self.overlay_surface.get_rect()
+
+    def draw(self, target_surface):
+        """Draws the overlay to the surface if it is visible. Returns the rects drawn, which are empty if it is not."""
+        if not self.is_visible:
+            return []
+
+        if not self.overlay_surface or time.perf_counter() - self._last_render_time > self.refresh_interval:
+            self._render()
+            self._last_render_time = time.perf_counter()
+
+        target_surface.blit(self.overlay_surface, self.overlay_rect)
+
+        return [self.overlay_rect.copy()]
@@ -0,0 +1,77 @@
+import time
+
+import pygame
+
+
+class FrameScheduler:
+    """Paces the main loop. Busy frames, such as while text is being written, are held to the target frame rate by a
+    pygame clock. Idle frames block on the event queue until input arrives or the idle timeout passes, so that a
+    waiting game uses next to no CPU. Keeps timing stats for every frame."""
+    def __init__(self, settings_object):
+        self.settings = settings_object
+        self.clock = pygame.time.Clock()
+
+        self.frame_count = 0
+        self.idle_frame_count = 0
+
+        self.last_work_time = 0.0   # Seconds spent updating and drawing the last frame
+        self.last_wait_time = 0.0   # Seconds spent waiting after the last frame
+        self.total_work_time = 0.0
+        self.total_wait_time = 0.0
+
+        self._frame_start_time = None
+
+    def start_frame(self):
+        """Marks the start of a frame's work. Call before updating and drawing."""
+        self._frame_start_time = time.perf_counter()
+
+    def end_frame(self, is_idle):
+        """Marks the end of a frame's work, then waits until the next frame is due. If is_idle is True, waits for
+        input instead of the frame clock."""
+        work_end_time = time.perf_counter()
+        self.last_work_time = work_end_time - self._frame_start_time
+
+        if is_idle:
+            self._wait_for_input()
+            self.idle_frame_count += 1
+        else:
+            self.clock.tick(self.settings.target_fps)
+
+        self.last_wait_time = time.perf_counter() - work_end_time
+        self.total_work_time += self.last_work_time
+        self.total_wait_time += self.last_wait_time
+        self.frame_count += 1
+
+        event_log = self.settings.event_log
+        if event_log.enabled:
+            event_log.emit("frame", frame=self.frame_count, work_ms=self.last_work_time * 1000,
+                           wait_ms=self.last_wait_time * 1000, idle=is_idle)
+
+            if self.frame_count % self.settings.event_log_stats_interval == 0:
+                event_log.emit("render_cache", reason="interval", **self.settings.render_cache.get_stats())
+                event_log.emit("background_cache", reason="interval", **self.settings.background_cache.get_stats())
+
+    def _wait_for_input(self):
+        """Blocks until an event arrives or the idle timeout passes. The event is put back on the queue for the
+        controller to read."""
+        if not pygame.event.peek():
+            waited_event = pygame.event.wait(self.settings.idle_wait_timeout)
+
+            if waited_event.type != pygame.NOEVENT:
+                pygame.event.post(waited_event)
+
+        # Restart the clock, so the wait does not count against the next busy frame
+        self.clock.tick()
+
+    def get_stats(self):
+        """Returns a dict of frame timing stats. busy_fraction is the share of time spent working rather than waiting,
+        and is close to the CPU use of the loop."""
+        total_time = self.total_work_time + self.total_wait_time
+
+        return {"frames": self.frame_count,
+                "idle_frames": self.idle_frame_count,
+                "last_work_ms": self.last_work_time * 1000,
+                "last_wait_ms": self.last_wait_time * 1000,
+                "average_work_ms": self.total_work_time * 1000 / self.frame_count if self.frame_count else 0.0,
+                "fps": self.clock.get_fps(),
+                "busy_fraction": self.total_work_time / total_time if total_time else 0.0}
@@ -1,3 +1,7 @@
+import collections
+import marshal
+import os
+
 import pygame.sprite
 
 
@@ -24,24 +28,169 @@ class Button(pygame.sprite.Sprite):
         pass
 
 
+# The gray levels of background images that are recolored, and the dynamic color each becomes
+BACKGROUND_PALETTE_KEYS = ((0, "bg_dark"), (64, "bg_midtone_dark"), (128, "bg_midtone_light"), (255, "bg_light"))
+
+# Bump this whenever the layout of cached background indexes changes, old files will then be rebuilt
+BACKGROUND_INDEX_VERSION = 1
+BACKGROUND_INDEX_EXTENSION = ".bgidx"
+
+
+class BackgroundCache:
+    """A least recently used cache of gui backgrounds, scaled and recolored, keyed by the image, the size and the
+    colors of the style. Grayscale images are kept once per size as an 8 bit surface whose pixels are the gray levels,
+    so recoloring to a style is a single palette lookup rather than a pass over the pixels per color. These indexed
+    copies are also saved to the index directory, if one is given, and rebuilt when the image changes. Images with
+    color in them are recolored pixel by pixel. Counts its hits and misses."""
+    def __init__(self, max_backgrounds, index_directory=None):
+        self.max_backgrounds = max_backgrounds
+        self.index_directory = index_directory
+
+        self.backgrounds = collections.OrderedDict()
+        self.indexed_images = {}    # (file path, size) -> 8 bit surface of gray levels, or None if the image has color
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, bg_file_path, size, dynamic_colors):
+        """Returns the background image at the file path, scaled to the size and recolored to the dynamic colors.
+        The returned surface is shared with the cache and must not be drawn on."""
+        style_colors = tuple(tuple(dynamic_colors[each_key]) for each_level, each_key in BACKGROUND_PALETTE_KEYS)
+        background_key = (bg_file_path, tuple(size), style_colors)
+
+        gui_bg = self.backgrounds.get(background_key)
+
+        if gui_bg is None:
+            self.misses += 1
+            gui_bg = self._make_background(bg_file_path, tuple(size), style_colors)
+            self.backgrounds[background_key] = gui_bg
+
+            if len(self.backgrounds) > self.max_backgrounds:
+                self.backgrounds.popitem(last=False)
+
+        else:
+            self.hits += 1
+            self.backgrounds.move_to_end(background_key)
+
+        return gui_bg
+
+    def _make_background(self, bg_file_path, size, style_colors):
+        """Scales and recolors a background image."""
+        image_key = (bg_file_path, size)
+        if image_key not in self.indexed_images:
+            self.indexed_images[image_key] = self._load_indexed_image(bg_file_path, size)
+
+        indexed_image = self.indexed_images[image_key]
+
+        # Images with color in them are recolored one color at a time
+        if indexed_image is None:
+            loaded_image = pygame.image.load(bg_file_path)
+            gui_bg = pygame.Surface(loaded_image.get_size())
+            gui_bg.blit(loaded_image, (0, 0))
+
+            pixel_array = pygame.PixelArray(gui_bg)
+            for (each_level, each_key), each_color in zip(BACKGROUND_PALETTE_KEYS, style_colors):
+                pixel_array.replace((each_level, each_level, each_level), each_color)
+            pixel_array.close()
+
+            return pygame.transform.scale(gui_bg, size)
+
+        # Every gray level keeps its own gray, except the recolored ones
+        palette = [(each_level, each_level, each_level) for each_level in range(256)]
+        for (each_level, each_key), each_color in zip(BACKGROUND_PALETTE_KEYS, style_colors):
+            palette[each_level] = each_color[:3]
+        indexed_image.set_palette(palette)
+
+        gui_bg = pygame.Surface(size)
+        gui_bg.blit(indexed_image, (0, 0))
+
+        return gui_bg
+
+    def _index_path_for(self, bg_file_path, size):
+        """Returns the path of the saved indexed copy of the image at the given size."""
+        image_name = os.path.splitext(os.path.basename(bg_file_path))[0]
+        return os.path.join(self.index_directory, f"{image_name}_{size[0]}x{size[1]}{BACKGROUND_INDEX_EXTENSION}")
+
+    def _load_indexed_image(self, bg_file_path, size):
+        """Returns the image scaled to the size as an 8 bit surface of its gray levels, from the saved copy if it is up
+        to date. Returns None if the image has color in it."""
+        source_stat = os.stat(bg_file_path)
+        index_filename = self._index_path_for(bg_file_path, size) if self.index_directory else None
+
+        if index_filename:
+            try:
+                with open(index_filename, "rb") as indexfile:
+                    index_data = marshal.load(indexfile)
+
+                if index_data[:4] == (BACKGROUND_INDEX_VERSION, source_stat.st_mtime_ns, source_stat.st_size, size):
+                    return pygame.image.frombytes(index_data[4], size, "P") if index_data[4] is not None else None
+
+            except (OSError, EOFError, ValueError, TypeError):
+                pass
+
+        # Scaling is nearest neighbor, so the scaled image has only the gray levels of the original
+        scaled_image = pygame.transform.scale(pygame.image.load(bg_file_path), size)
+        rgb_bytes = pygame.image.tobytes(scaled_image, "RGB")
+        gray_levels = rgb_bytes[0::3]
+
+        if not gray_levels == rgb_bytes[1::3] == rgb_bytes[2::3]:
+            gray_levels = None
+
+        if index_filename:
+            os.makedirs(self.index_directory, exist_ok=True)
+            temporary_filename = index_filename + ".tmp"
+
+            with open(temporary_filename, "wb") as indexfile:
+                marshal.dump((BACKGROUND_INDEX_VERSION, source_stat.st_mtime_ns, source_stat.st_size, size, gray_levels),
+                             indexfile)
+
+            os.replace(temporary_filename, index_filename)
+
+        return pygame.image.frombytes(gray_levels, size, "P") if gray_levels is not None else None
+
+    def clear(self):
+        """Empties the cache, keeping the hit and miss counts."""
+        self.backgrounds.clear()
+        self.indexed_images.clear()
+
+    def get_stats(self):
+        """Returns a dict of the cache's size, hits, misses and hit rate."""
+        lookups = self.hits + self.misses
+
+        return {"size": len(self.backgrounds),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
 def init_bg_surface(settings, bg_file_path):
-    """Takes a filepath and returns the gui_bg surface loaded from that path,
-    colored to match the current dynamic color style."""
+    """Takes a filepath and returns the gui_bg surface loaded from that path, scaled to the render surface and
+    colored to match the current dynamic color style. The surface is shared with the background cache and must not be
+    drawn on."""
+    return settings.background_cache.get(bg_file_path, settings.render_surface_size, settings.dynamic_colors)
+
+
+def merge_rects(rects, max_rects=16):
+    """Merges overlapping rects into their unions and returns the merged list. If more than max_rects remain, they are
+    all merged into one rect, as many small updates cost more than one larger one."""
+    merged_rects = []
+
+    for each_rect in rects:
+        if not each_rect.width or not each_rect.height:
+            continue
+
+        each_rect = each_rect.copy()
 
-    loaded_image = pygame.image.load(bg_file_path)
-    gui_bg = pygame.Surface(loaded_image.get_size())
-    gui_bg.blit(loaded_image, (0, 0))
+        # Absorb every merged rect this one touches, repeating as the rect grows
+        overlap_index = each_rect.collidelist(merged_rects)
+        while overlap_index != -1:
+            each_rect.union_ip(merged_rects.pop(overlap_index))
+            overlap_index = each_rect.collidelist(merged_rects)
 
-    # Create the pixel array
-    pixel_array = pygame.PixelArray(gui_bg)
+        merged_rects.append(each_rect)
 
-    # Recolor the pixels
-    pixel_array.replace((0, 0, 0), settings.dynamic_colors["bg_dark"])
-    pixel_array.replace((64, 64, 64), settings.dynamic_colors["bg_midtone_dark"])
-    pixel_array.replace((128, 128, 128), settings.dynamic_colors["bg_midtone_light"])
-    pixel_array.replace((255, 255, 255), settings.dynamic_colors["bg_light"])
+    if len(merged_rects) > max_rects:
+        merged_rects = [merged_rects[0].unionall(merged_rects[1:])]
 
-    # Close the array
-    pixel_array.close()
+    return merged_rects
 
-    return pygame.transform.scale(gui_bg, settings.render_surface_size)
@@ -0,0 +1,388 @@
+import argparse
+import collections
+import random
+import re
+import time
+
+import character
+import event_checks
+import scene_parser
+import settings
+import topics
+
+
+ITEM_TAG_PATTERN = re.compile(r"\{([^}]*)\}")
+
+
+class PlaythroughResult:
+    """The record of a single headless playthrough."""
+    def __init__(self, seed):
+        self.seed = seed
+
+        self.visited_events = []    # (scene filename, event ID) of every event run, in order
+        self.choices_made = []      # (event ID, choice text)
+        self.topics_clicked = []    # Topic titles, in the order they were clicked
+        self.roll_outcomes = []     # (event ID, passed)
+
+        self.end_reason = None      # "ending", "end_of_scene", "max_steps" or "error"
+        self.end_event_ID = None
+        self.error = None
+        self.final_stock = {}
+
+    def to_record(self):
+        """Returns the playthrough as a tuple of plain values, so two playthroughs can be compared."""
+        return (self.seed, tuple(self.visited_events), tuple(self.choices_made), tuple(self.topics_clicked),
+                tuple(self.roll_outcomes), self.end_reason, self.end_event_ID, self.error,
+                tuple(sorted(self.final_stock.items())))
+
+
+class HeadlessPlaythrough:
+    """Plays through scenes without a display, following the event flow of GUIAdventureScreen and its buttons.
+    Choices are picked by the choice policy, topics are clicked when the topic policy picks one, and items written in
+    the text are picked up as the item policy decides. Each policy is called with this playthrough and a list of
+    options. The choice policy must return one of them, the topic policy may return None to click nothing, and the item
+    policy returns the list of items to pick up."""
+    def __init__(self, settings_object, character_object, initial_scene_script, choice_policy, topic_policy=None,
+                 item_policy=None, rng=None, scene_cache=None, ending_event_IDs=(), max_steps=1000):
+        self.settings = settings_object
+        self.character = character_object
+        self.initial_scene_script = initial_scene_script
+
+        self.choice_policy = choice_policy
+        self.topic_policy = topic_policy
+        self.item_policy = item_policy if item_policy else collect_all_items
+        self.rng = rng if rng else random.Random()
+
+        self.scene_cache = scene_cache
+        self.ending_event_IDs = ending_event_IDs
+        self.max_steps = max_steps
+
+        self.event_parser = None
+        self.result = None
+        self.rolling_text_topics = []   # Topics written since the last wipe, which can still be clicked
+        self.rolling_text_items = []    # (item name, quantity) written since the last wipe and not yet picked up
+
+    def _write_event_text(self):
+        """Stands in for writing the current event's text, collecting the topics and items written in it."""
+        current_event = self.event_parser.current_event
+
+        if "wipe" in current_event.commands:
+            self.rolling_text_topics.clear()
+            self.rolling_text_items.clear()
+        elif "clean_up_items" in current_event.commands:
+            self.rolling_text_items.clear()
+
+        if self.event_parser.suppress_text:
+            self.event_parser.suppress_text = False
+            return
+
+        event_text = " ".join(current_event.text.split())
+
+        for each_tag in topics.TOPIC_TAG_PATTERN.findall(event_text):
+            this_topic = self.character.topic_index.find(each_tag)
+            if this_topic and this_topic not in self.rolling_text_topics:
+                self.rolling_text_topics.append(this_topic)
+
+        for each_tag in ITEM_TAG_PATTERN.findall(event_text):
+            arguments = each_tag.split(",")
+
+            # Check if there is an alias included
+            if len(arguments) < 3:
+                self.rolling_text_items.append((arguments[0], int(arguments[1])))
+            else:
+                self.rolling_text_items.append((arguments[1], int(arguments[2])))
+
+    def _pick_up_items(self):
+        """Picks up the written items chosen by the item policy, as clicking an ItemTopicSprite would."""
+        if not self.rolling_text_items:
+            return
+
+        for each_item in self.item_policy(self, list(self.rolling_text_items)):
+            self.character.inventory.add(each_item[0], each_item[1])
+            self.rolling_text_items.remove(each_item)
+
+    def _topic_options(self):
+        """Returns the topics that could be clicked now, as ("rolling", topic) for topics written in the text and
+        ("sidebar", topic) for active topics in the sidebar."""
+        if not self.event_parser.enable_topics:
+            return []
+
+        topic_options = [("rolling", each_topic) for each_topic in self.rolling_text_topics]
+
+        for each_topic in self.character.topic_index.known_topics:
+            if (each_topic.title in self.event_parser.current_events_script or
+                    each_topic.title in self.event_parser.use_generic_topics):
+                topic_options.append(("sidebar", each_topic))
+
+        return topic_options
+
+    def _click_topic(self, topic_option):
+        """Runs a topic click as TopicSprite or SidebarTopicSprite would."""
+        topic_source, this_topic = topic_option
+        self.result.topics_clicked.append(this_topic.title)
+
+        self.character.topic_index.mark_known(this_topic)
+
+        self.event_parser.mark_this_event()
+
+        if topic_source == "rolling":
+            use_scene_event = this_topic.title in self.event_parser.current_events_script
+        else:
+            use_scene_event = this_topic.title not in self.event_parser.use_generic_topics
+
+        if use_scene_event:
+            self.event_parser.get_event_at_ID(this_topic.title)
+        else:
+            self.event_parser.get_event_at_ID("", inject_event=this_topic.event)
+
+    def _set_event_markers(self):
+        """Sets the event markers, as GUIAdventureScreen.set_event_markers does."""
+        current_event = self.event_parser.current_event
+
+        if "clear_marks" in current_event.commands:
+            self.event_parser.clear_marked_events()
+        elif "forget_mark" in current_event.commands:
+            self.event_parser.clear_marked_events(1)
+
+        if "mark" in current_event.commands:
+            self.event_parser.mark_this_event()
+
+    def _continue_event(self):
+        """Moves on from the current event as the continue button or a silent event would. Returns False if the
+        event has nowhere to go next."""
+        current_event = self.event_parser.current_event
+        self._set_event_markers()
+
+        event_checks.give_items(current_event, self.character.inventory)
+
+        if event_checks.run_item_checks(self.event_parser, self.character.inventory):
+            return True
+
+        roll_outcome = event_checks.run_roll_checks(self.event_parser, self.character.inventory, self.rng,
+                                                    report_rolls=False)
+        if roll_outcome:
+            self.result.roll_outcomes.append((current_event.ID, roll_outcome == "pass"))
+            return True
+
+        if current_event.next_ID is None:
+            return False
+
+        self.event_parser.get_next_event()
+        return True
+
+    def play(self, seed=None):
+        """Plays from the initial scene until an ending, the end of a scene, an error or max_steps events. Returns the
+        PlaythroughResult."""
+        self.result = PlaythroughResult(seed)
+        self.rolling_text_topics = []
+        self.rolling_text_items = []
+
+        try:
+            self.event_parser = scene_parser.SceneParser(self.initial_scene_script, self.settings, self.scene_cache)
+
+            for each_step in range(self.max_steps):
+                current_event = self.event_parser.current_event
+                self.result.visited_events.append((self.event_parser.current_scene_filename, current_event.ID))
+
+                if current_event.ID in self.ending_event_IDs:
+                    self.result.end_reason = "ending"
+                    break
+
+                self._write_event_text()
+                self._pick_up_items()
+
+                # Silent events move on by themselves
+                if "silent" in current_event.commands:
+                    if not self._continue_event():
+                        self.result.end_reason = "end_of_scene"
+                        break
+                    continue
+
+                # Otherwise the player may click a topic instead of moving on
+                topic_options = self._topic_options()
+                if topic_options and self.topic_policy:
+                    chosen_topic = self.topic_policy(self, topic_options)
+                    if chosen_topic:
+                        self._click_topic(chosen_topic)
+                        continue
+
+                if "choice" in current_event.commands:
+                    chosen_text = self.choice_policy(self, list(current_event.choices))
+                    self.result.choices_made.append((current_event.ID, chosen_text))
+                    self._set_event_markers()
+                    self.event_parser.get_event_at_ID(current_event.choices[chosen_text])
+
+                elif not self._continue_event():
+                    self.result.end_reason = "end_of_scene"
+                    break
+
+            else:
+                self.result.end_reason = "max_steps"
+
+        except (KeyError, IndexError, OSError, ValueError) as error:
+            self.result.end_reason = "error"
+            self.result.error = f"{type(error).__name__}: {error}"
+
+        if self.event_parser and self.event_parser.current_event:
+            self.result.end_event_ID = self.event_parser.current_event.ID
+
+        for each_name, each_item in self.character.inventory.bag.items():
+            if each_item.stock is not None:
+                self.result.final_stock[each_name] = each_item.stock
+
+        return self.result
+
+
+def random_policy(playthrough, options):
+    """Picks one of the options at random, with the playthrough's random generator."""
+    return playthrough.rng.choice(options)
+
+
+def first_option_policy(playthrough, options):
+    """Always picks the first option."""
+    return options[0]
+
+
+def collect_all_items(playthrough, item_options):
+    """Picks up every item written in the text."""
+    return item_options
+
+
+class ScriptedPolicy:
+    """Picks options from a script of choice texts or option indexes, in order. Once the script runs out, or when the
+    scripted choice is not one of the options, falls back to the fallback policy. The place in the script is the
+    number of choices the playthrough has made, so every playthrough follows the script from its start."""
+    def __init__(self, scripted_choices, fallback_policy=first_option_policy):
+        self.scripted_choices = list(scripted_choices)
+        self.fallback_policy = fallback_policy
+
+    def __call__(self, playthrough, options):
+        choice_index = len(playthrough.result.choices_made)
+
+        if choice_index < len(self.scripted_choices):
+            scripted_choice = self.scripted_choices[choice_index]
+
+            if isinstance(scripted_choice, int) and scripted_choice < len(options):
+                return options[scripted_choice]
+            elif scripted_choice in options:
+                return scripted_choice
+
+        return self.fallback_policy(playthrough, options)
+
+
+class RandomTopicPolicy:
+    """Clicks one of the available topics at random with the given chance per event, otherwise clicks nothing."""
+    def __init__(self, click_chance=0.1):
+        self.click_chance = click_chance
+
+    def __call__(self, playthrough, topic_options):
+        if playthrough.rng.random() < self.click_chance:
+            return playthrough.rng.choice(topic_options)
+
+        return None
+
+
+class HeadlessRunner:
+    """Runs many headless playthroughs of a scene script. The settings, the scene cache and the topic and item catalogs
+    are shared between playthroughs, and the character is reset to its starting state before each one. Each
+    playthrough is seeded, so the same seed always plays the same way."""
+    def __init__(self, initial_scene_script, choice_policy=random_policy, topic_policy=None, item_policy=None,
+                 ending_event_IDs=(), max_steps=1000, settings_object=None):
+        self.settings = settings_object if settings_object else settings.Settings(headless=True)
+        self.character = character.CharacterProfile()
+        self.scene_cache = scene_parser.SceneCache(self.settings.scene_cache_size, self.settings.scene_cache_event_budget)
+
+        self.initial_scene_script = initial_scene_script
+        self.choice_policy = choice_policy
+        self.topic_policy = topic_policy
+        self.item_policy = item_policy
+        self.ending_event_IDs = ending_event_IDs
+        self.max_steps = max_steps
+
+        self._starting_known_topics = [each_topic.is_known_topic for each_topic in self.character.topics]
+
+        self.last_run_time = 0.0
+
+    def reset_character(self):
+        """Returns the character to its starting state, forgetting topics learned and emptying the bag."""
+        for each_topic, was_known in zip(self.character.topics, self._starting_known_topics):
+            each_topic.is_known_topic = was_known
+        self.character.topic_index.refresh_known()
+
+        for each_item in self.character.inventory.bag.values():
+            each_item.stock = None
+
+    def run_one(self, seed):
+        """Plays a single playthrough with the given seed and returns its PlaythroughResult."""
+        self.reset_character()
+
+        this_playthrough = HeadlessPlaythrough(self.settings, self.character, self.initial_scene_script,
+                                               self.choice_policy, self.topic_policy, self.item_policy,
+                                               random.Random(seed), self.scene_cache, self.ending_event_IDs,
+                                               self.max_steps)
+
+        return this_playthrough.play(seed)
+
+    def run(self, run_count, first_seed=0):
+        """Plays run_count playthroughs, seeded first_seed onwards. Returns the list of PlaythroughResults."""
+        start_time = time.perf_counter()
+        results = [self.run_one(each_seed) for each_seed in range(first_seed, first_seed + run_count)]
+        self.last_run_time = time.perf_counter() - start_time
+
+        return results
+
+    def find_unrepeatable_seeds(self, run_count, first_seed=0):
+        """Plays run_count playthroughs with run, then each seed again alone in reverse order. Returns the seeds that
+        played differently the second time, which should be none, as each playthrough depends only on its seed."""
+        run_results = self.run(run_count, first_seed)
+
+        return [each_result.seed for each_result in reversed(run_results)
+                if self.run_one(each_result.seed).to_record() != each_result.to_record()]
+
+    def count_event_coverage(self, results):
+        """Returns how many distinct scene events the results visited, and how many events the scenes they loaded
+        hold. Generic topic responses are not scene events and are not counted."""
+        visited_events = set()
+        for each_result in results:
+            visited_events.update(each_result.visited_events)
+
+        visited_count = 0
+        total_events = 0
+        for each_filename, each_scene in list(self.scene_cache.scenes.items()):
+            total_events += len(each_scene.events)
+            visited_count += sum(1 for each_ID in each_scene.events if (each_filename, each_ID) in visited_events)
+
+        return visited_count, total_events
+
+
+if __name__ == "__main__":
+    argument_parser = argparse.ArgumentParser(description="Plays scenes without a display, for coverage and balancing.")
+    argument_parser.add_argument("scene", nargs="?", default="scenes/EXAMPLE.csv", help="the scene to start in")
+    argument_parser.add_argument("--runs", type=int, default=1000, help="the number of playthroughs")
+    argument_parser.add_argument("--seed", type=int, default=0, help="the seed of the first playthrough")
+    argument_parser.add_argument("--max-steps", type=int, default=200, help="the most events run per playthrough")
+    argument_parser.add_argument("--topic-chance", type=float, default=0.1, help="the chance of clicking a topic per event")
+    argument_parser.add_argument("--ending", action="append", default=[], help="an event ID that ends a playthrough")
+    argument_parser.add_argument("--script", type=int, nargs="+", help="the option indexes to choose, in order, "
+                                                                       "choosing at random after them")
+    argument_parser.add_argument("--check", action="store_true", help="check every seed plays the same way alone")
+    arguments = argument_parser.parse_args()
+
+    runner_choice_policy = ScriptedPolicy(arguments.script, random_policy) if arguments.script else random_policy
+    runner = HeadlessRunner(arguments.scene, runner_choice_policy, RandomTopicPolicy(arguments.topic_chance),
+                            ending_event_IDs=set(arguments.ending), max_steps=arguments.max_steps)
+
+    if arguments.check:
+        unrepeatable_seeds = runner.find_unrepeatable_seeds(arguments.runs, arguments.seed)
+        print(f"{len(unrepeatable_seeds)} of {arguments.runs} seeds played differently alone: {unrepeatable_seeds[:10]}")
+
+    run_results = runner.run(arguments.runs, arguments.seed)
+
+    visited_count, event_count = runner.count_event_coverage(run_results)
+    end_reasons = collections.Counter(each_result.end_reason for each_result in run_results)
+
+    print(f"{arguments.runs} playthroughs in {runner.last_run_time:.2f} s, "
+          f"{arguments.runs / runner.last_run_time:.0f} per second")
+    print(f"Visited {visited_count} of {event_count} events")
+    for each_reason, each_count in end_reasons.most_common():
+        print(f"  {each_reason}: {each_count}")
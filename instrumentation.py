@@ -0,0 +1,74 @@
+import collections
+import json
+import time
+
+
+class NullSink:
+    """A sink that drops every record. An event log with this sink is disabled and costs next to nothing."""
+    def emit(self, record):
+        pass
+
+    def close(self):
+        pass
+
+
+class RingBufferSink:
+    """A sink that keeps the most recent max_records records in memory, dropping the oldest."""
+    def __init__(self, max_records=10000):
+        self.records = collections.deque(maxlen=max_records)
+
+    def emit(self, record):
+        self.records.append(record)
+
+    def close(self):
+        pass
+
+
+class JSONLSink:
+    """A sink that writes each record as a line of JSON to a file. Values JSON can't store are written as strings."""
+    def __init__(self, log_filename):
+        self.log_file = open(log_filename, "a", encoding="UTF-8")
+
+    def emit(self, record):
+        self.log_file.write(json.dumps(record, default=str) + "\n")
+
+    def close(self):
+        self.log_file.close()
+
+
+class PrintSink:
+    """A sink that prints each record as a line of key=value pairs, for watching the log from the console."""
+    def emit(self, record):
+        print(record["event"], " ".join(f"{each_key}={each_value}" for each_key, each_value in record.items()
+                                        if each_key not in ("event", "time")))
+
+    def close(self):
+        pass
+
+
+class EventLog:
+    """Emits structured events, each a dict of an event name, the perf_counter time and fields, to a sink. With the
+    default NullSink the log is disabled and emit returns at once. Callers whose fields are costly to build should
+    check enabled first."""
+    def __init__(self, sink=None):
+        self.sink = None
+        self.enabled = False
+        self.set_sink(sink)
+
+    def set_sink(self, sink):
+        """Sends all following events to the sink, or disables the log if sink is None or a NullSink."""
+        self.sink = sink or NullSink()
+        self.enabled = not isinstance(self.sink, NullSink)
+
+    def emit(self, event_name, **fields):
+        """Emits an event with the given fields."""
+        if not self.enabled:
+            return
+
+        record = {"event": event_name, "time": time.perf_counter()}
+        record.update(fields)
+        self.sink.emit(record)
+
+    def close(self):
+        """Closes the sink."""
+        self.sink.close()
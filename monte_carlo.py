@@ -0,0 +1,244 @@
+import argparse
+import collections
+import concurrent.futures
+import json
+import os
+
+import headless_runner
+import scene_parser
+
+
+class SimulationResult:
+    """Totals gathered from many headless playthroughs. Every total is a count, so results from separate shards of
+    seeds can be merged in any order and give the same totals."""
+    def __init__(self):
+        self.run_count = 0
+
+        self.event_visits = collections.Counter()       # (scene filename, event ID) -> visits
+        self.transitions = collections.Counter()        # ((scene, event ID), (scene, event ID)) -> times taken
+        self.roll_outcomes = collections.Counter()      # (event ID, passed) -> rolls
+        self.endings = collections.Counter()            # (end reason, end event ID) -> playthroughs
+
+    def add_playthrough(self, playthrough_result):
+        """Adds the totals of a single PlaythroughResult."""
+        self.run_count += 1
+
+        visited_events = playthrough_result.visited_events
+        self.event_visits.update(visited_events)
+        self.transitions.update(zip(visited_events, visited_events[1:]))
+        self.roll_outcomes.update(playthrough_result.roll_outcomes)
+        self.endings[(playthrough_result.end_reason, playthrough_result.end_event_ID)] += 1
+
+    def merge(self, other_result):
+        """Adds the totals of another SimulationResult to this one."""
+        self.run_count += other_result.run_count
+        self.event_visits.update(other_result.event_visits)
+        self.transitions.update(other_result.transitions)
+        self.roll_outcomes.update(other_result.roll_outcomes)
+        self.endings.update(other_result.endings)
+
+    def branch_probabilities(self):
+        """Returns, for every event left more than one way, the chance of taking each way out of it."""
+        departures = collections.defaultdict(collections.Counter)
+        for (from_event, to_event), each_count in self.transitions.items():
+            departures[from_event][to_event] = each_count
+
+        branch_probabilities = {}
+        for from_event, each_departure in departures.items():
+            if len(each_departure) > 1:
+                departure_total = sum(each_departure.values())
+                branch_probabilities[from_event] = {to_event: each_count / departure_total
+                                                    for to_event, each_count in each_departure.items()}
+
+        return branch_probabilities
+
+    def roll_pass_rates(self):
+        """Returns the share of rolls passed at each event with a roll check."""
+        roll_totals = collections.Counter()
+        roll_passes = collections.Counter()
+        for (event_ID, passed), each_count in self.roll_outcomes.items():
+            roll_totals[event_ID] += each_count
+            if passed:
+                roll_passes[event_ID] += each_count
+
+        return {event_ID: roll_passes[event_ID] / each_total for event_ID, each_total in roll_totals.items()}
+
+    def ending_frequencies(self):
+        """Returns the share of playthroughs that ended each way, keyed by (end reason, end event ID)."""
+        return {each_ending: each_count / self.run_count for each_ending, each_count in self.endings.items()}
+
+    def to_dict(self):
+        """Returns the results as a dict of plain values, sorted so the same results always give the same dict."""
+        def event_name(event_key):
+            return f"{event_key[0]}:{event_key[1]}"
+
+        return {"runs": self.run_count,
+                "event_visits": {event_name(each_event): each_count
+                                 for each_event, each_count in sorted(self.event_visits.items())},
+                "branch_probabilities": {event_name(from_event): {event_name(to_event): each_probability
+                                                                  for to_event, each_probability in sorted(each_branch.items())}
+                                         for from_event, each_branch in sorted(self.branch_probabilities().items())},
+                "roll_pass_rates": dict(sorted(self.roll_pass_rates().items())),
+                "endings": {f"{each_reason}:{each_event_ID}": each_frequency
+                            for (each_reason, each_event_ID), each_frequency in sorted(self.ending_frequencies().items(), key=str)}}
+
+
+class SimulationConfig:
+    """Everything a worker process needs to build its own HeadlessRunner. The policies must be picklable, so module
+    level functions or instances of module level classes."""
+    def __init__(self, initial_scene_script, choice_policy=headless_runner.random_policy, topic_policy=None,
+                 item_policy=None, ending_event_IDs=(), max_steps=1000):
+        self.initial_scene_script = initial_scene_script
+        self.choice_policy = choice_policy
+        self.topic_policy = topic_policy
+        self.item_policy = item_policy
+        self.ending_event_IDs = frozenset(ending_event_IDs)
+        self.max_steps = max_steps
+
+
+# Each worker process builds its runner once, with its own scene parser, inventory and scene cache
+_worker_runner = None
+
+
+def _init_worker(simulation_config):
+    """Builds the HeadlessRunner of this worker process."""
+    global _worker_runner
+    _worker_runner = headless_runner.HeadlessRunner(simulation_config.initial_scene_script,
+                                                    simulation_config.choice_policy, simulation_config.topic_policy,
+                                                    simulation_config.item_policy, simulation_config.ending_event_IDs,
+                                                    simulation_config.max_steps)
+
+
+def _run_shard(first_seed, run_count):
+    """Plays a shard of seeds on this worker's runner and returns their SimulationResult."""
+    shard_result = SimulationResult()
+
+    for each_seed in range(first_seed, first_seed + run_count):
+        shard_result.add_playthrough(_worker_runner.run_one(each_seed))
+
+    return shard_result
+
+
+def simulate(simulation_config, run_count, first_seed=0, worker_count=None, shard_size=None):
+    """Plays run_count playthroughs seeded first_seed onwards across worker_count processes, and returns the merged
+    SimulationResult. Every playthrough is seeded by its own seed and every total is a count, so the result is the
+    same for the same seeds whatever the number of workers."""
+    if worker_count is None:
+        worker_count = os.cpu_count() or 1
+
+    if shard_size is None:
+        shard_size = max(1, min(1000, run_count // (worker_count * 4)))
+
+    shards = [(each_seed, min(shard_size, first_seed + run_count - each_seed))
+              for each_seed in range(first_seed, first_seed + run_count, shard_size)]
+
+    simulation_result = SimulationResult()
+
+    # A single worker runs in this process, without the cost of starting a pool
+    if worker_count == 1:
+        _init_worker(simulation_config)
+        for each_shard in shards:
+            simulation_result.merge(_run_shard(*each_shard))
+
+        return simulation_result
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=worker_count, initializer=_init_worker,
+                                                initargs=(simulation_config,)) as executor:
+        for each_shard_result in executor.map(_run_shard, *zip(*shards)):
+            simulation_result.merge(each_shard_result)
+
+    return simulation_result
+
+
+def check_worker_independence(simulation_config, run_count, first_seed=0, worker_count=4, shard_size=None):
+    """Simulates the seeds in this process and again across worker_count processes. Returns True if both give the
+    same results, as they should whatever the policies."""
+    single_result = simulate(simulation_config, run_count, first_seed, worker_count=1)
+    pooled_result = simulate(simulation_config, run_count, first_seed, worker_count, shard_size)
+
+    return single_result.to_dict() == pooled_result.to_dict()
+
+
+def roll_pass_chance(roll_check, item_stock=0):
+    """Returns the exact chance of passing a RollCheck, given the stock of its item."""
+    passing_rolls = sum(1 for each_roll in range(1, roll_check.roll_range + 1)
+                        if each_roll + item_stock >= roll_check.difficulty)
+    return passing_rolls / roll_check.roll_range
+
+
+def find_roll_rate_errors(simulation_result, max_deviations=4):
+    """Checks the pass rate of every roll against the exact chance of its roll check, read from the scenes visited.
+    Returns a dict of (pass rate, chance) by event ID for the rolls whose rate could not come from their chance: a
+    roll that cannot pass was passed, one that cannot fail was failed, or the rate is more than max_deviations
+    standard errors from the chance. Rolls adding the stock of an item, and event IDs with different rolls in
+    different scenes, have no single chance and are not checked."""
+    roll_checks = {}
+    for each_scene_filename in {each_scene for each_scene, each_event_ID in simulation_result.event_visits}:
+        for each_event in scene_parser.parse_scene_file(each_scene_filename).events.values():
+            if each_event.roll_check:
+                roll_checks.setdefault(each_event.ID, set()).add(each_event.roll_check.to_record())
+
+    roll_totals = collections.Counter()
+    for (event_ID, passed), each_count in simulation_result.roll_outcomes.items():
+        roll_totals[event_ID] += each_count
+
+    roll_rate_errors = {}
+    for event_ID, each_rate in simulation_result.roll_pass_rates().items():
+        each_records = roll_checks.get(event_ID, ())
+        if len(each_records) != 1 or next(iter(each_records))[3]:
+            continue
+
+        each_chance = roll_pass_chance(scene_parser.RollCheck(*next(iter(each_records))))
+        standard_error = (each_chance * (1 - each_chance) / roll_totals[event_ID]) ** 0.5
+
+        if abs(each_rate - each_chance) > max_deviations * standard_error:
+            roll_rate_errors[event_ID] = (each_rate, each_chance)
+
+    return roll_rate_errors
+
+
+if __name__ == "__main__":
+    argument_parser = argparse.ArgumentParser(description="Plays scenes many times across processes to measure "
+                                                          "branch, roll and ending frequencies.")
+    argument_parser.add_argument("scene", nargs="?", default="scenes/EXAMPLE.csv", help="the scene to start in")
+    argument_parser.add_argument("--runs", type=int, default=10000, help="the number of playthroughs")
+    argument_parser.add_argument("--seed", type=int, default=0, help="the seed of the first playthrough")
+    argument_parser.add_argument("--workers", type=int, default=None, help="the number of worker processes")
+    argument_parser.add_argument("--max-steps", type=int, default=200, help="the most events run per playthrough")
+    argument_parser.add_argument("--topic-chance", type=float, default=0.1, help="the chance of clicking a topic per event")
+    argument_parser.add_argument("--ending", action="append", default=[], help="an event ID that ends a playthrough")
+    argument_parser.add_argument("--json", help="write the results to this JSON file")
+    argument_parser.add_argument("--script", type=int, nargs="+", help="the option indexes to choose, in order, "
+                                                                       "choosing at random after them")
+    argument_parser.add_argument("--check", action="store_true",
+                                 help="check one process and --workers processes give the same results, and every "
+                                      "roll passes as often as its chance")
+    arguments = argument_parser.parse_args()
+
+    if arguments.script:
+        config_choice_policy = headless_runner.ScriptedPolicy(arguments.script, headless_runner.random_policy)
+    else:
+        config_choice_policy = headless_runner.random_policy
+
+    config = SimulationConfig(arguments.scene, config_choice_policy,
+                              headless_runner.RandomTopicPolicy(arguments.topic_chance),
+                              ending_event_IDs=arguments.ending, max_steps=arguments.max_steps)
+
+    if arguments.check:
+        is_independent = check_worker_independence(config, arguments.runs, arguments.seed, arguments.workers or 4)
+        print(f"Results {'match' if is_independent else 'DIFFER'} between 1 and {arguments.workers or 4} workers")
+
+    result = simulate(config, arguments.runs, arguments.seed, arguments.workers)
+
+    if arguments.json:
+        with open(arguments.json, "w", encoding="UTF-8") as jsonfile:
+            json.dump(result.to_dict(), jsonfile, indent=2)
+
+    print(f"{result.run_count} playthroughs")
+    if arguments.check:
+        for each_event_ID, (each_rate, each_chance) in sorted(find_roll_rate_errors(result).items()):
+            print(f"  Roll at {each_event_ID} passed {each_rate:.1%}, but its chance is {each_chance:.1%}")
+    for each_event_ID, each_rate in sorted(result.roll_pass_rates().items()):
+        print(f"  Roll at {each_event_ID} passed {each_rate:.1%}")
+    for (each_reason, each_event_ID), each_frequency in sorted(result.ending_frequencies().items(), key=str):
+        print(f"  Ended by {each_reason} at {each_event_ID}: {each_frequency:.1%}")
@@ -0,0 +1,79 @@
+import fractions
+
+import pygame
+
+
+class Presenter:
+    """Puts the frames drawn by a gui panel on the display. In "native" mode the render surface is the size of the
+    screen and its repainted regions are copied across. In "scaled" mode the scaled frame is cached, and only the
+    repainted regions are scaled down into it before being pushed to the display."""
+    def __init__(self, settings_object):
+        self.settings = settings_object
+
+        self.scaled_surface = None  # The cached frame, scaled to the screen
+        self._scaled_from_size = None
+        self._horizontal_ratio = None
+        self._vertical_ratio = None
+
+    def _scale_region(self, render_surface, render_rect):
+        """Scales one region of the render surface into the cached scaled frame. Returns the screen rect updated.
+        The region is grown to whole blocks of the scaling ratio, so that it lines up with the pixels around it."""
+        source_left, screen_left = _align_to_scale(render_rect.left, self._horizontal_ratio, round_up=False)
+        source_right, screen_right = _align_to_scale(render_rect.right, self._horizontal_ratio, round_up=True)
+        source_top, screen_top = _align_to_scale(render_rect.top, self._vertical_ratio, round_up=False)
+        source_bottom, screen_bottom = _align_to_scale(render_rect.bottom, self._vertical_ratio, round_up=True)
+
+        source_rect = pygame.Rect(source_left, source_top, source_right - source_left, source_bottom - source_top)
+        screen_rect = pygame.Rect(screen_left, screen_top, screen_right - screen_left, screen_bottom - screen_top)
+
+        scaled_region = pygame.transform.smoothscale(render_surface.subsurface(source_rect), screen_rect.size)
+        self.scaled_surface.blit(scaled_region, screen_rect)
+
+        return screen_rect
+
+    def present(self, render_surface, repainted_rects):
+        """Pushes the repainted regions of the render surface to the display. Does nothing if none were repainted."""
+        if not repainted_rects:
+            return
+
+        display_surface = self.settings.display_surface
+        frame_profiler = self.settings.frame_profiler
+
+        if render_surface.get_size() == display_surface.get_size():
+            with frame_profiler.section("copy"):
+                for each_rect in repainted_rects:
+                    display_surface.blit(render_surface, each_rect, each_rect)
+
+            with frame_profiler.section("display_update"):
+                pygame.display.update(repainted_rects)
+            return
+
+        # The first frame, or a frame of a new size, is scaled whole
+        with frame_profiler.section("smoothscale"):
+            if not self.scaled_surface or render_surface.get_size() != self._scaled_from_size:
+                self._horizontal_ratio = fractions.Fraction(display_surface.get_width(), render_surface.get_width())
+                self._vertical_ratio = fractions.Fraction(display_surface.get_height(), render_surface.get_height())
+                self.scaled_surface = pygame.transform.smoothscale(render_surface, display_surface.get_size())
+                self._scaled_from_size = render_surface.get_size()
+                screen_rects = [self.scaled_surface.get_rect()]
+
+            else:
+                screen_rects = [self._scale_region(render_surface, each_rect) for each_rect in repainted_rects]
+
+        with frame_profiler.section("copy"):
+            for each_rect in screen_rects:
+                display_surface.blit(self.scaled_surface, each_rect, each_rect)
+
+        with frame_profiler.section("display_update"):
+            pygame.display.update(screen_rects)
+
+
+def _align_to_scale(render_position, ratio, round_up):
+    """Moves a position on the render surface to the nearest edge of a whole block of the scaling ratio, a block being
+    ratio.denominator render pixels that scale to ratio.numerator screen pixels. Returns the render and screen
+    positions of that edge."""
+    block_count = render_position // ratio.denominator
+    if round_up and render_position % ratio.denominator:
+        block_count += 1
+
+    return block_count * ratio.denominator, block_count * ratio.numerator
@@ -1,12 +1,21 @@
-import random
+import time
 import pygame
 
-import mypyg
 import scene_parser
+import autosave
 import controls
+import event_checks
 import settings
+import snapshots
+import topics
 import character
+import frame_profiler
+import frame_scheduler
 import gui
+import presentation
+import startup_profiler
+import text_layout
+import transcript
 
 
 class GUIAdventureScreen:
@@ -18,11 +27,11 @@ class GUIAdventureScreen:
         self.controller = controller_object  # Store the controls container
 
         # Initialize render surfaces
-        self.gui_bg, self.render_surface, self.sidebar_topics_surface, self.rolling_text_surface, self.header_surface = self._init_surfaces()
+        self.gui_bg, self.render_surface, self.sidebar_topics_surface, self.header_surface = self._init_surfaces()
 
         # Initialize the sprite groups
-        self.rolling_text_clickable_topics_group = pygame.sprite.Group()
-        self.sidebar_topics_group = pygame.sprite.Group()
+        self.rolling_text_clickable_topics_group = controls.SpatialGroup(self.settings.hit_grid_cell_size)
+        self.sidebar_topics_group = controls.SpatialGroup(self.settings.hit_grid_cell_size)
         self.buttons_group = pygame.sprite.Group()
 
         # Initialize the rect for the topic sidebar
@@ -30,11 +39,21 @@ class GUIAdventureScreen:
         self.sidebar_focus_rect = self.sidebar_topics_rect.copy()
         self.sidebar_topics_rect.topleft = (self.settings.render_surface_size[0] * 0.83, self.settings.render_surface_size[1] * 0.08)
 
-        # Initialize the rect for the main text box
-        self.rolling_textbox_rect = self.rolling_text_surface.get_rect()
+        # Initialize the transcript and the rect for the main text box, the focus rect being the part of the transcript shown
+        rolling_textbox_size = (int(self.settings.render_surface_size[0] * 0.39), int(self.settings.render_surface_size[1] * 0.71))
+        self.rolling_text_transcript = transcript.RollingTextTranscript(self.settings, rolling_textbox_size,
+                                                                        rolling_textbox_size[1] * self.settings.rolling_text_history_screens)
+        self.rolling_textbox_rect = pygame.Rect((0, 0), rolling_textbox_size)
         self.rolling_textbox_focus_rect = self.rolling_textbox_rect.copy()
         self.rolling_textbox_rect.topleft = (self.settings.render_surface_size[0] * 0.01, self.settings.render_surface_size[1] * 0.08)
 
+        # Initialize the momentum of scrolling the text box and the sidebar
+        self.rolling_text_scroll = controls.ScrollMomentum(self.settings.scroll_speed, self.settings.scroll_friction,
+                                                           self.settings.scroll_stop_speed)
+        self.sidebar_scroll = controls.ScrollMomentum(self.settings.scroll_speed, self.settings.scroll_friction,
+                                                      self.settings.scroll_stop_speed)
+        self.last_update_time = time.perf_counter()
+
         # Initialize the rect for the middle response pane
         self.response_pane_rect = pygame.Rect((self.settings.render_surface_size[0] * 0.5, self.settings.render_surface_size[1] * 0.08),
                                               (self.settings.render_surface_size[0] * 0.29, self.settings.render_surface_size[1] * 0.61))
@@ -43,19 +62,41 @@ class GUIAdventureScreen:
         self.header_rect = self.header_surface.get_rect()
         self.header_rect.centerx = self.settings.render_surface_size[0] * 0.5
 
+        # Initialize the dirty region tracker, regions of the render surface that must be repainted on the next draw
+        self.dirty_rects = []
+        self.pixels_repainted = 0   # Pixels repainted by the last draw, for performance monitoring
+        self.sidebar_needs_redraw = True
+        self.mark_all_dirty()
+
         # Create the scene event parser
         self.event_parser = scene_parser.SceneParser(initial_scene_script, self.settings)
 
         # Create the text handler.
-        self.words = []  # Contains the list of individual words to be written to the text box in the coming frames.
+        self.current_layout = None  # The laid out text of the current event, revealed run by run in the coming frames.
+        self.revealed_run_count = 0
+        self.reveal_start_time = 0
         self.is_writing_text = True
         self.is_bold = False
         self.is_italics = False
         self.last_placed_text_rect = pygame.Rect((self.settings.paragraph_tab_width, 0), self.settings.font_text_body.size("l"))
 
-        # Initialize the topics sidebar
+        # Initialize the topics sidebar, with each topic's sprite and the active and inactive topics in list order
+        self.sidebar_topic_sprites = {}
+        self.sidebar_active_topics = topics.TopicOrder(self.character.topic_index)
+        self.sidebar_inactive_topics = topics.TopicOrder(self.character.topic_index)
+        self.sidebar_sorted_events_script = None  # The scene the active topics were last sorted for
+        self.sidebar_sorted_generic_topics = None
         self._init_topic_sidebar()
 
+        # The snapshots of the last few times the game waited for the player, to rewind to
+        self.snapshot_ring = snapshots.SnapshotRing(self.settings.rewind_ring_size)
+
+        # The writer of autosaves, or None if autosaving is off
+        self.autosave_writer = None
+        if self.settings.autosave_filename:
+            self.autosave_writer = autosave.AutosaveWriter(self.settings.autosave_filename,
+                                                           self.settings.autosave_compact_every, self.settings.event_log)
+
     def _init_surfaces(self):
         """Initializes and returns the surfaces needed by the constructor."""
         # BG image for the GUI pane
@@ -69,17 +110,12 @@ class GUIAdventureScreen:
         sidebar_topics_surface.fill(self.settings.dynamic_colors["transparency"])
         sidebar_topics_surface.set_colorkey(self.settings.dynamic_colors["transparency"])
 
-        # The surface for the main text box
-        rolling_text_surface = pygame.Surface((self.settings.render_surface_size[0] * 0.39, self.settings.render_surface_size[1] * 0.71))
-        rolling_text_surface.fill(self.settings.dynamic_colors["transparency"])
-        rolling_text_surface.set_colorkey(self.settings.dynamic_colors["transparency"])
-
         # The surface for the scene title header
         header_surface = pygame.Surface((self.settings.render_surface_size[0] * 0.98, self.settings.render_surface_size[1] * 0.07))
         header_surface.fill(self.settings.dynamic_colors["transparency"])
         header_surface.set_colorkey(self.settings.dynamic_colors["transparency"])
 
-        return gui_bg, render_surface, sidebar_topics_surface, rolling_text_surface, header_surface
+        return gui_bg, render_surface, sidebar_topics_surface, header_surface
 
     def _init_topic_sidebar(self):
         """Initializes the topic sidebar for rendering."""
@@ -92,126 +128,82 @@ class GUIAdventureScreen:
             each_sprite.is_picked_up = True
             each_sprite.update()
 
-    def _end_event(self):
-        """Runs the code that displays buttons at the end of an event."""
-        # If the event is a choice now is the time to display the option buttons.
-        if "choice" in self.event_parser.current_event.commands:
-            # Calculate the spacing for the choice buttons
-            button_vertical_offset = 0
-
-            # Create all the choice buttons, placing them and incrementing the offset
-            for each_choice in self.event_parser.current_event.choices.keys():
-                this_choice = ChoiceButton(self, (self.response_pane_rect.left, self.response_pane_rect.top + button_vertical_offset), each_choice)
-                button_vertical_offset += this_choice.image.get_height() + self.settings.paragraph_tab_width/2
+        self.refresh_rolling_text_topics()
 
-        # If the event has the silent command, skip placing the button
-        elif "silent" in self.event_parser.current_event.commands:
+    def _end_event(self):
+        """Runs the code that displays buttons at the end of an event. Keeps a snapshot of the game once it waits for
+        the player."""
+        # If the event has the silent command, skip placing the button, choice events always wait for a choice
+        if "silent" in self.event_parser.current_event.commands and "choice" not in self.event_parser.current_event.commands:
             self.set_event_markers()
 
             self.is_writing_text = True
             self.controller.disable()
 
             # See if we should give the player items
-            give_items(self.event_parser.current_event, self.character.inventory)
+            event_checks.give_items(self.event_parser.current_event, self.character.inventory)
 
             # See if we have checks to run
-            if not run_item_checks(self.event_parser, self.character.inventory) and not \
-                    run_roll_checks(self.event_parser, self.character.inventory):
+            if not event_checks.run_item_checks(self.event_parser, self.character.inventory) and not \
+                    event_checks.run_roll_checks(self.event_parser, self.character.inventory):
 
                 self.event_parser.get_next_event()
 
             return None  # Used to skip the last block of code in the function, which normally does the opposite of this
 
-        # If the event is text now is the time to display the continue button.
-        else:
-            ContinueButton(self, self.response_pane_rect.center)
+        self._show_end_buttons()
 
         self.is_writing_text = False
         self.controller.enable()
 
-    def _extend_rolling_text_surface(self):
-        """Extends the rolling text surface to accommodate new text."""
-        if self.last_placed_text_rect.bottom > self.rolling_text_surface.get_height():
-            new_rolling_text_surface = pygame.Surface(
-                (self.rolling_text_surface.get_width(), self.last_placed_text_rect.bottom))
-            new_rolling_text_surface.fill(self.settings.dynamic_colors["transparency"])
-            new_rolling_text_surface.set_colorkey(self.settings.dynamic_colors["transparency"])
-            new_rolling_text_surface.blit(self.rolling_text_surface, (0, 0))
-            self.rolling_text_surface = new_rolling_text_surface
-            self.rolling_textbox_focus_rect.bottom = self.last_placed_text_rect.bottom
+        self.snapshot_ring.push(self.capture_snapshot())
 
-    def _read_inline_expression(self, expression):
-        """Given a string from the _write_single_word function, determines if it has an expression, such as
-        a topic or item tag. Then returns the topic object if so. Otherwise returns None."""
-
-        # Check for bold and italics tags
-        if expression == "/b":
-            self.is_bold = True
-            expression = self.words.pop(0)
-
-        elif expression == "/i":
-            self.is_italics = True
-            expression = self.words.pop(0)
-
-        elif expression == "/":
-            self.is_bold = False
-            self.is_italics = False
-            try:
-                expression = self.words.pop(0)
-            except IndexError:
-                expression = ""
-
-        # Readjust next_word
-        next_word = expression
-
-        # Check if the next word is a topic which will be enclosed in <_>
-        if "<" in expression:
-            # Check if the word needs to be extended to find the rest of the topic.
-            while ">" not in expression:
-                expression += " " + self.words.pop(0)
-
-            next_word = mypyg.remove_character(expression, '<', '>')
-            next_word_truncated = mypyg.remove_character(next_word.lower(), remove_non_alphanumeric=True)
-
-            for each_topic in self.character.topics:
-                if next_word_truncated == each_topic.title.lower() or next_word_truncated in each_topic.aliases:
-                    return TopicSprite(next_word, each_topic, self, self.rolling_text_clickable_topics_group), next_word
-
-            # If the topic cannot be found, return something anyway
-            return None, next_word
-
-        # Check if the next word is an item which will be enclosed in {_}
-        elif "{" in expression:
-            # Check if the word needs to be extended to find the rest of the topic.
-            while "}" not in expression:
-                expression += " " + self.words.pop(0)
-
-            # Split the expression to retrieve arguments
-            expression = expression[1:-1]
-            arguments = expression.split(",")
-
-            # Check if there is an alias included
-            if len(arguments) < 3:
-                this_item = self.character.inventory.bag[arguments[0]]
-                quantity = int(arguments[1])
-            else:
-                this_item = self.character.inventory.bag[arguments[1]]
-                quantity = int(arguments[2])
+    def _show_end_buttons(self):
+        """Displays the choice buttons of a choice event, or the continue button of any other event."""
+        # If the event is a choice now is the time to display the option buttons.
+        if "choice" in self.event_parser.current_event.commands:
+            # Calculate the spacing for the choice buttons
+            button_vertical_offset = 0
 
-            return ItemTopicSprite(arguments[0], this_item, quantity, self, self.rolling_text_clickable_topics_group), next_word
+            # Create all the choice buttons, placing them and incrementing the offset
+            for each_choice in self.event_parser.current_event.choices.keys():
+                this_choice = ChoiceButton(self, (self.response_pane_rect.left, self.response_pane_rect.top + button_vertical_offset), each_choice)
+                button_vertical_offset += this_choice.image.get_height() + self.settings.paragraph_tab_width/2
+                self.mark_dirty(this_choice.rect)
 
+        # If the event is text now is the time to display the continue button.
         else:
-            return None, next_word
+            this_button = ContinueButton(self, self.response_pane_rect.center)
+            self.mark_dirty(this_button.rect)
+
+    def _apply_scene_style(self):
+        """Switches the colors and the background to the style of the current scene."""
+        self.settings.set_style(self.event_parser.scene_style)
+
+        self.gui_bg = gui.init_bg_surface(self.settings, "images/gui/debug_gui_winbg.png")
+
+        # Everything on screen is in the old style
+        self.sidebar_topics_group.update()
+        self.sidebar_needs_redraw = True
+        self.mark_all_dirty()
+
+    def _extend_rolling_text(self):
+        """Extends the rolling text transcript to accommodate new text, scrolling down to it."""
+        if self.last_placed_text_rect.bottom > self.rolling_text_transcript.get_height():
+            self.rolling_text_transcript.extend_to(self.last_placed_text_rect.bottom)
+            self.rolling_textbox_focus_rect.bottom = self.last_placed_text_rect.bottom
+            self.mark_dirty(self.rolling_textbox_rect)
 
     def _render_header_surface(self):
         """Renders the header surface with the header text."""
         self.header_surface.fill(self.settings.dynamic_colors["transparency"])
 
-        rendered_text = self.settings.font_heading_1.render(self.event_parser.current_event_header, False, self.settings.dynamic_colors["header_text"], self.settings.dynamic_colors["transparency"])
+        rendered_text = self.settings.render_font(self.settings.font_heading_1, self.event_parser.current_event_header, False, self.settings.dynamic_colors["header_text"], self.settings.dynamic_colors["transparency"])
         rendered_text_rect = rendered_text.get_rect()
         rendered_text_rect.centery = self.header_rect.height * 0.5
 
         self.header_surface.blit(rendered_text, rendered_text_rect)
+        self.mark_dirty(self.header_rect)
 
     def _resize_sidebar_surface(self, target_height):
         """Resizes the sidebar surface to the given target_height. Will not adjust to a size less then the base length."""
@@ -226,16 +218,16 @@ class GUIAdventureScreen:
             sidebar_topics_surface.set_colorkey(self.settings.dynamic_colors["transparency"])
             sidebar_topics_surface.blit(self.sidebar_topics_surface, (0, 0))
             self.sidebar_topics_surface = sidebar_topics_surface
+            self.sidebar_needs_redraw = True
+            self.mark_dirty(self.sidebar_topics_rect)
 
         # TODO make the sidebar focus rect
 
     def _wipe_rolling_textbox(self):
         """Wipes the rolling text box, 'factory reset'."""
 
-        # Reset the surface for the main text box
-        self.rolling_text_surface = pygame.Surface((self.settings.render_surface_size[0] * 0.39, self.settings.render_surface_size[1] * 0.71))
-        self.rolling_text_surface.fill(self.settings.dynamic_colors["transparency"])
-        self.rolling_text_surface.set_colorkey(self.settings.dynamic_colors["transparency"])
+        # Reset the transcript for the main text box
+        self.rolling_text_transcript.clear()
 
         # Reset variables for the textbox
         self.rolling_textbox_focus_rect.top = 0
@@ -245,6 +237,8 @@ class GUIAdventureScreen:
         # Empty the rolling topic group
         self.rolling_text_clickable_topics_group.empty()
 
+        self.mark_dirty(self.rolling_textbox_rect)
+
     def _write_character_tag(self):
         """Draws the character tag when applicable. Must be applied before a new line is written."""
         if not self.event_parser.suppress_text:
@@ -252,61 +246,56 @@ class GUIAdventureScreen:
             title_text_string = self.event_parser.current_event.said_by_character.upper() + " -  "
 
             # Create the render and the rects
-            title_text_render = self.settings.font_text_small_caps.render(title_text_string, True,
-                                                                          self.settings.dynamic_colors["character_tag"],
-                                                                          self.settings.dynamic_colors["transparency"])
+            title_text_render = self.settings.render_font(self.settings.font_text_small_caps, title_text_string, True,
+                                                          self.settings.dynamic_colors["character_tag"],
+                                                          self.settings.dynamic_colors["transparency"])
             title_text_rect = title_text_render.get_rect()
             title_text_rect.left = 0
             title_text_rect.centery = self.last_placed_text_rect.centery
-            self.rolling_text_surface.blit(title_text_render, title_text_rect)
+            self.rolling_text_transcript.add_character_tag(title_text_string, title_text_rect, self.last_placed_text_rect.bottom)
+            self._mark_rolling_text_dirty(title_text_rect)
 
             # Move the last placed text rect, but don't copy this one, it is the wrong size
             self.last_placed_text_rect.right = title_text_rect.right
 
-    def _write_single_word(self):
-        """Draws a single word from the words list for the _write_next_word function."""
-
-        # Establish local variables
-        next_topic, next_word = self._read_inline_expression(self.words.pop(0))
-
-        # Check that we don't need a new line for this word, if we do, adjust self.last_placed_text_rect
-        if self.settings.font_text_body.size(" " + next_word)[0] + self.last_placed_text_rect.right > \
-                self.settings.render_surface_size[0] * 0.39:
-            self.last_placed_text_rect.right = 0
-            self.last_placed_text_rect.top = self.last_placed_text_rect.bottom
-
-            # If the text rect would run off of the rolling box, extend the surface
-            self._extend_rolling_text_surface()
+    def _write_single_word(self, text_run):
+        """Draws a single laid out word of the current event to the rolling text box, using topic functionality if it
+        is a topic or an item and blitting it manually otherwise."""
+        self.last_placed_text_rect = text_run.rect.copy()
+
+        # If the text rect would run off of the rolling box, extend the transcript
+        self._extend_rolling_text()
+
+        if text_run.topic:
+            next_topic = TopicSprite(text_run.text, text_run.topic, self, self.rolling_text_clickable_topics_group,
+                                     bold=text_run.bold, italics=text_run.italics)
+        elif text_run.item:
+            next_topic = ItemTopicSprite(text_run.text, text_run.item, text_run.item_quantity, self,
+                                         self.rolling_text_clickable_topics_group, bold=text_run.bold,
+                                         italics=text_run.italics)
+        else:
+            next_topic = None
 
-        # Put the next word on the rolling display, using topic functionality if it is a topic and manually otherwise
         if next_topic:
-            next_topic.rect.left = self.last_placed_text_rect.right + self.settings.font_text_body.size(" ")[0]
-            next_topic.rect.bottom = self.last_placed_text_rect.bottom
-            next_topic.draw(self.rolling_text_surface)
-            self.last_placed_text_rect = next_topic.rect.copy()
+            next_topic.rect.topleft = text_run.rect.topleft
+            self.rolling_text_clickable_topics_group.reindex(next_topic)
+            self.rolling_text_transcript.add_sprite(next_topic, text_run.rect.bottom)
 
         else:
-            this_word_render = self.settings.render_text_body_font(next_word, self.settings.dynamic_colors["body_text"], self.is_italics, self.is_bold)
-            this_word_rect = this_word_render.get_rect()
-            this_word_rect.left = self.last_placed_text_rect.right + self.settings.font_text_body.size(" ")[0]
-            this_word_rect.bottom = self.last_placed_text_rect.bottom
-            self.rolling_text_surface.blit(this_word_render, this_word_rect)
-            self.last_placed_text_rect = this_word_rect
+            self.rolling_text_transcript.add_word(text_run.text, text_run.rect, text_run.italics, text_run.bold, text_run.rect.bottom)
+
+        self._mark_rolling_text_dirty(text_run.rect)
 
     def _write_next_word(self):
-        """Draw the next word in the rolling text box. Returns False if it is done writing
-        the current scene text and display buttons, True while writing is still ongoing."""
+        """Reveals the words of the current event in the rolling text box that are due at the reveal speed. Returns
+        False if it is done writing the current scene text and display buttons, True while writing is still ongoing."""
 
-        # Check to see if the current text from the event has been split, split it if not
-        if self.is_writing_text and not self.words:
-            self.words = self.event_parser.current_event.text.split()
+        # Check to see if the current text from the event has been laid out, lay it out if not
+        if self.is_writing_text and not self.current_layout:
 
             # Check if the scene style has changed, if so, update the bg image and wipe the text box
             if self.event_parser.scene_style != self.settings.current_style_name:
-                self.settings.current_style_name = self.event_parser.scene_style
-                self.settings.dynamic_colors = self.settings.get_dynamic_colors(self.event_parser.scene_style)
-
-                self.gui_bg = gui.init_bg_surface(self.settings, "images/gui/debug_gui_winbg.png")
+                self._apply_scene_style()
                 self._wipe_rolling_textbox()
 
             # Wipe the rolling text box before writing if the event has the wipe command.
@@ -324,116 +313,226 @@ class GUIAdventureScreen:
             # Rerender the header in case it has changed
             self._render_header_surface()
 
+            # Resort the sidebar topics if the scene has changed
+            if (self.event_parser.current_events_script is not self.sidebar_sorted_events_script or
+                    self.event_parser.use_generic_topics is not self.sidebar_sorted_generic_topics):
+                self.sort_sidebar_topics()
+
+            # Measure and place all of the event's words up front
+            self.current_layout = text_layout.layout_event_text(self.event_parser.current_event.text, self.settings,
+                                                                self.character.topic_index, self.character.inventory,
+                                                                self.last_placed_text_rect,
+                                                                self.rolling_text_transcript.get_width(),
+                                                                self.is_bold, self.is_italics,
+                                                                self.settings.text_reveal_unit)
+            self.is_bold = self.current_layout.is_bold
+            self.is_italics = self.current_layout.is_italics
+            self.revealed_run_count = 0
+            self.reveal_start_time = time.perf_counter()
+
         # If the event is suppressing text, skip rendering and end the event.
-        elif self.words and self.event_parser.suppress_text:
-            self.words.clear()
+        elif self.current_layout and self.event_parser.suppress_text:
+            self.current_layout = None
 
             self.event_parser.suppress_text = False
 
             self._end_event()
 
-        # If there are words in the list, write them
-        elif self.words:
+        # If there are words in the layout, reveal the ones that are due
+        elif self.current_layout:
+            reveal_amount_due = (time.perf_counter() - self.reveal_start_time) * self.settings.text_reveal_speed
+            layout_runs = self.current_layout.runs
+            reveal_thresholds = self.current_layout.reveal_thresholds
 
-            self._write_single_word()
+            while self.revealed_run_count < len(layout_runs) and reveal_thresholds[self.revealed_run_count] <= reveal_amount_due:
+                self._write_single_word(layout_runs[self.revealed_run_count])
+                self.revealed_run_count += 1
 
-            if not self.words and self.is_writing_text:
+            if self.revealed_run_count == len(layout_runs) and self.is_writing_text:
+                self.current_layout = None
 
                 # Move the text rect to the next line
                 self.last_placed_text_rect.top = self.last_placed_text_rect.bottom
                 self.last_placed_text_rect.right = self.settings.paragraph_tab_width
-                self._extend_rolling_text_surface()
+                self._extend_rolling_text()
 
                 self._end_event()
 
         return self.is_writing_text
 
     def draw(self):
-        """Draws the whole gui panel to self.render_surface."""
-        self.render_surface.blit(self.gui_bg, (0, 0))
-        self.redraw_rolling_text(draw_ui_bg=False)
-        self.redraw_buttons()
-        self.redraw_sidebar_topics()
-        self.redraw_header()
+        """Repaints the dirty regions of the gui panel on self.render_surface. Returns the list of rects repainted,
+        in render surface coordinates, which is empty when nothing has changed since the last draw."""
+        draw_start_time = time.perf_counter()
+        repainted_rects = gui.merge_rects(self.dirty_rects)
+        self.dirty_rects = []
+        self.pixels_repainted = 0
+
+        if self.sidebar_needs_redraw and repainted_rects:
+            with self.settings.frame_profiler.section("sidebar"):
+                self.sidebar_topics_surface.fill(self.settings.dynamic_colors["transparency"])
+                self.sidebar_topics_group.draw(self.sidebar_topics_surface)
+                self.sidebar_needs_redraw = False
+
+        # Repaint each region, clipping every layer to it
+        with self.settings.frame_profiler.section("repaint"):
+            for each_rect in repainted_rects:
+                self.render_surface.set_clip(each_rect)
+                self.render_surface.blit(self.gui_bg, each_rect, each_rect)
+                self.redraw_rolling_text(draw_ui_bg=False)
+                self.redraw_buttons()
+                self.redraw_sidebar_topics(draw_ui_bg=False)
+                self.redraw_header()
+                self.pixels_repainted += each_rect.width * each_rect.height
+
+            self.render_surface.set_clip(None)
+
+        if repainted_rects and self.settings.event_log.enabled:
+            self.settings.event_log.emit("repaint", rect_count=len(repainted_rects), pixels=self.pixels_repainted,
+                                         draw_ms=(time.perf_counter() - draw_start_time) * 1000)
+
+        return repainted_rects
+
+    def mark_dirty(self, rect):
+        """Marks a region of the render surface to be repainted on the next draw."""
+        self.dirty_rects.append(pygame.Rect(rect).clip(self.render_surface.get_rect()))
+
+    def mark_all_dirty(self):
+        """Marks the whole render surface to be repainted on the next draw."""
+        self.dirty_rects = [self.render_surface.get_rect()]
+
+    def _mark_rolling_text_dirty(self, rolling_text_rect):
+        """Marks a region given in rolling text surface coordinates, where it shows in the text box, as dirty."""
+        screen_rect = pygame.Rect(rolling_text_rect).move(self.rolling_textbox_rect.left,
+                                                          self.rolling_textbox_rect.top - self.rolling_textbox_focus_rect.top)
+        screen_rect = screen_rect.clip(self.rolling_textbox_rect)
+
+        if screen_rect.width and screen_rect.height:
+            self.mark_dirty(screen_rect)
+
+    def clear_buttons(self):
+        """Removes all of the buttons, marking where they were as dirty."""
+        for each_button in self.buttons_group:
+            self.mark_dirty(each_button.rect)
+
+        self.buttons_group.empty()
+
+    def refresh_rolling_text_topics(self):
+        """Redraws the topics in the rolling text box after their images have changed."""
+        self.rolling_text_transcript.draw_sprites(self.rolling_text_clickable_topics_group)
+        self.mark_dirty(self.rolling_textbox_rect)
+
+    def refresh_sidebar_topics(self):
+        """Redraws the sidebar on the next draw after its topics have changed."""
+        self.sidebar_needs_redraw = True
+        self.mark_dirty(self.sidebar_topics_rect)
+
+    def is_sidebar_topic_active(self, topic_object):
+        """Returns True if the topic can be clicked in the sidebar in the current scene."""
+        return topic_object.title in self.event_parser.current_events_script or topic_object.title in self.event_parser.use_generic_topics
 
     def add_to_sidebar_topics(self, topic_object):
-        """Adds the given topic object to the sidebar as a topic sprite."""
-        SidebarTopicSprite(topic_object.title, topic_object, self, self.sidebar_topics_group)
+        """Adds the given topic object to the sidebar as a topic sprite, in the active or inactive topics. Does not
+        place it."""
+        is_active = self.is_sidebar_topic_active(topic_object)
+
+        self.sidebar_topic_sprites[topic_object] = SidebarTopicSprite(topic_object.title, topic_object, self,
+                                                                      self.sidebar_topics_group, is_active=is_active)
+        if is_active:
+            self.sidebar_active_topics.insert(topic_object)
+        else:
+            self.sidebar_inactive_topics.insert(topic_object)
 
     def fill_sidebar_topics(self):
         """Adds all of the currently known topics to the sidebar group. Does not place them."""
-        for each_topic in self.character.topics:
-            if each_topic.is_known_topic:
-                SidebarTopicSprite(each_topic.title, each_topic, self, self.sidebar_topics_group)
+        for each_topic in self.character.topic_index.known_topics:
+            self.add_to_sidebar_topics(each_topic)
+
+    def scroll_rolling_textbox(self, scroll_distance):
+        """Scrolls the main rolling text box down by the distance in pixels, or up if it is negative, so that old text
+        can be seen and next text returned to. Returns False if it stopped at the top or bottom of the text."""
+        lowest_top = self.rolling_text_transcript.get_height() - self.rolling_textbox_focus_rect.height
+        wanted_top = self.rolling_textbox_focus_rect.top + scroll_distance
+        new_top = max(self.rolling_text_transcript.top, min(wanted_top, lowest_top))
+
+        if new_top != self.rolling_textbox_focus_rect.top:
+            self.rolling_textbox_focus_rect.top = new_top
+            self.mark_dirty(self.rolling_textbox_rect)
+
+        return new_top == wanted_top
+
+    def scroll_sidebar_topics(self, scroll_distance):
+        """Scrolls the sidebar topics down by the distance in pixels, or up if it is negative, so that more of the
+        topics can be seen than can fit on the screen at once. Returns False if it stopped at the top or bottom."""
+        lowest_top = self.sidebar_topics_surface.get_height() - self.sidebar_focus_rect.height
+        wanted_top = self.sidebar_focus_rect.top + scroll_distance
+        new_top = max(0, min(wanted_top, lowest_top))
+
+        if new_top != self.sidebar_focus_rect.top:
+            self.sidebar_focus_rect.top = new_top
+            self.mark_dirty(self.sidebar_topics_rect)
+
+        return new_top == wanted_top
+
+    @property
+    def is_scrolling(self):
+        """True while the text box or the sidebar is still gliding from a scroll."""
+        return self.rolling_text_scroll.is_moving or self.sidebar_scroll.is_moving
+
+    def _step_scrolling(self, elapsed_time):
+        """Moves the text box and the sidebar on by their scroll momentum, stopping either at the end of its content."""
+        if self.rolling_text_scroll.is_moving:
+            if not self.scroll_rolling_textbox(self.rolling_text_scroll.step(elapsed_time)):
+                self.rolling_text_scroll.stop()
+
+        if self.sidebar_scroll.is_moving:
+            if not self.scroll_sidebar_topics(self.sidebar_scroll.step(elapsed_time)):
+                self.sidebar_scroll.stop()
 
-    def scroll_rolling_textbox(self, scroll_down):
-        """Scrolls the main rolling text box, so that old text can be seen and next text returned to."""
-
-        if scroll_down:
-            if self.rolling_textbox_focus_rect.bottom + self.settings.scroll_speed > self.rolling_text_surface.get_height():
-                self.rolling_textbox_focus_rect.bottom = self.rolling_text_surface.get_height()
-            else:
-                self.rolling_textbox_focus_rect.bottom += self.settings.scroll_speed
-
-        else:
-            if self.rolling_textbox_focus_rect.top - self.settings.scroll_speed < 0:
-                self.rolling_textbox_focus_rect.top = 0
-            else:
-                self.rolling_textbox_focus_rect.top -= self.settings.scroll_speed
-
-    def scroll_sidebar_topics(self, scroll_down):
-        """Scrolls the sidebar topics so that more of the topics can be seen than can fit on the screen at once."""
+    def sort_sidebar_topics(self):
+        """Sets the is_active states of the sidebar topics for the current scene, moving the topics whose state changed
+        between the active and inactive topics and rerendering only their sprites, then places them all."""
+        for each_topic, each_topic_sprite in self.sidebar_topic_sprites.items():
+            is_active = self.is_sidebar_topic_active(each_topic)
+
+            if is_active != each_topic_sprite.is_active:
+                if is_active:
+                    self.sidebar_inactive_topics.remove(each_topic)
+                    self.sidebar_active_topics.insert(each_topic)
+                else:
+                    self.sidebar_active_topics.remove(each_topic)
+                    self.sidebar_inactive_topics.insert(each_topic)
 
-        if scroll_down:
-            if self.sidebar_focus_rect.bottom + self.settings.scroll_speed > self.sidebar_topics_surface.get_height():
-                self.sidebar_focus_rect.bottom = self.sidebar_topics_surface.get_height()
-            else:
-                self.sidebar_focus_rect.bottom += self.settings.scroll_speed
+                each_topic_sprite.is_active = is_active
+                each_topic_sprite.update()
 
-        else:
-            if self.sidebar_focus_rect.top - self.settings.scroll_speed < 0:
-                self.sidebar_focus_rect.top = 0
-            else:
-                self.sidebar_focus_rect.top -= self.settings.scroll_speed
+        self.sidebar_sorted_events_script = self.event_parser.current_events_script
+        self.sidebar_sorted_generic_topics = self.event_parser.use_generic_topics
 
-    def sort_sidebar_topics(self):
-        """Sorts the positions of the sidebar topics in the sprite group and sets their is_active states."""
-        available_topics = []
-        grayed_out_topics = []
-
-        # Pull from the list of all topics a list of topics in the scene you already know, and also all other known topics
-        for each_topic in self.character.topics:
-            if each_topic.is_known_topic:
-                if each_topic.title in self.event_parser.current_events_script.keys() or each_topic.title in self.event_parser.use_generic_topics:
-                    available_topics.append(each_topic)
-                else:
-                    grayed_out_topics.append(each_topic)
+        self.place_sidebar_topics()
 
+    def place_sidebar_topics(self):
+        """Places the active sidebar topics, then the inactive ones below them, each in list order."""
         current_y_position = 0  # will be used to increment button placement
 
         # Place available topics
-        for each_topic in available_topics:
-            for each_topic_sprite in self.sidebar_topics_group:
-                if each_topic == each_topic_sprite.topic:
-                    each_topic_sprite.is_active = True
-                    each_topic_sprite.update()
-                    each_topic_sprite.rect.top = current_y_position
-                    current_y_position += each_topic_sprite.rect.height
-                    break
+        for each_topic in self.sidebar_active_topics:
+            each_topic_sprite = self.sidebar_topic_sprites[each_topic]
+            each_topic_sprite.rect.top = current_y_position
+            self.sidebar_topics_group.reindex(each_topic_sprite)
+            current_y_position += each_topic_sprite.rect.height
 
         current_y_position += self.settings.paragraph_tab_width    # Creates a margin between active and inactive buttons
 
         # Place grayed out topics
-        for each_topic in grayed_out_topics:
-            for each_topic_sprite in self.sidebar_topics_group:
-                if each_topic == each_topic_sprite.topic:
-                    each_topic_sprite.is_active = False
-                    each_topic_sprite.update()
-                    each_topic_sprite.rect.top = current_y_position
-                    current_y_position += each_topic_sprite.rect.height
-                    break
+        for each_topic in self.sidebar_inactive_topics:
+            each_topic_sprite = self.sidebar_topic_sprites[each_topic]
+            each_topic_sprite.rect.top = current_y_position
+            self.sidebar_topics_group.reindex(each_topic_sprite)
+            current_y_position += each_topic_sprite.rect.height
 
         self._resize_sidebar_surface(current_y_position)
+        self.refresh_sidebar_topics()
 
     def set_event_markers(self):
         """Sets the event markers. Should only be called once per event."""
@@ -448,16 +547,165 @@ class GUIAdventureScreen:
         if "mark" in self.event_parser.current_event.commands:
             self.event_parser.mark_this_event()
 
+    def capture_snapshot(self):
+        """Returns a snapshot of the game, or None while the text of an event is being revealed, as a part written
+        event cannot be restored."""
+        if self.current_layout is not None:
+            return None
+
+        screen_state = (self.is_writing_text, self.is_bold, self.is_italics, tuple(self.last_placed_text_rect),
+                        self.rolling_textbox_focus_rect.top,
+                        self.rolling_text_transcript.get_state(self._encode_topic_sprite))
+
+        return snapshots.GameSnapshot(self.event_parser.get_state(), self.character.get_state(), screen_state)
+
+    def restore_snapshot(self, game_snapshot):
+        """Puts the game back as it was when the snapshot was captured, without running any of the script. Raises
+        KeyError or OSError, before changing anything, if the script the snapshot was captured in has changed."""
+        (is_writing_text, is_bold, is_italics, last_placed_text_rect, focus_top,
+         transcript_state) = game_snapshot.screen_state
+
+        self.event_parser.set_state(game_snapshot.parser_state, self.character.topic_index)
+        self.character.set_state(game_snapshot.character_state)
+
+        if self.event_parser.scene_style != self.settings.current_style_name:
+            self._apply_scene_style()
+
+        # Put back the rolling text as far as it had been written
+        self.clear_buttons()
+        self.current_layout = None
+        self.is_writing_text = is_writing_text
+        self.is_bold = is_bold
+        self.is_italics = is_italics
+        self.last_placed_text_rect = pygame.Rect(last_placed_text_rect)
+
+        self.rolling_text_transcript.set_state(transcript_state, self._decode_topic_sprite, focus_top)
+        self.rolling_textbox_focus_rect.top = focus_top
+        self.rolling_text_scroll.stop()
+        self.sidebar_scroll.stop()
+
+        # Rebuild the sidebar from the restored known topics
+        for each_topic_sprite in self.sidebar_topic_sprites.values():
+            each_topic_sprite.kill()
+
+        self.sidebar_topic_sprites = {}
+        self.sidebar_active_topics = topics.TopicOrder(self.character.topic_index)
+        self.sidebar_inactive_topics = topics.TopicOrder(self.character.topic_index)
+        self._init_topic_sidebar()
+        self.scroll_sidebar_topics(0)
+
+        self._render_header_surface()
+
+        # Wait for the player again, or go on writing
+        if self.is_writing_text:
+            self.controller.disable()
+        else:
+            self._show_end_buttons()
+            self.controller.enable()
+
+        self.mark_all_dirty()
+
+    def _encode_topic_sprite(self, topic_sprite):
+        """Returns the plain values a topic or item topic sprite of the rolling text is made again from."""
+        if isinstance(topic_sprite, ItemTopicSprite):
+            return ("item", topic_sprite.text, topic_sprite.item.name, topic_sprite.quantity, topic_sprite.is_picked_up,
+                    topic_sprite.bold, topic_sprite.italics)
+
+        return "topic", topic_sprite.text, topic_sprite.topic.title, topic_sprite.bold, topic_sprite.italics
+
+    def _decode_topic_sprite(self, sprite_state, rect):
+        """Makes a sprite of the rolling text again at the rect from the values of _encode_topic_sprite. Returns None
+        if its topic or item is no longer in the game."""
+        if sprite_state[0] == "item":
+            text, item_name, quantity, is_picked_up, bold, italics = sprite_state[1:]
+            item_object = self.character.inventory.bag.get(item_name)
+            if item_object is None:
+                return None
+
+            topic_sprite = ItemTopicSprite(text, item_object, quantity, self, self.rolling_text_clickable_topics_group,
+                                           bold=bold, italics=italics)
+            if is_picked_up:
+                topic_sprite.is_picked_up = True
+                topic_sprite.update()
+
+        else:
+            text, topic_title, bold, italics = sprite_state[1:]
+            topic_object = self.character.topic_index.get(topic_title)
+            if topic_object is None:
+                return None
+
+            topic_sprite = TopicSprite(text, topic_object, self, self.rolling_text_clickable_topics_group, bold=bold,
+                                       italics=italics)
+
+        topic_sprite.rect.topleft = rect.topleft
+        self.rolling_text_clickable_topics_group.reindex(topic_sprite)
+
+        return topic_sprite
+
+    def rewind(self):
+        """Goes back to the last time before now that the game waited for the player. Returns False if there is no
+        earlier snapshot kept to go back to."""
+        if len(self.snapshot_ring) < 2:
+            return False
+
+        self.snapshot_ring.pop()
+        self.restore_snapshot(self.snapshot_ring.peek())
+        self.settings.event_log.emit("rewind", snapshots_left=len(self.snapshot_ring))
+
+        return True
+
+    def save_snapshot(self, snapshot_filename):
+        """Saves a snapshot of the game to the file. Returns False if the game cannot be saved now, while text is
+        being revealed."""
+        game_snapshot = self.capture_snapshot()
+        if game_snapshot is None:
+            return False
+
+        snapshots.write_snapshot(snapshot_filename, game_snapshot)
+        self.settings.event_log.emit("snapshot_saved", filename=snapshot_filename)
+
+        return True
+
+    def load_snapshot(self, snapshot_filename, read_function=snapshots.read_snapshot):
+        """Restores the game from a snapshot saved to the file, starting the rewind history again from it. Returns
+        False, leaving the game as it is, if the file cannot be read or no longer fits the script. The file is read by
+        read_function, which returns the snapshot in it."""
+        try:
+            game_snapshot = read_function(snapshot_filename)
+            self.restore_snapshot(game_snapshot)
+        except (OSError, ValueError, KeyError) as error:
+            self.settings.event_log.emit("snapshot_error", filename=snapshot_filename, error=repr(error))
+            return False
+
+        self.snapshot_ring.clear()
+        self.snapshot_ring.push(game_snapshot)
+        self.settings.event_log.emit("snapshot_loaded", filename=snapshot_filename)
+
+        return True
+
+    def autosave(self):
+        """Queues an autosave of the game, which is written on the autosave thread. Does nothing if autosaving is
+        off."""
+        if self.autosave_writer:
+            self.autosave_writer.save(self.capture_snapshot(), self.rolling_text_transcript.first_entry_number)
+
+    def load_autosave(self):
+        """Restores the game from the last autosave, as load_snapshot. Returns False if there is none."""
+        if not self.autosave_writer:
+            return False
+
+        self.autosave_writer.flush()
+        return self.load_snapshot(self.settings.autosave_filename, autosave.read_journal)
+
     def redraw_rolling_text(self, draw_ui_bg=True):
         """Redraw the rolling text box."""
         # Redraw Background UI
         if draw_ui_bg:
             self.render_surface.blit(self.gui_bg, self.rolling_textbox_rect, self.rolling_textbox_rect)
 
-        self.rolling_text_clickable_topics_group.draw(self.rolling_text_surface)
-
-        # Redraw the text
-        self.render_surface.blit(self.rolling_text_surface, self.rolling_textbox_rect, self.rolling_textbox_focus_rect)
+        # Redraw the text, from the part of the transcript in view
+        rolling_text_surface, rolling_text_area = self.rolling_text_transcript.view(self.rolling_textbox_focus_rect)
+        self.render_surface.blit(rolling_text_surface, self.rolling_textbox_rect, rolling_text_area)
 
     def redraw_response_pane(self):
         """Redraws the response pane and all its buttons."""
@@ -467,11 +715,11 @@ class GUIAdventureScreen:
         """Redraws all of the buttons"""
         self.buttons_group.draw(self.render_surface)
 
-    def redraw_sidebar_topics(self):
+    def redraw_sidebar_topics(self, draw_ui_bg=True):
         """Redraws the sidebar containing the player's known topics."""
-        self.render_surface.blit(self.gui_bg, self.sidebar_topics_rect, self.sidebar_topics_rect)
-        self.sidebar_topics_surface.fill(self.settings.dynamic_colors["transparency"])
-        self.sidebar_topics_group.draw(self.sidebar_topics_surface)
+        if draw_ui_bg:
+            self.render_surface.blit(self.gui_bg, self.sidebar_topics_rect, self.sidebar_topics_rect)
+
         self.render_surface.blit(self.sidebar_topics_surface, self.sidebar_topics_rect, self.sidebar_focus_rect)
 
     def redraw_header(self):
@@ -480,10 +728,27 @@ class GUIAdventureScreen:
 
     def update(self):
         """Called once per frame."""
-        self.controller.update()  # Update the controls, only stores input that then must be used elsewhere
+        frame_profiler = self.settings.frame_profiler
+
+        with frame_profiler.section("controller"):
+            self.controller.update()  # Update the controls, only stores input that then must be used elsewhere
+
+        # Time since the last update, capped at a frame so a scroll starting after an idle wait doesn't jump
+        update_time = time.perf_counter()
+        elapsed_time = min(update_time - self.last_update_time, 1 / self.settings.target_fps)
+        self.last_update_time = update_time
 
-        if not self._write_next_word():
-            self.update_controls()
+        with frame_profiler.section("write_text"):
+            is_writing_text = self._write_next_word()
+
+        if not is_writing_text:
+            with frame_profiler.section("update_controls"):
+                self.update_controls()
+                self._step_scrolling(elapsed_time)
+        else:
+            # Writing text scrolls to the new text itself
+            self.rolling_text_scroll.stop()
+            self.sidebar_scroll.stop()
 
     def update_controls(self):
         """Checks for inputs from the controller and processes them."""
@@ -511,42 +776,41 @@ class GUIAdventureScreen:
                 # If one indeed has been clicked, run its on_click function
                 clicked_button.on_click()
 
-        # Check for mouse scroll down events
-        if self.controller.last_scroll_down:
+        # Check for the wheel notches turned since the last frame
+        if self.controller.scroll_notches:
 
             # Check the main rolling text box
-            if self.rolling_textbox_rect.collidepoint(self.controller.last_scroll_down):
-                self.scroll_rolling_textbox(True)
+            if self.rolling_textbox_rect.collidepoint(self.controller.scroll_position):
+                self.rolling_text_scroll.push(self.controller.scroll_notches)
 
             # Check topics sidebar
-            elif self.sidebar_topics_rect.collidepoint(self.controller.last_scroll_down):
-                self.scroll_sidebar_topics(True)
-
-            self.controller.last_scroll_down = None
+            elif self.sidebar_topics_rect.collidepoint(self.controller.scroll_position):
+                self.sidebar_scroll.push(self.controller.scroll_notches)
 
-        # Check for mouse scroll up events
-        elif self.controller.last_scroll_up:
+            self.controller.scroll_notches = 0.0
 
-            # Check the main rolling text box
-            if self.rolling_textbox_rect.collidepoint(self.controller.last_scroll_up):
-                self.scroll_rolling_textbox(False)
-
-            # Check topics sidebar
-            elif self.sidebar_topics_rect.collidepoint(self.controller.last_scroll_up):
-                self.scroll_sidebar_topics(False)
+        # Check for the rewind and quick save keys
+        if self.controller.last_key_down == self.settings.rewind_key:
+            self.rewind()
+        elif self.controller.last_key_down == self.settings.quick_save_key:
+            self.save_snapshot(self.settings.quick_save_filename)
+        elif self.controller.last_key_down == self.settings.quick_load_key:
+            self.load_snapshot(self.settings.quick_save_filename)
+        elif self.controller.last_key_down == self.settings.autosave_load_key:
+            self.load_autosave()
 
-            self.controller.last_scroll_up = None
+        self.controller.last_key_down = None
 
 
 class TopicSprite(gui.Button):
     """Displays topics as clickable buttons."""
-    def __init__(self, display_alias, topic_object, gui_object, *topic_groups):
+    def __init__(self, display_alias, topic_object, gui_object, *topic_groups, bold=False, italics=False):
         self.text = display_alias
         self.topic = topic_object
         self.gui = gui_object
 
-        self.bold = self.gui.is_bold
-        self.italics = self.gui.is_italics
+        self.bold = bold
+        self.italics = italics
 
         super().__init__(gui_object.settings, *topic_groups)
 
@@ -575,11 +839,11 @@ class TopicSprite(gui.Button):
             self.gui.controller.disable()
 
             # Check if the topic is unknown
-            if not self.topic.is_known_topic:
-                self.topic.is_known_topic = True
+            if self.gui.character.topic_index.mark_known(self.topic):
                 self.gui.add_to_sidebar_topics(self.topic)
-                self.gui.sort_sidebar_topics()
+                self.gui.place_sidebar_topics()
                 self.gui.rolling_text_clickable_topics_group.update()
+                self.gui.refresh_rolling_text_topics()
 
             # Set the scene mark
             self.gui.event_parser.mark_this_event()
@@ -590,15 +854,20 @@ class TopicSprite(gui.Button):
             else:
                 self.gui.event_parser.get_event_at_ID("", inject_event=self.topic.event)
 
+            self.gui.autosave()
+
 
 class ItemTopicSprite(gui.Button):
     """An in-line topic that gives the player an item"""
-    def __init__(self, display_alias, item_object, give_quantity, gui_object, *topic_groups):
+    def __init__(self, display_alias, item_object, give_quantity, gui_object, *topic_groups, bold=False, italics=False):
         self.text = display_alias
         self.item = item_object
         self.quantity = give_quantity
         self.gui = gui_object
 
+        self.bold = bold
+        self.italics = italics
+
         self.is_picked_up = False
 
         super().__init__(gui_object.settings, *topic_groups)
@@ -607,11 +876,11 @@ class ItemTopicSprite(gui.Button):
         """Draws the image for the button and saves it as the self.image."""
         if self.is_picked_up:
             self.image = self.settings.render_text_body_font(self.text, self.settings.dynamic_colors["dull_text"],
-                                                             self.gui.is_italics, self.gui.is_bold)
+                                                             self.italics, self.bold)
 
         else:
             self.image = self.settings.render_text_body_font(self.text, self.settings.dynamic_colors["inline_item"],
-                                                             self.gui.is_italics, self.gui.is_bold)
+                                                             self.italics, self.bold)
 
     def draw(self, target_surface):
         """Draws the rendered topic to the surface"""
@@ -627,24 +896,27 @@ class ItemTopicSprite(gui.Button):
             self.gui.character.inventory.add(self.item.name, self.quantity)
             self.is_picked_up = True
             self._init_image()
+            self.gui.refresh_rolling_text_topics()
+
+            self.gui.autosave()
 
 
 class SidebarTopicSprite(gui.Button):
     """Displays topics as clickable buttons."""
-    def __init__(self, display_alias, topic_object, gui_object, *topic_groups):
+    def __init__(self, display_alias, topic_object, gui_object, *topic_groups, is_active=True):
         self.text = display_alias
         self.topic = topic_object
         self.gui = gui_object
-        self.is_active = True
+        self.is_active = is_active
 
         super().__init__(gui_object.settings, *topic_groups)
 
     def _init_image(self):
         """Draws the image for the button and saves it as the self.image."""
         if self.is_active:
-            self.image = self.settings.font_UI_text.render(self.text, True, self.settings.dynamic_colors["topic_known"], self.settings.dynamic_colors["transparency"])
+            self.image = self.settings.render_font(self.settings.font_UI_text, self.text, True, self.settings.dynamic_colors["topic_known"], self.settings.dynamic_colors["transparency"])
         else:
-            self.image = self.settings.font_UI_text.render(self.text, True, self.settings.dynamic_colors["dull_text"], self.settings.dynamic_colors["transparency"])
+            self.image = self.settings.render_font(self.settings.font_UI_text, self.text, True, self.settings.dynamic_colors["dull_text"], self.settings.dynamic_colors["transparency"])
 
     def draw(self, target_surface):
         """Draws the rendered topic to the surface"""
@@ -683,7 +955,7 @@ class ContinueButton(gui.Button):
 
     def _render_text(self):
         """Renders the text for the image initializer"""
-        rendered_text = self.settings.font_UI_text.render("Continue", True, self.settings.dynamic_colors["body_text"], self.settings.dynamic_colors["bg_midtone_light"])
+        rendered_text = self.settings.render_font(self.settings.font_UI_text, "Continue", True, self.settings.dynamic_colors["body_text"], self.settings.dynamic_colors["bg_midtone_light"])
         return rendered_text, rendered_text.get_rect()
 
     def _init_image(self):
@@ -705,15 +977,15 @@ class ContinueButton(gui.Button):
         self.gui.set_event_markers()
 
         self.gui.is_writing_text = True
-        self.gui.buttons_group.empty()
+        self.gui.clear_buttons()
         self.gui.controller.disable()
 
         # See if we should give the player items
-        give_items(self.gui.event_parser.current_event, self.gui.character.inventory)
+        event_checks.give_items(self.gui.event_parser.current_event, self.gui.character.inventory)
 
         # See if we have checks to run
-        if not run_item_checks(self.gui.event_parser, self.gui.character.inventory) and not \
-                run_roll_checks(self.gui.event_parser, self.gui.character.inventory):
+        if not event_checks.run_item_checks(self.gui.event_parser, self.gui.character.inventory) and not \
+                event_checks.run_roll_checks(self.gui.event_parser, self.gui.character.inventory):
 
             self.gui.event_parser.get_next_event()
 
@@ -729,15 +1001,18 @@ class ChoiceButton(gui.Button):
     def _render_text(self):
         """Renders the button text. Will break lines too long for the response pane."""
         word_list = self.text.split()
+        word_index = 0
         lines_to_render = []
 
         # Build a series of properly measured strings and store them
-        while word_list:
-            this_line = word_list.pop(0)
-
-            while word_list:
-                if self.settings.font_UI_text.size(f"{this_line} {word_list[0]}")[0] + self.settings.paragraph_tab_width < self.gui.response_pane_rect.width:
-                    this_line += " " + word_list.pop(0)
+        while word_index < len(word_list):
+            this_line = word_list[word_index]
+            word_index += 1
+
+            while word_index < len(word_list):
+                if self.settings.font_UI_text.size(f"{this_line} {word_list[word_index]}")[0] + self.settings.paragraph_tab_width < self.gui.response_pane_rect.width:
+                    this_line += " " + word_list[word_index]
+                    word_index += 1
                 else:
                     break
 
@@ -749,7 +1024,7 @@ class ChoiceButton(gui.Button):
         width = 0
 
         for each_string in lines_to_render:
-            text_surfaces.append(self.settings.font_UI_text.render(each_string, True, self.settings.dynamic_colors["body_text"], self.settings.dynamic_colors["transparency"]))
+            text_surfaces.append(self.settings.render_font(self.settings.font_UI_text, each_string, True, self.settings.dynamic_colors["body_text"], self.settings.dynamic_colors["transparency"]))
             height += text_surfaces[-1].get_height()
             if text_surfaces[-1].get_width() > width:
                 width = text_surfaces[-1].get_width()
@@ -782,79 +1057,71 @@ class ChoiceButton(gui.Button):
         self.gui.set_event_markers()
 
         self.gui.is_writing_text = True
-        self.gui.buttons_group.empty()
+        self.gui.clear_buttons()
         self.gui.controller.disable()
 
         self.gui.event_parser.get_event_at_ID(self.gui.event_parser.current_event.choices[self.text])
 
+        self.gui.autosave()
 
-def give_items(event, inventory):
-    """Gives the player items based on the event's give_item details.
-    Returns True if there is a give item command, False otherwise."""
-
-    # Check if there is a give_item command
-    if "give_item" in event.commands:
-        # Give the item
-        inventory.add(event.give_item_name, event.give_item_quantity)
 
+if __name__ == "__main__":
+    startup = startup_profiler.StartupProfiler()
+
+    with startup.phase("settings"):
+        settings_object = settings.Settings()
+    with startup.phase("character"):
+        character_object = character.CharacterProfile()
+    with startup.phase("controller"):
+        controller_object = controls.Controller(settings_object)
+    with startup.phase("adventure screen"):
+        try:
+            new_panel = GUIAdventureScreen(controller_object, settings_object, character_object, "scenes/INTRO.scn")
+        except FileNotFoundError:
+            new_panel = GUIAdventureScreen(controller_object, settings_object, character_object)
 
-def run_item_checks(event_parser, inventory):
-    """Checks if the player has the specified number of items to pass the event,
-    or else sends the player to the fail event. Returns True if there is a check event, False otherwise."""
+    presenter = presentation.Presenter(settings_object)
+    scheduler = frame_scheduler.FrameScheduler(settings_object)
+    profiler = settings_object.frame_profiler
+    profiler_overlay = frame_profiler.ProfilerOverlay(settings_object, profiler)
 
-    event = event_parser.current_event
+    with startup.phase("first frame"):
+        new_panel.update()
+        presenter.present(new_panel.render_surface, new_panel.draw())
 
-    # Check if there is an item_check
-    if event.check_item_quantity:
-        # Run the item check
-        if inventory.bag[event.check_item_name].stock and inventory.bag[event.check_item_name].stock >= event.check_item_quantity:
-            event_parser.get_next_event()
-            return True
-        else:
-            event_parser.get_event_at_ID(event.on_fail_event_ID)
-            return True
+    if settings_object.report_startup_times:
+        print(startup.report())
 
-    return False
+    try:
+        while True:
+            # The overlay is toggled between frames, so that profiling starts and stops on a frame boundary
+            if controller_object.profiler_overlay_toggled:
+                controller_object.profiler_overlay_toggled = False
+                new_panel.mark_dirty(profiler_overlay.toggle())
 
+            with profiler.section("frame"):
+                scheduler.start_frame()
 
-def run_roll_checks(event_parser, inventory):
-    """Runs a random roll for the current event. Returns True if there is a roll event, False otherwise."""
-    event = event_parser.current_event
+                with profiler.section("update"):
+                    new_panel.update()
 
-    # Check if there is a roll_check
-    if event.check_roll_difficulty:
-        print("Rolling check")
-        print(f"Difficulty {event.check_roll_difficulty}, Roll Range 1-{event.check_roll_range}")
-        # Run the roll_check
-        random_number = random.randint(1, event.check_roll_range)
-        print(f'Number "on-the-dice": {random_number}')
-        # Add item modifiers
-        try:
-            random_number += inventory.bag[event.check_item_name].stock
-        except TypeError:
-            pass
-        print(f"Final total: {random_number}")
-        if random_number >= event.check_roll_difficulty:
-            event_parser.get_next_event()
-        else:
-            event_parser.get_event_at_ID(event.on_fail_event_ID)
+                with profiler.section("draw"):
+                    repainted_rects = new_panel.draw()
+                    repainted_rects += profiler_overlay.draw(new_panel.render_surface)
 
-        return True
+                with profiler.section("present"):
+                    presenter.present(new_panel.render_surface, repainted_rects)
 
-    return False
+                with profiler.section("wait"):
+                    scheduler.end_frame(is_idle=not new_panel.is_writing_text and not new_panel.is_scrolling and
+                                                not profiler_overlay.is_visible)
 
+    finally:
+        if new_panel.autosave_writer:
+            new_panel.autosave_writer.close()
 
-if __name__ == "__main__":
-    settings_object = settings.Settings()
-    character_object = character.CharacterProfile()
-    controller_object = controls.Controller(settings_object)
-    try:
-        new_panel = GUIAdventureScreen(controller_object, settings_object, character_object, "scenes/INTRO.scn")
-    except FileNotFoundError:
-        new_panel = GUIAdventureScreen(controller_object, settings_object, character_object)
+        if settings_object.frame_profile_filename:
+            profiler.dump_flamegraph(settings_object.frame_profile_filename)
 
-    while True:
-        new_panel.update()
-        new_panel.draw()
-        settings_object.display_surface.blit(pygame.transform.smoothscale(new_panel.render_surface, settings_object.screen_surface_size), (0, 0))
-        pygame.display.flip()
+        # Closed last, as the autosave writer logs the saves it writes while closing
+        settings_object.event_log.close()
@@ -0,0 +1,137 @@
+import hashlib
+import marshal
+import os
+import sys
+
+import scene_parser
+
+
+# Bump this whenever the layout of compiled scenes or of the event records changes, old files will then be rebuilt
+COMPILED_FORMAT_VERSION = 2
+COMPILED_EXTENSION = ".scnc"
+
+
+def compiled_path_for(scene_filename, compiled_directory):
+    """Returns the path of the compiled copy of the given scene file. The copy is named by the scene's file name and a
+    short hash of its full path, so scenes of the same name with other extensions or in other directories never share
+    a copy."""
+    path_hash = hashlib.sha1(os.path.abspath(scene_filename).encode("UTF-8")).hexdigest()[:8]
+    return os.path.join(compiled_directory, f"{os.path.basename(scene_filename)}.{path_hash}{COMPILED_EXTENSION}")
+
+
+def _hash_source(source_bytes):
+    """Returns the hash used to tell if a scene file has changed since it was compiled."""
+    return hashlib.sha1(source_bytes).hexdigest()
+
+
+def _write_compiled(compiled_filename, source_stat, source_hash, parsed_scene):
+    """Writes a parsed scene to the compiled file. Writes to a temporary file first so a crash never leaves a
+    half written scene behind."""
+    event_records = tuple(each_event.to_record() for each_event in parsed_scene.events.values())
+    compiled_data = (COMPILED_FORMAT_VERSION, source_stat.st_mtime_ns, source_stat.st_size, source_hash,
+                     parsed_scene.header, parsed_scene.start_in, parsed_scene.use_generic_topics, parsed_scene.style,
+                     event_records)
+
+    os.makedirs(os.path.dirname(compiled_filename) or ".", exist_ok=True)
+    temporary_filename = compiled_filename + ".tmp"
+
+    with open(temporary_filename, "wb") as compiledfile:
+        marshal.dump(compiled_data, compiledfile)
+
+    os.replace(temporary_filename, compiled_filename)
+
+
+def _read_compiled(compiled_filename):
+    """Returns the raw compiled data tuple, or None if the file is missing, unreadable or from an older format."""
+    try:
+        with open(compiled_filename, "rb") as compiledfile:
+            compiled_data = marshal.load(compiledfile)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+    if not isinstance(compiled_data, tuple) or not compiled_data or compiled_data[0] != COMPILED_FORMAT_VERSION:
+        return None
+
+    return compiled_data
+
+
+def _scene_from_compiled(compiled_data):
+    """Rebuilds a ParsedScene from compiled data without re-tokenizing any of its events."""
+    header, start_in, use_generic_topics, style, event_records = compiled_data[4:]
+
+    events = {}
+    for each_record in event_records:
+        events[each_record[0]] = scene_parser.event_from_record(each_record)
+
+    return scene_parser.ParsedScene(header, start_in, use_generic_topics, style, events)
+
+
+def compile_scene(scene_filename, compiled_directory):
+    """Parses the scene file and writes its compiled copy to the compiled directory. Returns the ParsedScene."""
+    with open(scene_filename, "rb") as scenefile:
+        source_hash = _hash_source(scenefile.read())
+
+    parsed_scene = scene_parser.parse_scene_file(scene_filename)
+    _write_compiled(compiled_path_for(scene_filename, compiled_directory), os.stat(scene_filename), source_hash,
+                    parsed_scene)
+
+    return parsed_scene
+
+
+def load_scene(scene_filename, compiled_directory):
+    """Returns the ParsedScene for the given scene file, loading its compiled copy when it is up to date and
+    rebuilding that copy when it is missing or stale. A copy is stale when the source file's modification time or size
+    has changed and its contents no longer match the hash saved in the copy."""
+    compiled_filename = compiled_path_for(scene_filename, compiled_directory)
+    source_stat = os.stat(scene_filename)
+    compiled_data = _read_compiled(compiled_filename)
+
+    if compiled_data:
+        # Fast path, the source has not been touched since it was compiled
+        if compiled_data[1] == source_stat.st_mtime_ns and compiled_data[2] == source_stat.st_size:
+            return _scene_from_compiled(compiled_data)
+
+        # The source was touched, but may still be identical, such as after a checkout
+        with open(scene_filename, "rb") as scenefile:
+            source_hash = _hash_source(scenefile.read())
+
+        if compiled_data[3] == source_hash:
+            parsed_scene = _scene_from_compiled(compiled_data)
+            _write_compiled(compiled_filename, source_stat, source_hash, parsed_scene)
+            return parsed_scene
+
+    return compile_scene(scene_filename, compiled_directory)
+
+
+def is_scene_file(filename):
+    """Returns True if the file is a .csv or .scn scene, as opposed to one of the topic, item or style catalogs.
+    Scene files always begin with the HEADER stage direction."""
+    if os.path.splitext(filename)[1] not in (".csv", ".scn"):
+        return False
+
+    with open(filename, newline='', encoding='UTF-8') as scenefile:
+        first_cell = scenefile.readline().split(",", 1)[0]
+
+    return first_cell == "HEADER"
+
+
+def compile_directory(scene_directory, compiled_directory):
+    """Compiles every scene file in the scene directory. Returns a list of the compiled file names."""
+    compiled_files = []
+
+    for each_filename in sorted(os.listdir(scene_directory)):
+        scene_filename = os.path.join(scene_directory, each_filename)
+        if os.path.isfile(scene_filename) and is_scene_file(scene_filename):
+            compile_scene(scene_filename, compiled_directory)
+            compiled_files.append(compiled_path_for(scene_filename, compiled_directory))
+
+    return compiled_files
+
+
+if __name__ == "__main__":
+    # Usage: python scene_compiler.py [scene_directory] [compiled_directory]
+    scene_directory = sys.argv[1] if len(sys.argv) > 1 else "scenes"
+    compiled_directory = sys.argv[2] if len(sys.argv) > 2 else os.path.join(scene_directory, "compiled")
+
+    for each_file in compile_directory(scene_directory, compiled_directory):
+        print(f"Compiled {each_file}")
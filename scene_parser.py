@@ -1,14 +1,35 @@
 import mypyg
+import collections
+import concurrent.futures
 import csv
+import sys
+import threading
+import time
+
+import scene_compiler
+
+
+# The attributes of a SceneEvent saved by the scene compiler, in the order they are stored. Commands are stored as
+# their flags and a tuple of any unknown commands, and checks as the tuples of their sub-records or None
+EVENT_RECORD_FIELDS = ("ID", "text", "next_ID", "commands", "choices", "said_by_character", "item_check", "roll_check",
+                       "give_item")
+
+# The commands read by the game, each given one bit of an event's command flags. Unknown commands are still kept
+KNOWN_COMMANDS = ("character", "choice", "enable_topics", "silent", "wipe", "clean_up_items", "mark", "clear_marks",
+                  "forget_mark", "reread", "scene", "give_item")
+COMMAND_FLAGS = {each_command: 1 << each_index for each_index, each_command in enumerate(KNOWN_COMMANDS)}
 
 
 class SceneParser:
-    """This object reads scenes from files stored as csv data and returns events useable by the reader_screen."""
-    def __init__(self, initial_scene_script, settings):
+    """This object reads scenes from files stored as csv data and returns events useable by the reader_screen.
+    A scene cache can be passed in to share parsed scenes between parsers."""
+    def __init__(self, initial_scene_script, settings, scene_cache=None):
         self.settings = settings
 
         self.current_events_script = None
+        self.current_scene_filename = None
         self.current_event = None
+        self.current_event_scene_filename = None    # The scene of the current event, None for an injected topic event
         self.current_event_header = None
         self.scene_style = "DEFAULT"
         self.use_generic_topics = None
@@ -18,6 +39,14 @@ class SceneParser:
         self.suppress_text = False
 
         self.marked_events_list = []
+        self.marked_scene_filenames = []   # The scene of each marked event, as for current_event_scene_filename
+
+        # Parsed scenes are kept in a cache, and scenes linked from the current one are read ahead on a worker thread
+        if scene_cache is None:
+            scene_cache = SceneCache(self.settings.scene_cache_size, self.settings.scene_cache_event_budget)
+        self.scene_cache = scene_cache
+        self._prefetch_executor = None
+        self._pending_prefetches = {}
 
         self.read_from_scene(initial_scene_script)
 
@@ -31,7 +60,7 @@ class SceneParser:
     def get_next_event(self):
         """Reads the next event from the current event and loads it."""
         if "scene" in self.current_event.commands:
-            self.read_from_scene("scenes/" + self.current_event.next_ID + ".csv")
+            self.read_from_scene(self.scene_filename_for(self.current_event.next_ID))
         elif self.current_event.next_ID == "return":
             self.return_to_last_mark()
         else:
@@ -41,30 +70,46 @@ class SceneParser:
         """Gets the event with the given ID in the current scene. Sets it to the current event.
         If inject event is not None, then the given event object will run instead."""
         if inject_event:
+            self._log_transition(inject_event, "inject")
             self.current_event = inject_event
+            self.current_event_scene_filename = None
             self._read_topics_enabled()
         elif ID_code == "return":
             self.return_to_last_mark()
         else:
+            self._log_transition(self.current_events_script[ID_code], "jump")
             self.current_event = self.current_events_script[ID_code]
+            self.current_event_scene_filename = self.current_scene_filename
             self._read_topics_enabled()
 
+    def _log_transition(self, next_event, transition_kind):
+        """Sends the move from the current event to the next one to the event log."""
+        if self.settings.event_log.enabled:
+            self.settings.event_log.emit("event_transition", scene=self.current_scene_filename, kind=transition_kind,
+                                         from_ID=self.current_event.ID if self.current_event else None,
+                                         to_ID=next_event.ID)
+
     def mark_this_event(self):
         """Marks the current event. The next event with 'return' will jump back to this marked command.
         Marks can be stacked, with the most recent mark being the next returned to."""
         self.marked_events_list.append(self.current_event)
+        self.marked_scene_filenames.append(self.current_event_scene_filename)
 
     def clear_marked_events(self, last_X=None):
         """Clears all marked events. If passed an int for last_X, it will delete at least that many of the previous
         commands."""
         if not last_X or (last_X and last_X > len(self.marked_events_list)):
             self.marked_events_list.clear()
+            self.marked_scene_filenames.clear()
         else:
             self.marked_events_list = self.marked_events_list[:-last_X]
+            self.marked_scene_filenames = self.marked_scene_filenames[:-last_X]
 
     def return_to_last_mark(self):
         """Returns to the last marked event. Clears that last marked event."""
+        self._log_transition(self.marked_events_list[-1], "return")
         self.current_event = self.marked_events_list.pop()
+        self.current_event_scene_filename = self.marked_scene_filenames.pop()
 
         # If there is no 'reread' Command, do not reread the prompt on returning.
         if "reread" not in self.current_event.commands:
@@ -72,79 +117,421 @@ class SceneParser:
 
         self._read_topics_enabled()
 
-    def read_from_scene(self, scene_filename):
-        """Reads a scene from a csv file into a list of event commands."""
-        # Clear the old event script
-        if self.current_events_script:
-            self.current_events_script.clear()
-
-        unparsed_event_list = []
-
-        # Open the scene file and write it into a python list
-        with open(scene_filename, newline='', encoding='UTF-8') as scenefile:
-            scene_csv_reader = csv.reader(scenefile)
-            for each_line in scene_csv_reader:
-                unparsed_event_list.append(each_line)
-
-        # Find stage direction lines from the top of the scene file, process and remove them
-        stage_directions = ("HEADER", "GENERIC_TOPICS", "STYLE")   # Extend this tuple with other stage directions as you design them
-
-        while unparsed_event_list[0][0] in stage_directions:
-            this_stage_direction = unparsed_event_list.pop(0)
-            if this_stage_direction[0] == "HEADER":
-                self.current_event_header = this_stage_direction[1]
-                self.start_in = this_stage_direction[2]
-            elif this_stage_direction[0] == "GENERIC_TOPICS":
-                self.use_generic_topics = this_stage_direction[1].split(", ")
-            elif this_stage_direction[0] == "STYLE":
-                self.scene_style = this_stage_direction[1]
-
-        # Pass through all the rows of the unparsed event list and make event objects for them
-        event_dict = {}
-        current_row_index = 0
-
-        while current_row_index < len(unparsed_event_list):
-            current_event_ID = unparsed_event_list[current_row_index][0]
-            # Key the scene ID to the Event object in the dict.
-            event_dict[current_event_ID] = SceneEvent(unparsed_event_list, current_row_index)
-            # Increment the current row by 1 + the number of extra rows devoted to choices from the last event added
-            if event_dict[current_event_ID].choices:
-                current_row_index += len(event_dict[current_event_ID].choices) + 1
-            else:
-                current_row_index += 1
+    def get_state(self):
+        """Returns the position in the script as a tuple of plain values for a snapshot. Events are given as (scene
+        file name, event ID) pairs, with a scene of None for a topic's generic response, keyed by the topic title."""
+        return (self.current_scene_filename, self.current_event_header, self.start_in,
+                tuple(self.use_generic_topics) if self.use_generic_topics is not None else None, self.scene_style,
+                self.enable_topics, self.suppress_text, (self.current_event_scene_filename, self.current_event.ID),
+                tuple(zip(self.marked_scene_filenames, (each_event.ID for each_event in self.marked_events_list))))
+
+    def set_state(self, parser_state, topic_index):
+        """Moves to the position in the script given by get_state, reading the scenes it needs without running any
+        event. The topic index finds the generic responses of topics. Raises KeyError if an event is no longer in its
+        scene, and OSError if a scene can no longer be read, in which case the parser is left unchanged."""
+        (scene_filename, event_header, start_in, use_generic_topics, scene_style, enable_topics, suppress_text,
+         current_event_reference, marked_event_references) = parser_state
+
+        # Find every event before changing anything
+        events_script = self._load_scene(scene_filename)[0].events
+        current_event = self._find_event(current_event_reference, scene_filename, events_script, topic_index)
+        marked_events = [self._find_event(each_reference, scene_filename, events_script, topic_index)
+                         for each_reference in marked_event_references]
+
+        self.current_events_script = events_script
+        self.current_scene_filename = scene_filename
+        self.current_event_header = event_header
+        self.start_in = start_in
+        self.use_generic_topics = list(use_generic_topics) if use_generic_topics is not None else None
+        self.scene_style = scene_style
+        self.enable_topics = enable_topics
+        self.suppress_text = suppress_text
+
+        self.current_event = current_event
+        self.current_event_scene_filename = current_event_reference[0]
+        self.marked_events_list = marked_events
+        self.marked_scene_filenames = [each_reference[0] for each_reference in marked_event_references]
+
+    def _find_event(self, event_reference, scene_filename, events_script, topic_index):
+        """Returns the event of a (scene file name, event ID) pair made by get_state, given the events of the scene
+        being moved to."""
+        event_scene_filename, event_ID = event_reference
+
+        if event_scene_filename is None:
+            this_topic = topic_index.get(event_ID)
+            if this_topic is None:
+                raise KeyError(event_ID)
+            return this_topic.event
+
+        elif event_scene_filename == scene_filename:
+            return events_script[event_ID]
+
+        return self._load_scene(event_scene_filename)[0].events[event_ID]
 
-        # Set up events to begin running
-        self.current_events_script = event_dict
+    def read_from_scene(self, scene_filename):
+        """Loads a scene into the current events script, from the scene cache if it has been read before, otherwise
+        from its csv file or precompiled copy. Starts prefetching the scenes it links to."""
+        load_start_time = time.perf_counter()
+        parsed_scene, scene_source = self._load_scene(scene_filename)
+        self.settings.event_log.emit("scene_loaded", scene=scene_filename, source=scene_source,
+                                     load_ms=(time.perf_counter() - load_start_time) * 1000,
+                                     event_count=len(parsed_scene.events))
+
+        # Apply the stage directions, directions missing from the scene keep their previous values
+        if parsed_scene.header is not None:
+            self.current_event_header = parsed_scene.header
+            self.start_in = parsed_scene.start_in
+        if parsed_scene.use_generic_topics is not None:
+            self.use_generic_topics = parsed_scene.use_generic_topics
+        if parsed_scene.style is not None:
+            self.scene_style = parsed_scene.style
+
+        # Set up events to begin running. The events dict is shared with the cache, so it is swapped and never cleared.
+        self.current_events_script = parsed_scene.events
+        self.current_scene_filename = scene_filename
         self.get_event_at_ID(self.start_in)  # Loads the first event
         self._read_topics_enabled()
 
+        if self.settings.prefetch_linked_scenes:
+            self._prefetch_linked_scenes(parsed_scene)
+
+    def scene_filename_for(self, scene_ID):
+        """Returns the file name of the scene with the given ID, as used by the 'scene' command."""
+        return scene_filename_for(scene_ID, self.settings.scenes_directory)
+
+    def _read_scene_file(self, scene_filename):
+        """Reads a scene from its file or precompiled copy and stores it in the scene cache. Runs on either thread."""
+        if self.settings.use_compiled_scenes:
+            parsed_scene = scene_compiler.load_scene(scene_filename, self.settings.compiled_scenes_directory)
+        else:
+            parsed_scene = parse_scene_file(scene_filename)
+
+        self.scene_cache.put(scene_filename, parsed_scene)
+
+        return parsed_scene
+
+    def _load_scene(self, scene_filename):
+        """Returns the parsed scene for the file name, using the cache or a finished prefetch when possible, and where
+        it came from, one of "cache", "prefetch" or "file"."""
+        parsed_scene = self.scene_cache.get(scene_filename)
+        if parsed_scene:
+            return parsed_scene, "cache"
+
+        # If the scene is still being prefetched, wait for it rather than reading it a second time
+        pending_prefetch = self._pending_prefetches.pop(scene_filename, None)
+        if pending_prefetch:
+            try:
+                return pending_prefetch.result(), "prefetch"
+            except (OSError, ValueError, IndexError):
+                pass    # Read it again below so the error is raised on this thread
+
+        return self._read_scene_file(scene_filename), "file"
+
+    def _prefetch_linked_scenes(self, parsed_scene):
+        """Queues every scene targeted by a 'scene' command in the parsed scene to be read on the worker thread."""
+        # Forget finished prefetches, their scenes are in the cache by now
+        for each_filename, each_future in list(self._pending_prefetches.items()):
+            if each_future.done():
+                del self._pending_prefetches[each_filename]
+
+        for each_event in parsed_scene.events.values():
+            if "scene" in each_event.commands and each_event.next_ID:
+                linked_filename = self.scene_filename_for(each_event.next_ID)
+
+                if linked_filename in self.scene_cache or linked_filename in self._pending_prefetches:
+                    continue
+
+                if not self._prefetch_executor:
+                    self._prefetch_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="scene_prefetch")
+
+                self._pending_prefetches[linked_filename] = self._prefetch_executor.submit(self._read_scene_file, linked_filename)
+
+
+class SceneCache:
+    """A bounded, least recently used cache of parsed scenes keyed by file name. Holds at most max_scenes scenes, and
+    if max_events is set, evicts old scenes until the events held fit within it. The scene cached last is never
+    evicted. Safe to fill from the prefetch thread."""
+    def __init__(self, max_scenes, max_events=None):
+        self.max_scenes = max_scenes
+        self.max_events = max_events
+
+        self.scenes = collections.OrderedDict()
+        self.event_count = 0
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+
+    def __contains__(self, scene_filename):
+        with self._lock:
+            return scene_filename in self.scenes
+
+    def __len__(self):
+        return len(self.scenes)
+
+    def get(self, scene_filename):
+        """Returns the cached scene and marks it as recently used, or returns None if it is not cached."""
+        with self._lock:
+            parsed_scene = self.scenes.get(scene_filename)
+
+            if parsed_scene is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.scenes.move_to_end(scene_filename)
+
+            return parsed_scene
+
+    def put(self, scene_filename, parsed_scene):
+        """Stores the scene as the most recently used, evicting the least recently used scenes over budget."""
+        with self._lock:
+            if scene_filename in self.scenes:
+                self.event_count -= len(self.scenes.pop(scene_filename).events)
+
+            self.scenes[scene_filename] = parsed_scene
+            self.event_count += len(parsed_scene.events)
+
+            while len(self.scenes) > 1 and (len(self.scenes) > self.max_scenes or
+                                            (self.max_events and self.event_count > self.max_events)):
+                evicted_scene = self.scenes.popitem(last=False)[1]
+                self.event_count -= len(evicted_scene.events)
+
+    def clear(self):
+        """Empties the cache."""
+        with self._lock:
+            self.scenes.clear()
+            self.event_count = 0
+
+
+class ParsedScene:
+    """The stage directions and event objects read from a single scene file. Stage directions missing from the file
+    are left as None."""
+    def __init__(self, header=None, start_in=None, use_generic_topics=None, style=None, events=None):
+        self.header = header
+        self.start_in = start_in
+        self.use_generic_topics = use_generic_topics
+        self.style = style
+
+        self.events = events if events is not None else {}
+
+
+def scene_filename_for(scene_ID, scene_directory="scenes"):
+    """Returns the file name of the scene with the given ID in the scene directory. A scene's ID is its file name
+    without the directory or the .csv extension."""
+    return scene_directory + "/" + scene_ID + ".csv"
+
+
+def parse_scene_file(scene_filename):
+    """Reads a scene from a csv file and returns it as a ParsedScene."""
+    unparsed_event_list = []
+
+    # Open the scene file and write it into a python list
+    with open(scene_filename, newline='', encoding='UTF-8') as scenefile:
+        scene_csv_reader = csv.reader(scenefile)
+        for each_line in scene_csv_reader:
+            unparsed_event_list.append(each_line)
+
+    return parse_scene_rows(unparsed_event_list)
+
+
+def parse_scene_rows(unparsed_event_list):
+    """Turns the rows of a scene file into a ParsedScene, processing the stage directions and making event objects."""
+    parsed_scene = ParsedScene()
+
+    # Find stage direction lines from the top of the scene file, process and remove them
+    stage_directions = ("HEADER", "GENERIC_TOPICS", "STYLE")   # Extend this tuple with other stage directions as you design them
+
+    first_event_row = 0
+
+    while unparsed_event_list[first_event_row][0] in stage_directions:
+        this_stage_direction = unparsed_event_list[first_event_row]
+        first_event_row += 1
+        if this_stage_direction[0] == "HEADER":
+            parsed_scene.header = this_stage_direction[1]
+            parsed_scene.start_in = this_stage_direction[2]
+        elif this_stage_direction[0] == "GENERIC_TOPICS":
+            parsed_scene.use_generic_topics = this_stage_direction[1].split(", ")
+        elif this_stage_direction[0] == "STYLE":
+            parsed_scene.style = this_stage_direction[1]
+
+    # Pass through all the rows of the unparsed event list and make event objects for them
+    event_dict = parsed_scene.events
+    current_row_index = first_event_row
+
+    while current_row_index < len(unparsed_event_list):
+        current_event_ID = unparsed_event_list[current_row_index][0]
+        # Key the scene ID to the Event object in the dict.
+        event_dict[current_event_ID] = SceneEvent(unparsed_event_list, current_row_index)
+        # Increment the current row by 1 + the number of extra rows devoted to choices from the last event added
+        if event_dict[current_event_ID].choices:
+            current_row_index += len(event_dict[current_event_ID].choices) + 1
+        else:
+            current_row_index += 1
+
+    return parsed_scene
+
+
+class EventCommands(frozenset):
+    """The commands of an event, a frozenset of command names that also holds the known commands as the bits of
+    flags. Events with the same commands share one set, see from_flags, so a set costs no memory per event and
+    checking for a command with the in operator is a single hash lookup."""
+    __slots__ = ("flags",)
+
+    _shared_sets = {}   # (flags, unknown commands) -> the set shared by every event with those commands
+
+    @classmethod
+    def from_flags(cls, flags, unknown_commands=()):
+        """Returns the shared command set with the given flags and sorted tuple of unknown commands."""
+        set_key = (flags, unknown_commands)
+        command_set = cls._shared_sets.get(set_key)
+
+        if command_set is None:
+            command_names = [each_command for each_command in KNOWN_COMMANDS if flags & COMMAND_FLAGS[each_command]]
+            command_names.extend(sys.intern(each_command) for each_command in unknown_commands)
+
+            command_set = cls(command_names)
+            command_set.flags = flags
+            cls._shared_sets[set_key] = command_set
+
+        return command_set
+
+    @classmethod
+    def from_names(cls, command_names):
+        """Returns the shared command set of the given command names."""
+        flags = 0
+        unknown_commands = set()
+
+        for each_command in command_names:
+            if each_command in COMMAND_FLAGS:
+                flags |= COMMAND_FLAGS[each_command]
+            else:
+                unknown_commands.add(each_command)
+
+        return cls.from_flags(flags, tuple(sorted(unknown_commands)))
+
+    @property
+    def unknown_commands(self):
+        """The sorted tuple of the commands that have no flag."""
+        return tuple(sorted(each_command for each_command in self if each_command not in COMMAND_FLAGS))
+
+    def to_record(self):
+        """Returns the commands as a tuple of the flags and the unknown commands."""
+        return self.flags, self.unknown_commands
+
+
+class ItemCheck:
+    """The check_item expression of an event. The event goes on if the player holds quantity of the item, and goes
+    to on_fail_event_ID if not."""
+    __slots__ = ("item_name", "quantity", "on_fail_event_ID")
+
+    def __init__(self, item_name, quantity, on_fail_event_ID):
+        self.item_name = item_name
+        self.quantity = quantity
+        self.on_fail_event_ID = on_fail_event_ID
+
+    def to_record(self):
+        return self.item_name, self.quantity, self.on_fail_event_ID
+
+
+class RollCheck:
+    """The check_roll expression of an event. A roll in 1 to roll_range, plus the stock of the item if one is given,
+    must tie or beat the difficulty, or the event goes to on_fail_event_ID."""
+    __slots__ = ("difficulty", "roll_range", "on_fail_event_ID", "item_name")
+
+    def __init__(self, difficulty, roll_range, on_fail_event_ID, item_name=None):
+        self.difficulty = difficulty
+        self.roll_range = roll_range
+        self.on_fail_event_ID = on_fail_event_ID
+        self.item_name = item_name
+
+    def to_record(self):
+        return self.difficulty, self.roll_range, self.on_fail_event_ID, self.item_name
+
+
+class GiveItem:
+    """The give_item expression of an event, which adds quantity of the item to the player's inventory."""
+    __slots__ = ("item_name", "quantity")
+
+    def __init__(self, item_name, quantity):
+        self.item_name = item_name
+        self.quantity = quantity
+
+    def to_record(self):
+        return self.item_name, self.quantity
+
 
 class SceneEvent:
-    """Takes the event index and the row list and creates an Event object that can be read by the scene parser."""
+    """Takes the event index and the row list and creates an Event object that can be read by the scene parser.
+    Events are slotted to keep large cached scenes small. Item checks, roll checks and given items are optional
+    sub-records, and the flat attributes such as check_item_name read through to them."""
+    __slots__ = ("ID", "text", "next_ID", "commands", "choices", "said_by_character", "item_check", "roll_check",
+                 "give_item")
+
     def __init__(self, event_list, event_index_number):
-        self.ID = event_list[event_index_number][0]
+        self.ID = sys.intern(event_list[event_index_number][0])
         self.text = event_list[event_index_number][1]
 
         # Store Event Command Data
         self.said_by_character = None
-        self.check_item_name = None
-        self.check_item_quantity = None
-        self.check_roll_difficulty = None
-        self.check_roll_range = None
-        self.on_fail_event_ID = None
-        self.give_item_name = None
-        self.give_item_quantity = None
+        self.item_check = None
+        self.roll_check = None
+        self.give_item = None
 
         # init commands, choices and the next_ID
         self.commands, self.choices = self._read_event_commands(event_list, event_index_number)
-        self.next_ID = self._read_next_ID(event_list, event_index_number)
+        self.next_ID = _intern_ID(self._read_next_ID(event_list, event_index_number))
 
         #print(f"Scene: {self.ID} -> {self.next_ID}, with {self.commands}: {self.text}")
 
+    @property
+    def check_item_name(self):
+        """The item needed by the item check, or the item adding to the roll check."""
+        if self.item_check:
+            return self.item_check.item_name
+        elif self.roll_check:
+            return self.roll_check.item_name
+        return None
+
+    @property
+    def check_item_quantity(self):
+        return self.item_check.quantity if self.item_check else None
+
+    @property
+    def check_roll_difficulty(self):
+        return self.roll_check.difficulty if self.roll_check else None
+
+    @property
+    def check_roll_range(self):
+        return self.roll_check.roll_range if self.roll_check else None
+
+    @property
+    def on_fail_event_ID(self):
+        if self.item_check:
+            return self.item_check.on_fail_event_ID
+        elif self.roll_check:
+            return self.roll_check.on_fail_event_ID
+        return None
+
+    @property
+    def give_item_name(self):
+        return self.give_item.item_name if self.give_item else None
+
+    @property
+    def give_item_quantity(self):
+        return self.give_item.quantity if self.give_item else None
+
+    def to_record(self):
+        """Returns the parsed data of this event as a tuple of plain values, ordered as in EVENT_RECORD_FIELDS."""
+        return (self.ID, self.text, self.next_ID, self.commands.to_record(), self.choices, self.said_by_character,
+                self.item_check.to_record() if self.item_check else None,
+                self.roll_check.to_record() if self.roll_check else None,
+                self.give_item.to_record() if self.give_item else None)
+
     def _read_event_commands(self, event_list, event_index_number):
-        """Reads an event from the unparsed event list produced in the scene parser. Returns a list of the commands in
-        the event, and a dictionary of choices for choice based events. Always returns a list of events even if it is
-        empty, but will return None rather than an empty choice dict."""
+        """Reads an event from the unparsed event list produced in the scene parser. Returns the commands in the event
+        as EventCommands, and a dictionary of choices for choice based events. Always returns a command set even if
+        it is empty, but will return None rather than an empty choice dict."""
         found_commands = []
         event_command_string = event_list[event_index_number][3]
 
@@ -161,11 +548,10 @@ class SceneEvent:
         event_command_string = event_command_string.split()
 
         if not event_command_string:
-            return found_commands, None
+            return EventCommands.from_names(found_commands), None
 
         # Add command tags
-        while event_command_string:
-            next_command = event_command_string.pop(0)
+        for next_command in event_command_string:
 
             # Read expression commands into the event properly
             next_command = self._read_expression_command(next_command)
@@ -179,14 +565,14 @@ class SceneEvent:
             iterations = 1
             next_choice = event_list[event_index_number + iterations]
             while not next_choice[0]:
-                choices[next_choice[1]] = next_choice[2]
+                choices[next_choice[1]] = _intern_ID(next_choice[2])
                 iterations += 1
                 next_choice = event_list[event_index_number + iterations]
 
         if choices:
-            return found_commands, choices
+            return EventCommands.from_names(found_commands), choices
         else:
-            return found_commands, None
+            return EventCommands.from_names(found_commands), None
 
     def _read_expression_command(self, expression_command):
         """Reads and manages one of the expression commands if passed one as a string, otherwise returns the given
@@ -197,8 +583,7 @@ class SceneEvent:
         if "give_item" in expression_command:
 
             arguments = expression_command[10:-1].split(",")
-            self.give_item_name = arguments[0]
-            self.give_item_quantity = int(arguments[1])
+            self.give_item = GiveItem(arguments[0], int(arguments[1]))
 
             return "give_item"
 
@@ -213,21 +598,18 @@ class SceneEvent:
         if "check_item" in next_ID:
             arguments = next_ID[11:-1].split(",")
 
-            self.check_item_name = arguments[0]
-            self.check_item_quantity = int(arguments[1])
-            self.on_fail_event_ID = arguments[3]
+            self.item_check = ItemCheck(arguments[0], int(arguments[1]), _intern_ID(arguments[3]))
 
             return arguments[2]
 
         elif "check_roll" in next_ID:
             arguments = next_ID[11:-1].split(",")
 
-            self.check_roll_difficulty = int(arguments[0])  # Number that must be tied or beat for success
-            self.check_roll_range = int(arguments[1])  # Total range of the roll, linear distribution
-            self.on_fail_event_ID = arguments[3]
+            # The difficulty must be tied or beat for success, and the range is the total range of the roll
+            self.roll_check = RollCheck(int(arguments[0]), int(arguments[1]), _intern_ID(arguments[3]))
 
             try:
-                self.check_item_name = arguments[4]
+                self.roll_check.item_name = arguments[4]
             except IndexError:
                 pass
 
@@ -248,3 +630,28 @@ class SceneEvent:
                 return event_list[event_index_number + 1][0]
             except IndexError:
                 return None
+
+
+def _intern_ID(event_ID):
+    """Interns an event ID so the many references to it share one string and match by identity in dict lookups."""
+    return sys.intern(event_ID) if event_ID else event_ID
+
+
+def event_from_record(event_record):
+    """Rebuilds a SceneEvent from a tuple made by SceneEvent.to_record, without re-reading its commands."""
+    (event_ID, text, next_ID, command_record, choices, said_by_character, item_check_record, roll_check_record,
+     give_item_record) = event_record
+    this_event = SceneEvent.__new__(SceneEvent)
+
+    this_event.ID = sys.intern(event_ID)
+    this_event.text = text
+    this_event.next_ID = _intern_ID(next_ID)
+    this_event.commands = EventCommands.from_flags(*command_record)
+    this_event.choices = choices
+    this_event.said_by_character = said_by_character
+
+    this_event.item_check = ItemCheck(*item_check_record) if item_check_record else None
+    this_event.roll_check = RollCheck(*roll_check_record) if roll_check_record else None
+    this_event.give_item = GiveItem(*give_item_record) if give_item_record else None
+
+    return this_event
@@ -1,96 +1,366 @@
+import collections
 import csv
+import json
+import os
+import re
+
 import pygame
 
-import mypyg
+import frame_profiler
+import gui
+import instrumentation
 
 
 class Settings:
-    """The settings object, which contains all directly alterable settings."""
-    def __init__(self):
-        # Screen settings
-        self.allowed_screen_sizes = [(2560, 1440),
-                                     (1920, 1080),
-                                     (1280, 720),
-                                     (854, 480)]
+    """The settings object, which contains all directly alterable settings. If headless is True, no display is opened,
+    for running scenes without rendering them. Fonts, the style table and the dynamic colors are loaded when first
+    used, so a headless run never loads them."""
+    # The fonts, loaded when first used, as attribute name -> (font name, size at the design size, bold, italic)
+    FONT_SPECS = {"font_heading_1": ("georgia", 52, False, False),
+                  "font_heading_2": ("sitkasubheading", 36, False, False),
+                  "font_text_body": ("sourcesanspro", 32, False, False),
+                  "font_text_body_italics": ("sourcesanspro", 32, False, True),
+                  "font_text_body_bold": ("sourcesanspro", 32, True, False),
+                  "font_text_small_caps": ("sourcesanspro", 28, False, False),
+                  "font_UI_text": ("nirmalaui", 36, False, False),
+                  "font_debug": ("consolas", 22, False, False)}
+
+    def __init__(self, headless=False):
+        self.headless = headless
+
+        # Screen settings. Each allowed screen size selects how frames are presented at that size, either "native",
+        # rendering straight at the screen size with scaled fonts and layout, or "scaled", rendering at the design size
+        # and scaling the changed pixels down to the screen.
+        self.allowed_screen_sizes = {(2560, 1440): "native",
+                                     (1920, 1080): "native",
+                                     (1280, 720): "native",
+                                     (854, 480): "native"}
+        self.design_surface_size = (2560, 1440)     # The size the layout, fonts and spacing are designed at
         self.screen_surface_size = (1920, 1080)
-        self.render_surface_size = (2560, 1440)
-        self.display_surface = pygame.display.set_mode(self.screen_surface_size)
+        self.presentation_mode = self.allowed_screen_sizes[self.screen_surface_size]
+        if self.presentation_mode == "native":
+            self.render_surface_size = self.screen_surface_size
+        else:
+            self.render_surface_size = self.design_surface_size
+        self.ui_scale = self.render_surface_size[1] / self.design_surface_size[1]
+        if headless:
+            self.display_surface = None
+        else:
+            self.display_surface = pygame.display.set_mode(self.screen_surface_size)
 
-        # Font Settings
-        pygame.font.init()
-        self.font_heading_1 = pygame.font.SysFont("georgia", 52)
-        self.font_heading_2 = pygame.font.SysFont("sitkasubheading", 36)
-        self.font_text_body = pygame.font.SysFont("sourcesanspro", 32)
-        self.font_text_body_italics = pygame.font.SysFont("sourcesanspro", 32, italic=True)
-        self.font_text_body_bold = pygame.font.SysFont("sourcesanspro", 32, bold=True)
-        self.font_text_small_caps = pygame.font.SysFont("sourcesanspro", 28)
-        self.font_UI_text = pygame.font.SysFont("nirmalaui", 36)
+        # Frame pacing settings
+        self.target_fps = 60
+        self.idle_wait_timeout = 1000   # Most milliseconds an idle frame waits for input before running anyway
+
+        # Font Settings, the paths of matched system fonts are saved so later launches skip the system font scan
+        self.font_path_cache = FontPathCache("images/cache/font_paths.json")
 
         # Spacing variables
-        self.paragraph_tab_width = 50
-        self.paragraph_spacing_below = 10
+        self.paragraph_tab_width = self.scale_to_render(50)
+        self.paragraph_spacing_below = self.scale_to_render(10)
+
+        # Scroll settings, each notch of the wheel scrolls scroll_speed pixels in all, gliding to a stop with momentum
+        self.scroll_speed = self.scale_to_render(15)
+        self.scroll_friction = 12   # The rate the glide slows at, its speed falling by e times every 1 / scroll_friction seconds
+        self.scroll_stop_speed = self.scale_to_render(30)  # Pixels per second below which the glide ends
+        self.rolling_text_history_screens = 50  # Heights of the text box of rolling text kept to scroll back through
+        self.hit_grid_cell_size = self.scale_to_render(64)   # Size of the grid cells clickable topics are found by
+
+        # Text reveal settings, the rolling text is revealed at this many words or characters per second
+        self.text_reveal_speed = 60
+        self.text_reveal_unit = "words"     # Either "words" or "characters"
 
-        self.scroll_speed = 15
+        # Scene loading settings
+        self.scenes_directory = "scenes"   # Where the 'scene' command and the campaign index find scenes by ID
+        self.use_compiled_scenes = True
+        self.compiled_scenes_directory = "scenes/compiled"
+        self.scene_cache_size = 8   # Most scenes kept parsed in memory at once
+        self.scene_cache_event_budget = 20000   # Most events kept in the scene cache, None for no limit
+        self.prefetch_linked_scenes = not headless
 
-        # Color Settings
-        self.color_styles, self.color_keys = self._init_color_styles("scenes/styles.csv")
+        # Save settings, the rewind key steps back through the last rewind_ring_size times the game waited for the player
+        self.rewind_ring_size = 20
+        self.rewind_key = pygame.K_BACKSPACE
+        self.quick_save_key = pygame.K_F5
+        self.quick_load_key = pygame.K_F9
+        self.quick_save_filename = "saves/quick.sav"
+
+        # Autosave settings, the game is autosaved to a journal on a background thread after every choice, topic and item
+        # clicked. The journal is rewritten whole every autosave_compact_every saves, and None turns autosaving off
+        self.autosave_filename = None if headless else "saves/autosave.journal"
+        self.autosave_compact_every = 50
+        self.autosave_load_key = pygame.K_F8
+
+        # Text render cache settings
+        self.render_cache = RenderCache(2048)   # Most text surfaces kept rendered at once
+
+        # Background cache settings
+        self.background_cache = gui.BackgroundCache(4, "images/cache")   # Most recolored backgrounds kept at once
+
+        # Color Settings, the colors of each style are worked out once and kept in the style registry
+        self.styles_filename = "scenes/styles.csv"
+        self.style_registry = StyleRegistry(self.styles_filename)
 
         self.current_style_name = "DEFAULT"
-        self.dynamic_colors = self.get_dynamic_colors(self.current_style_name)
+        self._dynamic_colors = None
 
-    def _init_color_styles(self, styles_filename):
-        """Reads the style colors from the .csv into the game."""
-        retrieved_color_styles = {}
-        retrieved_color_keys = []
+        # Instrumentation settings. The event log is written as JSON lines to event_log_filename, or is disabled if it is
+        # None until given a sink with event_log.set_sink()
+        self.event_log_filename = None
+        self.event_log = instrumentation.EventLog(instrumentation.JSONLSink(self.event_log_filename) if self.event_log_filename else None)
+        self.event_log_stats_interval = 600     # Frames between logging the render and background cache stats
 
-        with open(styles_filename, newline='', encoding='UTF-8') as stylefile:
-            style_csv_reader = csv.reader(stylefile)
+        # Frame profiler settings. The overlay of phase timings is toggled by profiler_overlay_key, and frames are only
+        # profiled while it is shown, unless frame_profile_filename is set, in which case every frame is profiled and a
+        # flamegraph of the session is written there on quitting
+        self.profiler_overlay_key = pygame.K_F3
+        self.frame_profile_filename = None
+        self.frame_profiler = frame_profiler.FrameProfiler(enabled=self.frame_profile_filename is not None)
 
-            for each_line in style_csv_reader:
+        # Startup settings
+        self.report_startup_times = False   # Print the time taken by each phase of starting the game
+
+    def __getattr__(self, attribute_name):
+        """Loads a font the first time it is used, sized for the render surface."""
+        if attribute_name not in Settings.FONT_SPECS:
+            raise AttributeError(f"'Settings' object has no attribute '{attribute_name}'")
 
-                # Read the line with the dynamic color keys
-                if not retrieved_color_keys:
+        font_name, design_size, bold, italic = Settings.FONT_SPECS[attribute_name]
+        loaded_font = self.font_path_cache.load_font(font_name, self.scale_to_render(design_size), bold, italic)
+        setattr(self, attribute_name, loaded_font)
 
-                    each_line.pop(0)  # Corrects for the style name column
+        return loaded_font
 
-                    for each_key in each_line:
-                        retrieved_color_keys.append(each_key)
+    @property
+    def color_styles(self):
+        """The colors of every style as tuples, read from the styles file when first used."""
+        return self.style_registry.color_styles
 
-                # Read the style lines
-                else:
-                    this_style_name = each_line.pop(0)
-                    this_style = []
+    @property
+    def color_keys(self):
+        """The names of the dynamic colors, in the order of each style's colors."""
+        return self.style_registry.color_keys
 
-                    for each_color in each_line:
-                        each_color = mypyg.remove_character(each_color, remove_non_alphanumeric=True).split()
-                        color_tuple = (int(each_color[0]), int(each_color[1]), int(each_color[2]))
-                        this_style.append(color_tuple)
+    @property
+    def dynamic_colors(self):
+        """The dynamic colors of the current style, worked out when first used. Switched with set_style."""
+        if self._dynamic_colors is None:
+            self._dynamic_colors = self.style_registry.get(self.current_style_name)
 
-                    retrieved_color_styles[this_style_name] = this_style
+        return self._dynamic_colors
 
-        return retrieved_color_styles, retrieved_color_keys
+    def scale_to_render(self, design_pixels):
+        """Scales a size in pixels at the design surface size to the render surface size."""
+        return max(1, round(design_pixels * self.ui_scale))
 
     def get_dynamic_colors(self, color_style):
-        """Returns a dict of dynamic colors for use by the rendering pipeline. Styles can be swapped by
-        passing a new color_style and assigning settings.dynamic_colors to the resulting dict."""
-        dynamic_color_dict = {}
-        print(color_style)
-        # Set each key in the color_keys to a pygame color of the corresponding tuple
-        for each_key, each_color_tuple in zip(self.color_keys, self.color_styles[color_style]):
-            dynamic_color_dict[each_key] = pygame.Color(each_color_tuple)
-            print(each_key, dynamic_color_dict[each_key])
+        """Returns the dict of dynamic colors of the style for use by the rendering pipeline. The dict is shared by
+        the style registry and must not be changed."""
+        return self.style_registry.get(color_style)
 
-        return dynamic_color_dict
+    def set_style(self, color_style):
+        """Switches the dynamic colors to the style. Renders and backgrounds are cached by their colors, so those of
+        every style used stay cached, and switching back to a style finds them again."""
+        self._dynamic_colors = self.style_registry.get(color_style)
+        self.current_style_name = color_style
+
+        self.event_log.emit("style_changed", style=color_style)
 
     def render_text_body_font(self, text, color, italics, bold):
         """Calls renders from text_body_font adjusting for italics and bolds as necessary.
         Returns the rendered text surface."""
 
         if bold:
-            render = self.font_text_body_bold.render(text, True, color, self.dynamic_colors["transparency"])
+            render = self.render_font(self.font_text_body_bold, text, True, color, self.dynamic_colors["transparency"])
         elif italics:
-            render = self.font_text_body_italics.render(text, True, color, self.dynamic_colors["transparency"])
+            render = self.render_font(self.font_text_body_italics, text, True, color, self.dynamic_colors["transparency"])
         else:
-            render = self.font_text_body.render(text, True, color, self.dynamic_colors["transparency"])
+            render = self.render_font(self.font_text_body, text, True, color, self.dynamic_colors["transparency"])
 
         return render
+
+    def render_font(self, font, text, antialias, color, background=None):
+        """Renders text with the given font through the render cache. Takes the same arguments as pygame's
+        Font.render. The returned surface is shared with the cache and must not be drawn on."""
+        return self.render_cache.render(font, text, antialias, color, background)
+
+    def size_text_body_font(self, text, italics, bold):
+        """Measures text in text_body_font adjusting for italics and bolds as necessary.
+        Returns the (width, height) the text would render at."""
+
+        if bold:
+            return self.font_text_body_bold.size(text)
+        elif italics:
+            return self.font_text_body_italics.size(text)
+        else:
+            return self.font_text_body.size(text)
+
+
+class StyleRegistry:
+    """The color styles of the styles file. The file is read when first used, and the dict of pygame colors of each
+    style is made the first time the style is used and then kept, so switching to a style only looks it up."""
+    COLOR_NUMBER_PATTERN = re.compile(r"\d+")
+
+    def __init__(self, styles_filename):
+        self.styles_filename = styles_filename
+
+        self._color_styles = None   # Style name -> list of its color tuples, in the order of the color keys
+        self._color_keys = None
+        self.dynamic_colors = {}    # Style name -> dict of its dynamic colors by key, of the styles used so far
+
+    @property
+    def color_styles(self):
+        """The colors of every style as tuples, read from the styles file when first used."""
+        if self._color_styles is None:
+            self._color_styles, self._color_keys = self._read_styles()
+
+        return self._color_styles
+
+    @property
+    def color_keys(self):
+        """The names of the dynamic colors, in the order of each style's colors."""
+        if self._color_keys is None:
+            self._color_styles, self._color_keys = self._read_styles()
+
+        return self._color_keys
+
+    def _read_styles(self):
+        """Reads the style colors from the .csv. Returns the dict of each style's color tuples and the list of
+        color keys. Each color is written as its three numbers, such as "10, 10, 10"."""
+        color_styles = {}
+
+        with open(self.styles_filename, newline='', encoding='UTF-8') as stylefile:
+            style_csv_reader = csv.reader(stylefile)
+
+            # The first line names the dynamic colors, after the style name column
+            color_keys = next(style_csv_reader)[1:]
+
+            for each_line in style_csv_reader:
+                color_styles[each_line[0]] = [tuple(int(each_number) for each_number in
+                                                    self.COLOR_NUMBER_PATTERN.findall(each_color)[:3])
+                                              for each_color in each_line[1:]]
+
+        return color_styles, color_keys
+
+    def get(self, style_name):
+        """Returns the dict of dynamic colors of the style, making it if the style has not been used before. Raises
+        KeyError if there is no such style."""
+        style_colors = self.dynamic_colors.get(style_name)
+
+        if style_colors is None:
+            style_colors = {each_key: pygame.Color(each_color_tuple)
+                            for each_key, each_color_tuple in zip(self.color_keys, self.color_styles[style_name])}
+            self.dynamic_colors[style_name] = style_colors
+
+        return style_colors
+
+
+class RenderCache:
+    """A least recently used cache of rendered text surfaces, keyed by the font, text, antialiasing and colors of the
+    render. Bold and italic text is rendered by its own font object, so those styles are part of the key through the
+    font, and the renders of each color style are kept apart through their colors. Counts its hits, misses and
+    evictions."""
+    def __init__(self, max_renders):
+        self.max_renders = max_renders
+
+        self.renders = collections.OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.renders)
+
+    def render(self, font, text, antialias, color, background=None):
+        """Returns the cached render of the text, rendering and storing it first if it is not cached."""
+        render_key = (font, text, antialias, tuple(color), tuple(background) if background is not None else None)
+
+        rendered_text = self.renders.get(render_key)
+
+        if rendered_text is None:
+            self.misses += 1
+            rendered_text = font.render(text, antialias, color, background)
+            self.renders[render_key] = rendered_text
+
+            if len(self.renders) > self.max_renders:
+                self.renders.popitem(last=False)
+                self.evictions += 1
+
+        else:
+            self.hits += 1
+            self.renders.move_to_end(render_key)
+
+        return rendered_text
+
+    def clear(self):
+        """Empties the cache, keeping the hit and miss counts."""
+        self.renders.clear()
+
+    def get_stats(self):
+        """Returns a dict of the cache's size, hits, misses, evictions and hit rate."""
+        lookups = self.hits + self.misses
+
+        return {"size": len(self.renders),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+class FontPathCache:
+    """Finds the files of system fonts by name, saving what it finds to a JSON file. pygame's SysFont scans every
+    system font the first time it is used, which is slow, so fonts found in an earlier launch are loaded straight from
+    their saved paths. Paths that no longer exist are looked up again. Fonts that were not found are saved as not found,
+    so delete the file after installing fonts."""
+    def __init__(self, cache_filename):
+        self.cache_filename = cache_filename
+        self._font_paths = None     # "name|bold|italic" -> [font path or None, set bold, set italic]
+
+    def _read_cache_file(self):
+        """Reads the saved font paths, or starts with none if the file is missing or unreadable."""
+        try:
+            with open(self.cache_filename, encoding="UTF-8") as cachefile:
+                self._font_paths = json.load(cachefile)
+        except (OSError, ValueError):
+            self._font_paths = {}
+
+    def _write_cache_file(self):
+        """Saves the font paths. Writes to a temporary file first so a crash never leaves a half written file."""
+        os.makedirs(os.path.dirname(self.cache_filename) or ".", exist_ok=True)
+        temporary_filename = self.cache_filename + ".tmp"
+
+        with open(temporary_filename, "w", encoding="UTF-8") as cachefile:
+            json.dump(self._font_paths, cachefile, indent=1)
+
+        os.replace(temporary_filename, self.cache_filename)
+
+    def load_font(self, font_name, size, bold=False, italic=False):
+        """Returns the system font by name, as pygame.font.SysFont would, looking its file up only if it is not saved."""
+        pygame.font.init()
+
+        if self._font_paths is None:
+            self._read_cache_file()
+
+        font_key = f"{font_name}|{bold}|{italic}"
+        font_match = self._font_paths.get(font_key)
+
+        if font_match is None or (font_match[0] is not None and not os.path.exists(font_match[0])):
+            matched_fonts = []
+
+            # SysFont passes what it matched to the constructor, including whether bold or italics must be faked
+            def record_match(font_path, font_size, set_bold, set_italic):
+                matched_fonts.append([font_path, set_bold, set_italic])
+                return pygame.sysfont.font_constructor(font_path, font_size, set_bold, set_italic)
+
+            loaded_font = pygame.font.SysFont(font_name, size, bold, italic, constructor=record_match)
+
+            self._font_paths[font_key] = matched_fonts[0]
+            try:
+                self._write_cache_file()
+            except OSError:
+                pass
+
+            return loaded_font
+
+        return pygame.sysfont.font_constructor(font_match[0], size, font_match[1], font_match[2])
@@ -0,0 +1,96 @@
+import collections
+import marshal
+import os
+import zlib
+
+
+# Bump this whenever the layout of snapshots changes, older snapshots can then no longer be loaded
+SNAPSHOT_FORMAT_VERSION = 1
+SNAPSHOT_MAGIC = b"TAGSNAP"
+
+
+class GameSnapshot:
+    """The state of a game at one moment, held as plain values so it can be stored without any surfaces or sprites.
+    The parser state places the game in the script by scene file names and event IDs, the character state holds the
+    known topics and the inventory, and the screen state holds the rolling text and how far it has been written.
+    Made by GUIAdventureScreen.capture_snapshot and restored by GUIAdventureScreen.restore_snapshot."""
+    def __init__(self, parser_state, character_state, screen_state):
+        self.parser_state = parser_state
+        self.character_state = character_state
+        self.screen_state = screen_state
+
+    def to_bytes(self):
+        """Returns the snapshot in the compact binary format, marshalled and compressed."""
+        snapshot_data = (SNAPSHOT_FORMAT_VERSION, self.parser_state, self.character_state, self.screen_state)
+        return SNAPSHOT_MAGIC + zlib.compress(marshal.dumps(snapshot_data), 1)
+
+    @classmethod
+    def from_bytes(cls, snapshot_bytes):
+        """Returns the snapshot held in bytes made by to_bytes. Raises ValueError if they are not a snapshot, or are
+        from another format version."""
+        if not snapshot_bytes.startswith(SNAPSHOT_MAGIC):
+            raise ValueError("Not a snapshot")
+
+        try:
+            snapshot_data = marshal.loads(zlib.decompress(snapshot_bytes[len(SNAPSHOT_MAGIC):]))
+        except (zlib.error, EOFError, TypeError) as error:
+            raise ValueError(f"Damaged snapshot: {error}") from error
+
+        if not isinstance(snapshot_data, tuple) or len(snapshot_data) != 4:
+            raise ValueError("Damaged snapshot")
+        if snapshot_data[0] != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(f"Snapshot format {snapshot_data[0]} is not {SNAPSHOT_FORMAT_VERSION}")
+
+        return cls(*snapshot_data[1:])
+
+
+def write_snapshot(snapshot_filename, game_snapshot):
+    """Writes a snapshot to a file. Writes to a temporary file first so a crash never leaves a half written save
+    behind."""
+    os.makedirs(os.path.dirname(snapshot_filename) or ".", exist_ok=True)
+    temporary_filename = snapshot_filename + ".tmp"
+
+    with open(temporary_filename, "wb") as snapshotfile:
+        snapshotfile.write(game_snapshot.to_bytes())
+
+    os.replace(temporary_filename, snapshot_filename)
+
+
+def read_snapshot(snapshot_filename):
+    """Returns the snapshot in a file written by write_snapshot. Raises OSError if it cannot be read, and ValueError if
+    it is not a snapshot of this format."""
+    with open(snapshot_filename, "rb") as snapshotfile:
+        return GameSnapshot.from_bytes(snapshotfile.read())
+
+
+class SnapshotRing:
+    """The most recent snapshots, oldest first, for rewinding. Snapshots are kept in their binary form, so the ring
+    stays small and a kept snapshot can never be changed by the game going on. Once capacity snapshots are kept,
+    pushing another drops the oldest."""
+    def __init__(self, capacity=20):
+        self.snapshots = collections.deque(maxlen=capacity)
+
+    def __len__(self):
+        return len(self.snapshots)
+
+    def push(self, game_snapshot):
+        """Keeps a snapshot as the most recent."""
+        self.snapshots.append(game_snapshot.to_bytes())
+
+    def peek(self):
+        """Returns the most recent snapshot, or None if there are none."""
+        if not self.snapshots:
+            return None
+
+        return GameSnapshot.from_bytes(self.snapshots[-1])
+
+    def pop(self):
+        """Drops the most recent snapshot and returns it, or returns None if there are none."""
+        if not self.snapshots:
+            return None
+
+        return GameSnapshot.from_bytes(self.snapshots.pop())
+
+    def clear(self):
+        """Drops every snapshot."""
+        self.snapshots.clear()
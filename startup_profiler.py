@@ -0,0 +1,39 @@
+import contextlib
+import time
+
+
+class StartupProfiler:
+    """Times the phases of starting the game. Each phase is run inside phase(), and the time it took is kept in the
+    order the phases ran."""
+    def __init__(self):
+        self.phases = []    # (phase name, seconds) in the order run
+
+    @contextlib.contextmanager
+    def phase(self, phase_name):
+        """Times the code run inside the with block as the named phase."""
+        start_time = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.phases.append((phase_name, time.perf_counter() - start_time))
+
+    def get_stats(self):
+        """Returns a dict of the milliseconds taken by each phase, and by all of them as "total"."""
+        phase_stats = {each_name: each_time * 1000 for each_name, each_time in self.phases}
+        phase_stats["total"] = sum(each_time for each_name, each_time in self.phases) * 1000
+
+        return phase_stats
+
+    def report(self):
+        """Returns the time taken by each phase and its share of the total, as printable lines."""
+        total_time = sum(each_time for each_name, each_time in self.phases)
+        name_width = max([len(each_name) for each_name, each_time in self.phases] + [len("total")])
+
+        report_lines = ["Startup times:"]
+        for each_name, each_time in self.phases:
+            share = each_time / total_time if total_time else 0.0
+            report_lines.append(f"  {each_name:<{name_width}} {each_time * 1000:8.1f} ms {share:6.1%}")
+        report_lines.append(f"  {'total':<{name_width}} {total_time * 1000:8.1f} ms")
+
+        return "\n".join(report_lines)
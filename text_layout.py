@@ -0,0 +1,115 @@
+import pygame
+
+import mypyg
+
+
+class TextRun:
+    """A single word, topic or inline item of event text, measured and positioned in the rolling text box.
+    Topic runs carry their topic object, item runs their item object and the quantity given when clicked."""
+    def __init__(self, text, rect, bold=False, italics=False, topic=None, item=None, item_quantity=None):
+        self.text = text
+        self.rect = rect
+        self.bold = bold
+        self.italics = italics
+
+        self.topic = topic
+        self.item = item
+        self.item_quantity = item_quantity
+
+
+class TextLayout:
+    """The laid out text of a whole event. Holds the positioned runs in reading order, the reveal threshold of each run
+    in words or characters, the rect of the last placed text and the bold and italics states the text ends in."""
+    def __init__(self, runs, reveal_thresholds, end_rect, is_bold, is_italics):
+        self.runs = runs
+        self.reveal_thresholds = reveal_thresholds
+        self.end_rect = end_rect
+        self.is_bold = is_bold
+        self.is_italics = is_italics
+
+
+def layout_event_text(text, settings, topic_index, inventory, start_rect, box_width, is_bold=False, is_italics=False,
+                      reveal_unit="words"):
+    """Measures and breaks the lines of a whole event's text, starting after start_rect, and returns the TextLayout.
+    Reads the /b, /i and / style tags, <topic> tags and {item} tags. No text is rendered."""
+    words = text.split()
+    word_index = 0
+
+    runs = []
+    reveal_thresholds = []
+    revealed_amount = 0
+    last_placed_text_rect = start_rect.copy()
+    space_width = settings.font_text_body.size(" ")[0]
+
+    while word_index < len(words):
+        expression = words[word_index]
+        word_index += 1
+
+        # Check for bold and italics tags, which style the word following them
+        if expression == "/b":
+            is_bold = True
+            continue
+        elif expression == "/i":
+            is_italics = True
+            continue
+        elif expression == "/":
+            is_bold = False
+            is_italics = False
+            continue
+
+        topic = None
+        item = None
+        item_quantity = None
+
+        # Check if the word is a topic which will be enclosed in <_>, extending it to find the rest of the topic
+        if "<" in expression:
+            while ">" not in expression and word_index < len(words):
+                expression += " " + words[word_index]
+                word_index += 1
+
+            next_word = mypyg.remove_character(expression, '<', '>')
+            topic = topic_index.find(next_word)
+
+        # Check if the word is an item which will be enclosed in {_}, extending it to find the rest of the item
+        elif "{" in expression:
+            while "}" not in expression and word_index < len(words):
+                expression += " " + words[word_index]
+                word_index += 1
+
+            arguments = expression[1:-1].split(",")
+
+            # Check if there is an alias included
+            if len(arguments) < 3:
+                item = inventory.bag[arguments[0]]
+                item_quantity = int(arguments[1])
+            else:
+                item = inventory.bag[arguments[1]]
+                item_quantity = int(arguments[2])
+
+            next_word = arguments[0]
+
+        else:
+            next_word = expression
+
+        # Measure the word, and move to a new line if it would run past the edge of the box
+        word_size = settings.size_text_body_font(next_word, is_italics, is_bold)
+
+        if space_width + word_size[0] + last_placed_text_rect.right > box_width:
+            last_placed_text_rect.right = 0
+            last_placed_text_rect.top = last_placed_text_rect.bottom
+
+        this_word_rect = pygame.Rect((0, 0), word_size)
+        this_word_rect.left = last_placed_text_rect.right + space_width
+        this_word_rect.bottom = last_placed_text_rect.bottom
+        last_placed_text_rect = this_word_rect
+
+        runs.append(TextRun(next_word, this_word_rect.copy(), is_bold, is_italics, topic, item, item_quantity))
+
+        # Record when this run is due to appear in the typewriter reveal
+        if reveal_unit == "characters":
+            revealed_amount += len(next_word) + 1
+        else:
+            revealed_amount += 1
+        reveal_thresholds.append(revealed_amount)
+
+    return TextLayout(runs, reveal_thresholds, last_placed_text_rect, is_bold, is_italics)
@@ -1,8 +1,14 @@
+import bisect
 import csv
+import re
 
 import scene_parser
 
 
+# Finds the text inside each <topic> tag of an event's text, once the text's whitespace is collapsed
+TOPIC_TAG_PATTERN = re.compile(r"<([^>]*)>")
+
+
 class Topic:
     """A top level class for Topic Objects. Topics inherit from this. Can also be used to generate nonce topics with no
     special properties other than the baseline functionality of topics."""
@@ -46,3 +52,137 @@ def init_topics(topic_filename):
         topics.append(Topic(each_line[0], each_line[2], *topic_aliases, is_known_topic=is_known_topic))
 
     return topics
+
+
+def normalize_topic_key(topic_text):
+    """Returns the key a topic is looked up by, the text in lower case with everything but letters, numbers and
+    spaces removed."""
+    return "".join([each_character for each_character in topic_text.lower()
+                    if each_character.isalnum() or each_character == " "])
+
+
+class TopicIndex:
+    """An index over the list of all topics, shared by everything that looks topics up. Maps each topic's title and
+    aliases, both as written and normalized, to the topic, with topics earlier in the list winning any clashes. Also
+    keeps the known topics in list order, updated as topics become known."""
+    def __init__(self, topics_list):
+        self.topics = topics_list
+
+        self.topics_by_key = {}
+        self.topics_by_title = {}
+        self.topic_positions = {}
+
+        self.known_topics = TopicOrder(self)
+
+        for each_topic in topics_list:
+            self._index_topic(each_topic)
+
+    def add(self, topic_object):
+        """Adds a new topic to the end of the topics list and to the index."""
+        self.topics.append(topic_object)
+        self._index_topic(topic_object)
+
+    def _index_topic(self, topic_object):
+        """Indexes a topic, placing it after all topics already indexed."""
+        self.topic_positions[topic_object] = len(self.topic_positions)
+        self.topics_by_title.setdefault(topic_object.title, topic_object)
+
+        for each_key in (topic_object.title.lower(), *topic_object.aliases):
+            for each_form in (each_key, normalize_topic_key(each_key)):
+                if each_form:
+                    self.topics_by_key.setdefault(each_form, topic_object)
+
+        if topic_object.is_known_topic:
+            self.known_topics.insert(topic_object)
+
+    def find(self, topic_text):
+        """Returns the topic whose title or alias matches the text written inside a topic tag, or None if none does."""
+        this_topic = self.topics_by_key.get(topic_text.lower())
+
+        if this_topic is None:
+            this_topic = self.topics_by_key.get(normalize_topic_key(topic_text))
+
+        return this_topic
+
+    def get(self, topic_title):
+        """Returns the topic with the exact given title, or None."""
+        return self.topics_by_title.get(topic_title)
+
+    def mark_known(self, topic_object):
+        """Sets the topic as known and adds it to the known topics. Returns False if it was already known."""
+        if topic_object.is_known_topic:
+            return False
+
+        topic_object.is_known_topic = True
+        self.known_topics.insert(topic_object)
+
+        return True
+
+    def get_state(self):
+        """Returns the titles of the known topics, in list order, for a snapshot."""
+        return tuple(each_topic.title for each_topic in self.known_topics)
+
+    def set_state(self, known_titles):
+        """Sets exactly the topics with the given titles as known."""
+        known_titles = set(known_titles)
+
+        for each_topic in self.topics:
+            each_topic.is_known_topic = each_topic.title in known_titles
+
+        self.refresh_known()
+
+    def refresh_known(self):
+        """Rebuilds the known topics from each topic's is_known_topic flag, for when the flags are set directly."""
+        self.known_topics = TopicOrder(self)
+
+        for each_topic in self.topics:
+            if each_topic.is_known_topic:
+                self.known_topics.insert(each_topic)
+
+
+class TopicOrder:
+    """A collection of topics kept in the order of the topics list, found by each topic's position in a TopicIndex.
+    Inserting or removing a topic is a binary search, so the collection never needs to be sorted."""
+    def __init__(self, topic_index):
+        self.topic_index = topic_index
+
+        self.topics = []
+        self._positions = []
+
+    def _find(self, topic_object):
+        """Returns the index the topic is or would be at, and whether it is there."""
+        topic_position = self.topic_index.topic_positions[topic_object]
+        order_index = bisect.bisect_left(self._positions, topic_position)
+
+        return order_index, order_index < len(self._positions) and self._positions[order_index] == topic_position
+
+    def insert(self, topic_object):
+        """Inserts the topic in list order. Returns False if it was already present."""
+        order_index, is_present = self._find(topic_object)
+        if is_present:
+            return False
+
+        self._positions.insert(order_index, self.topic_index.topic_positions[topic_object])
+        self.topics.insert(order_index, topic_object)
+
+        return True
+
+    def remove(self, topic_object):
+        """Removes the topic. Returns False if it was not present."""
+        order_index, is_present = self._find(topic_object)
+        if not is_present:
+            return False
+
+        del self._positions[order_index]
+        del self.topics[order_index]
+
+        return True
+
+    def __contains__(self, topic_object):
+        return self._find(topic_object)[1]
+
+    def __iter__(self):
+        return iter(self.topics)
+
+    def __len__(self):
+        return len(self.topics)
@@ -0,0 +1,231 @@
+import bisect
+
+import pygame
+
+
+class TranscriptEntry:
+    """A single piece of text written to the rolling text box, kept so it can be drawn again when scrolled back to.
+    Holds the rect of the text in transcript coordinates and the bottom of the line it was written on. A "word" entry
+    holds the text and its style, a "character_tag" entry its text, and a "sprite" entry the topic sprite that draws
+    it."""
+    def __init__(self, kind, rect, line_bottom, text=None, italics=False, bold=False, sprite=None):
+        self.kind = kind
+        self.rect = rect
+        self.line_bottom = line_bottom
+
+        self.text = text
+        self.italics = italics
+        self.bold = bold
+        self.sprite = sprite
+
+    def to_record(self, sprite_state=None):
+        """Returns the entry as a tuple of plain values, with the plain values of its sprite if it has one."""
+        return self.kind, tuple(self.rect), self.line_bottom, self.text, self.italics, self.bold, sprite_state
+
+
+class RollingTextTranscript:
+    """The written history of the rolling text box. The text is kept as entries in reading order, and only a window of
+    the transcript around the part being viewed is drawn, to a surface of fixed size. Viewing a part outside of the
+    window moves it, drawing only the rows it newly covers. Text more than history_height above the newest text is
+    dropped, so memory stays bounded however long the text runs."""
+    def __init__(self, settings_object, view_size, history_height):
+        self.settings = settings_object
+        self.view_width, self.view_height = view_size
+        self.margin = self.view_height // 2     # Rows drawn above and below the view, so small scrolls draw nothing
+        self.history_height = history_height
+
+        self.window_surface = pygame.Surface((self.view_width, self.view_height + 2 * self.margin))
+        self.window_top = 0
+
+        self.entries = []
+        self._line_bottoms = []     # The line bottom of each entry, to find the entries in a band by binary search
+        self._entry_records = []    # The record of each entry, or None for sprite entries, whose records can change
+        self.first_entry_number = 0     # Entries are numbered in the order written, this is the number of the oldest kept
+        self.tallest_entry = 0
+        self.top = 0        # The top of the oldest text kept
+        self.bottom = 0     # The bottom of the newest line
+
+        self.clear()
+
+    def get_width(self):
+        """Returns the width text is laid out to."""
+        return self.view_width
+
+    def get_height(self):
+        """Returns the bottom of the transcript, which is never less than the height of the view."""
+        return max(self.view_height, self.bottom)
+
+    def clear(self):
+        """Drops all of the text and empties the window, in the current transparency color."""
+        for each_entry in self.entries:
+            if each_entry.sprite:
+                each_entry.sprite.kill()
+
+        self.first_entry_number += len(self.entries)
+        self.entries = []
+        self._line_bottoms = []
+        self._entry_records = []
+        self.tallest_entry = 0
+        self.top = 0
+        self.bottom = 0
+        self.window_top = 0
+
+        self.window_surface.fill(self.settings.dynamic_colors["transparency"])
+        self.window_surface.set_colorkey(self.settings.dynamic_colors["transparency"])
+
+    def extend_to(self, line_bottom):
+        """Extends the transcript down to the given line bottom, dropping the oldest text if it is now too long."""
+        if line_bottom > self.bottom:
+            self.bottom = line_bottom
+            self._trim_history()
+
+    def add_word(self, text, rect, italics, bold, line_bottom):
+        """Writes a word of body text."""
+        self._add_entry(TranscriptEntry("word", rect.copy(), line_bottom, text=text, italics=italics, bold=bold))
+
+    def add_character_tag(self, text, rect, line_bottom):
+        """Writes a character tag."""
+        self._add_entry(TranscriptEntry("character_tag", rect.copy(), line_bottom, text=text))
+
+    def add_sprite(self, topic_sprite, line_bottom):
+        """Writes a topic or item topic sprite, which is drawn at its rect. The sprite is killed when its text is
+        dropped."""
+        self._add_entry(TranscriptEntry("sprite", topic_sprite.rect, line_bottom, sprite=topic_sprite))
+
+    def _add_entry(self, transcript_entry):
+        """Adds an entry after all others, drawing it if it is within the window."""
+        self.entries.append(transcript_entry)
+        self._line_bottoms.append(transcript_entry.line_bottom)
+        self._entry_records.append(None if transcript_entry.sprite else transcript_entry.to_record())
+        self.tallest_entry = max(self.tallest_entry, transcript_entry.rect.height)
+
+        self._draw_entry(transcript_entry)
+        self.extend_to(transcript_entry.line_bottom)
+
+    def _trim_history(self):
+        """Drops the entries that have fallen more than history_height above the bottom. Entries are dropped a view's
+        height at a time, so that the list is not shifted for every word."""
+        if self.bottom - self.top <= self.history_height + self.view_height:
+            return
+
+        self.top = self.bottom - self.history_height
+        dropped_count = bisect.bisect_right(self._line_bottoms, self.top)
+
+        for each_entry in self.entries[:dropped_count]:
+            if each_entry.sprite:
+                each_entry.sprite.kill()
+
+        del self.entries[:dropped_count]
+        del self._line_bottoms[:dropped_count]
+        del self._entry_records[:dropped_count]
+        self.first_entry_number += dropped_count
+
+    def _draw_entry(self, transcript_entry, band_rect=None):
+        """Draws an entry to the window, if it is within it."""
+        window_rect = transcript_entry.rect.move(0, -self.window_top)
+        if not window_rect.colliderect(band_rect or self.window_surface.get_rect()):
+            return
+
+        if transcript_entry.kind == "sprite":
+            rendered_text = transcript_entry.sprite.image
+
+        elif transcript_entry.kind == "character_tag":
+            rendered_text = self.settings.render_font(self.settings.font_text_small_caps, transcript_entry.text, True,
+                                                      self.settings.dynamic_colors["character_tag"],
+                                                      self.settings.dynamic_colors["transparency"])
+        else:
+            rendered_text = self.settings.render_text_body_font(transcript_entry.text,
+                                                                self.settings.dynamic_colors["body_text"],
+                                                                transcript_entry.italics, transcript_entry.bold)
+
+        self.window_surface.blit(rendered_text, window_rect)
+
+    def _draw_band(self, band_top, band_bottom):
+        """Redraws the rows of the window between the given transcript positions from the entries."""
+        band_rect = pygame.Rect(0, band_top - self.window_top, self.view_width, band_bottom - band_top)
+
+        self.window_surface.set_clip(band_rect)
+        self.window_surface.fill(self.settings.dynamic_colors["transparency"])
+
+        # Entries can only be in the band if their line ends below its top, and starts above its bottom
+        first_index = bisect.bisect_left(self._line_bottoms, band_top)
+        last_index = bisect.bisect_left(self._line_bottoms, band_bottom + self.tallest_entry)
+        for each_entry in self.entries[first_index:last_index]:
+            self._draw_entry(each_entry, band_rect)
+
+        self.window_surface.set_clip(None)
+
+    def _move_window(self, window_top):
+        """Moves the window to start at the given transcript position. Rows still covered are scrolled across, and
+        only the rows newly covered are drawn."""
+        window_height = self.window_surface.get_height()
+        move_distance = window_top - self.window_top
+        self.window_top = window_top
+
+        if abs(move_distance) >= window_height:
+            self._draw_band(window_top, window_top + window_height)
+
+        elif move_distance > 0:
+            self.window_surface.scroll(0, -move_distance)
+            self._draw_band(window_top + window_height - move_distance, window_top + window_height)
+
+        elif move_distance < 0:
+            self.window_surface.scroll(0, -move_distance)
+            self._draw_band(window_top, window_top - move_distance)
+
+    def redraw(self):
+        """Redraws the whole window from the entries, such as after the colors have changed."""
+        self._draw_band(self.window_top, self.window_top + self.window_surface.get_height())
+
+    def get_state(self, encode_sprite):
+        """Returns the transcript as plain values for a snapshot. Sprites are given by encode_sprite, which returns
+        the plain values a sprite can be made again from."""
+        entry_records = list(self._entry_records)
+
+        for each_index, each_record in enumerate(entry_records):
+            if each_record is None:
+                each_entry = self.entries[each_index]
+                entry_records[each_index] = each_entry.to_record(encode_sprite(each_entry.sprite))
+
+        return self.top, self.bottom, tuple(entry_records)
+
+    def set_state(self, transcript_state, decode_sprite, focus_top):
+        """Replaces the transcript with one from get_state, and draws the window around focus_top. Sprites are made
+        again by decode_sprite, given their plain values and rect."""
+        self.clear()
+        self.top, self.bottom, entry_records = transcript_state
+
+        for each_record in entry_records:
+            kind, rect, line_bottom, text, italics, bold, sprite_state = each_record
+            rect = pygame.Rect(rect)
+
+            topic_sprite = None
+            if sprite_state:
+                topic_sprite = decode_sprite(sprite_state, rect)
+
+                # The topic or item of the sprite is no longer in the game
+                if not topic_sprite:
+                    continue
+                rect = topic_sprite.rect
+                each_record = None
+
+            self.entries.append(TranscriptEntry(kind, rect, line_bottom, text, italics, bold, topic_sprite))
+            self._line_bottoms.append(line_bottom)
+            self._entry_records.append(each_record)
+            self.tallest_entry = max(self.tallest_entry, rect.height)
+
+        self.window_top = focus_top - self.margin
+        self.redraw()
+
+    def draw_sprites(self, topic_sprites):
+        """Draws the current images of the given sprites to the window, after they have changed."""
+        for each_sprite in topic_sprites:
+            self.window_surface.blit(each_sprite.image, each_sprite.rect.move(0, -self.window_top))
+
+    def view(self, focus_rect):
+        """Returns the surface and area of it showing the focus rect, given in transcript coordinates, first moving
+        the window to cover it if it does not already."""
+        if focus_rect.top < self.window_top or focus_rect.bottom > self.window_top + self.window_surface.get_height():
+            self._move_window(focus_rect.top - self.margin)
+
+        return self.window_surface, focus_rect.move(0, -self.window_top)